@@ -1,6 +1,6 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, Dict, List
 
 class Settings(BaseSettings):
     # App Config
@@ -24,12 +24,147 @@ class Settings(BaseSettings):
     # Auth Config
     # Check for this key in X-API-Key header or Bearer token
     API_KEY: str # Must be provided
+    EXTRA_API_KEYS: List[str] = []  # Additional accepted keys (e.g. per-client keys, rotation)
     
     # Dev/Test Flags
     ALLOW_MOCK_INFERENCE: bool = False
     
     # Infrastructure
     REDIS_URL: str = "redis://localhost:6379"
+    REDIS_MAX_CONNECTIONS: int = 50
+
+    # Rate Limiting (per API key, token buckets in Redis)
+    RATE_LIMIT_REQUESTS_PER_MINUTE: int = 60  # 0 = unlimited
+    RATE_LIMIT_TOKENS_PER_MINUTE: int = 100000  # Generated tokens, charged after completion (0 = unlimited)
+    RATE_LIMIT_LOCAL_LEASE: int = 5  # Requests granted per Redis call to clients far below their limit
+    RATE_LIMIT_LEASE_TTL: float = 1.0  # Seconds a local lease may be used before asking Redis again
+
+    # Memory Backend
+    MEMORY_BACKEND: str = "chroma"  # "chroma" | "numpy" (in-process, memory-mapped)
+    VECTOR_STORE_PATH: str = "./data/vectors"
+    MEMORY_READ_ONLY: bool = False  # Open a shared snapshot read-only (replicas)
+    VECTOR_INDEX_GRAPH_THRESHOLD: int = 20000  # Brute force below, approximate graph above
+    VECTOR_INDEX_GRAPH_NEIGHBORS: int = 16
+    VECTOR_INDEX_EF_SEARCH: int = 64
+    VECTOR_LOG_COMPACT_RATIO: float = 2.0  # Rewrite a collection's record log once it holds this many entries per live record
+
+    # Hybrid Retrieval (BM25 + vector)
+    MEMORY_HYBRID_ENABLED: bool = True
+    MEMORY_HYBRID_CANDIDATES: int = 4  # Candidates per requested result from each retriever
+    MEMORY_HYBRID_RRF_K: int = 60
+    MEMORY_LEXICAL_FASTPATH_COVERAGE: float = 0.75  # Query-term coverage that skips embedding
+    MEMORY_LEXICAL_FASTPATH_MIN_TERMS: int = 3  # Shorter queries always get vector search
+    MEMORY_LEXICAL_FASTPATH_SEPARATION: float = 1.2  # Required BM25 ratio of the n-th result to the next
+    MEMORY_LEXICAL_MIN_COVERAGE: float = 0.5  # Lexical-only matches covering less of the query rank beyond MEMORY_CONTEXT_MAX_DISTANCE
+
+    # Memory Context Packing
+    MEMORY_CONTEXT_CANDIDATES: int = 4  # Candidates retrieved per tier before packing
+    MEMORY_CONTEXT_MAX_DISTANCE: float = 0.6  # Cosine distance above which memories are dropped
+    MEMORY_CONTEXT_OVERLAP_THRESHOLD: float = 0.8  # Term Jaccard at which a memory counts as a duplicate
+    MEMORY_CONTEXT_TOKEN_BUDGET: Dict[str, int] = {
+        "default": 512, "creative": 256, "deterministic": 512, "coding": 768, "research": 1024, "autonomous": 1024
+    }
+
+    # Memory Write-Behind Queue
+    MEMORY_WRITE_FLUSH_INTERVAL: float = 1.0  # Seconds between background flushes
+    MEMORY_WRITE_BATCH_SIZE: int = 64  # Flush early once this many writes are queued
+    MEMORY_WRITE_QUEUE_MAX: int = 10000  # Oldest writes are dropped beyond this
+
+    # Memory Retention / Compaction
+    MEMORY_COMPACTION_INTERVAL: int = 0  # Seconds between background compactions (0 = disabled)
+    MEMORY_DEDUP_THRESHOLD: float = 0.97  # Cosine similarity above which memories are merged
+    MEMORY_DEDUP_MAX_ITEMS: int = 50000  # Skip near-duplicate merging above this collection size
+    MEMORY_MAX_ITEMS: Dict[str, int] = {"episodic": 5000, "semantic": 200000, "procedural": 1000}
+    MEMORY_HALF_LIFE_DAYS: Dict[str, float] = {"episodic": 30, "semantic": 0, "procedural": 0}  # 0 = no decay
+    MEMORY_COLD_THRESHOLD_CHARS: int = 4000  # Episode bodies above this go to cold storage
+    MEMORY_COLD_DIR: str = "./data/memory_cold"
+    MEMORY_SNAPSHOT_PATH: Optional[str] = None  # Seeds empty memory on startup (see scripts/memory_snapshot.py)
+
+    # Semantic Cache (opt-in)
+    # Reuses the memory embedding function to serve near-duplicate requests without inference.
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95  # Cosine similarity required for a hit
+    SEMANTIC_CACHE_TTL: int = 3600
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 10000  # Oldest entries are evicted beyond this
+    SEMANTIC_CACHE_PURGE_INTERVAL: int = 60  # Seconds between sweeps for expired entries (run on writes)
+    SEMANTIC_CACHE_VERIFY_RATE: float = 0.0  # Fraction of hits re-generated to measure false hits
+
+    # Tool Result Cache (deterministic tools only, e.g. file reads, PDF extraction)
+    TOOL_CACHE_MAX_ENTRIES: int = 256
+    TOOL_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Tool Workspaces
+    WORKSPACE_BASE_DIR: str = "./workspace"  # Base snapshot; also the workspace outside sessions
+    WORKSPACE_SESSIONS_DIR: str = "./data/workspaces"  # Same filesystem as the base for reflinks
+    WORKSPACE_PER_SESSION: bool = True  # Agentic requests get a private copy-on-write clone
+    WORKSPACE_QUOTA_BYTES: int = 256 * 1024 * 1024  # Bytes a session may write (0 = unlimited)
+
+    # WebSocket Agent Sessions
+    WS_SESSION_BUFFER_CHUNKS: int = 10000  # Chunks retained per session for resume-from-offset
+    WS_SESSION_TTL: float = 300.0  # Seconds a finished session stays available for re-attach
+    WS_SESSION_DETACHED_TIMEOUT: float = 120.0  # Running sessions without a client are cancelled after this
+    WS_SESSION_REAP_INTERVAL: float = 15.0  # Seconds between sweeps for detached and expired sessions
+
+    # Generation Scheduler (QoS lanes, fair queuing per API key)
+    SCHEDULER_MAX_CONCURRENT_GENERATIONS: int = 32  # Generations running on the engine at once
+    SCHEDULER_RESERVED_INTERACTIVE: int = 4  # Slots only interactive requests may take
+    SCHEDULER_QOS_WEIGHTS: Dict[str, float] = {"interactive": 8.0, "agent": 2.0, "batch": 1.0}
+    SCHEDULER_KV_CAPACITY_TOKENS: int = 65536  # Prompt + max_tokens of all admitted generations (engine KV cache size)
+    AGENT_MAX_TOKENS: int = 4096  # max_tokens per autonomous/research step
+    AGENT_MIN_TOKENS: int = 1024  # Agent steps may be admitted with as few as this under KV pressure
+    AGENT_STEP_HEADROOM: float = 1.25  # Never scaled below this times the step's recent largest output
+
+    # Tool Scheduler
+    TOOL_MAX_CONCURRENCY: int = 16  # Tool calls running at once across all sessions
+    TOOL_CONCURRENCY_LIMITS: Dict[str, int] = {}  # Per-tool overrides, e.g. {"pdf_reader": 2}
+
+    # Tool Output Shaping
+    TOOL_OUTPUT_TOKEN_BUDGET: Dict[str, int] = {"default": 1000, "file_tool": 2000, "pdf_reader": 2000}  # Prompt tokens per tool result
+    TOOL_OUTPUT_SPILL_MAX_CHARS: int = 4 * 1024 * 1024  # Longest output spilled to the workspace for paging
+    TOOL_OUTPUT_SPILL_TTL: int = 3600  # Seconds spilled outputs are kept (sessions drop theirs on teardown)
+
+    # Code Execution Sandbox (python_exec, Evaluator)
+    SANDBOX_WORKERS: int = 4  # Pre-started worker processes
+    SANDBOX_MAX_RUNS_PER_WORKER: int = 50  # Recycle workers after this many runs
+    SANDBOX_TIMEOUT: float = 10.0  # Wall-clock seconds per run
+    SANDBOX_CPU_SECONDS: int = 10  # CPU seconds per run (0 = unlimited)
+    SANDBOX_MEMORY_MB: int = 512  # Address-space limit per worker (0 = unlimited)
+    SANDBOX_MAX_OUTPUT_CHARS: int = 64 * 1024  # Per stream; the rest is dropped
+    SANDBOX_ALLOW_NETWORK: bool = False
+    SANDBOX_START_METHOD: str = "forkserver"  # Workers fork from a warm template process ("spawn" = cold start)
+    SANDBOX_PRELOAD_MODULES: List[str] = ["json", "math", "re", "collections", "numpy"]  # Imported once by the template
+    EVALUATOR_CACHE_MAX_ENTRIES: int = 4096  # Test outcomes cached by (code hash, test hash)
+    EVALUATOR_MAX_PARALLEL_CASES: int = 2  # Test cases in flight per evaluator; keep below SANDBOX_WORKERS
+
+    # Shell Tool
+    SHELL_TIMEOUT: float = 30.0  # Hard deadline; the whole process group is killed after it
+    SHELL_MAX_CONCURRENCY: int = 4  # Enforced by the ToolScheduler
+    SHELL_OUTPUT_HEAD_BYTES: int = 16 * 1024  # Kept from the start of each stream
+    SHELL_OUTPUT_TAIL_BYTES: int = 16 * 1024  # Kept from the end of each stream
+
+    # File Tool
+    FILE_MMAP_THRESHOLD_BYTES: int = 1024 * 1024  # Ranged reads of larger files go through mmap + a line index
+    FILE_LIST_MAX_ENTRIES: int = 500
+
+    # PDF Extraction
+    PDF_WORKERS: int = 4
+    PDF_PAGES_PER_TASK: int = 8
+    PDF_MAX_PAGES_PER_CALL: int = 20  # Pagination window per tool call
+    PDF_CACHE_DIR: str = "./data/pdf_cache"  # Per-page text cache, keyed by file content hash
+    PDF_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # Least recently read documents are evicted above this
+
+    # Document Ingestion
+    INGEST_CHUNK_SIZE: int = 1000  # Characters per chunk
+    INGEST_CHUNK_OVERLAP: int = 100
+    INGEST_BATCH_SIZE: int = 128  # Chunks embedded and upserted per call
+    INGEST_MAX_CONCURRENT_JOBS: int = 1
+    INGEST_MAX_JOBS_RETAINED: int = 100
+
+    # Embedding Service
+    EMBEDDING_WORKERS: int = 2
+    EMBEDDING_MAX_BATCH_SIZE: int = 64
+    EMBEDDING_BATCH_WAIT_MS: float = 2.0  # Micro-batching window
+    EMBEDDING_CACHE_SIZE: int = 4096  # LRU entries keyed by text hash
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,74 @@
+import logging
+from typing import List, Dict, Any, Optional
+from novalm.config.settings import settings
+from novalm.core.lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Rendering order and section headers of the memory block
+TIER_HEADERS = {
+    "episodic": "[MEMORY: PAST EPISODES]",
+    "semantic": "[MEMORY: KNOWLEDGE BASE]",
+    "procedural": "[MEMORY: RECOMMENDED WORKFLOWS]",
+}
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for budgeting; not tokenizer-exact."""
+    return len(text) // 4 + 1
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class ContextPacker:
+    """
+    Selects retrieved memories for the prompt under a token budget.
+    Candidates from all tiers are ranked together by distance; anything beyond
+    max_distance is dropped, near-duplicates of an already selected memory are skipped,
+    and the rest fill the budget best-first.
+    """
+    def __init__(self, max_distance: float = None, overlap_threshold: float = None):
+        self.max_distance = settings.MEMORY_CONTEXT_MAX_DISTANCE if max_distance is None else max_distance
+        self.overlap_threshold = settings.MEMORY_CONTEXT_OVERLAP_THRESHOLD if overlap_threshold is None else overlap_threshold
+
+    @staticmethod
+    def budget_for(preset: Optional[str]) -> int:
+        budgets = settings.MEMORY_CONTEXT_TOKEN_BUDGET
+        return budgets.get(preset or "default", budgets.get("default", 0))
+
+    def select(self, candidates: List[Dict[str, Any]], budget_tokens: int) -> List[Dict[str, Any]]:
+        selected = []
+        selected_terms: List[set] = []
+        seen_ids = set()
+        used = 0
+        for candidate in sorted(candidates, key=lambda c: c["distance"]):
+            if candidate["distance"] > self.max_distance:
+                break
+            if candidate["id"] in seen_ids:
+                continue
+            cost = estimate_tokens(candidate["document"])
+            if used + cost > budget_tokens:
+                # A shorter, less relevant memory may still fit
+                continue
+            terms = set(tokenize(candidate["document"]))
+            if any(_jaccard(terms, other) >= self.overlap_threshold for other in selected_terms):
+                continue
+            selected.append(candidate)
+            selected_terms.append(terms)
+            seen_ids.add(candidate["id"])
+            used += cost
+        return selected
+
+    def pack(self, candidates: List[Dict[str, Any]], budget_tokens: int) -> str:
+        """Renders the selected memories as one block, grouped by tier."""
+        if budget_tokens <= 0:
+            return ""
+        selected = self.select(candidates, budget_tokens)
+        block = ""
+        for tier, header in TIER_HEADERS.items():
+            docs = [c["document"] for c in selected if c["tier"] == tier]
+            if docs:
+                block += f"\n{header}\n" + "\n".join(docs) + "\n"
+        logger.debug(f"Context packer: {len(selected)}/{len(candidates)} memories, ~{estimate_tokens(block)} tokens")
+        return block
@@ -0,0 +1,150 @@
+import time
+import queue
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+from novalm.config.settings import settings
+from novalm.core.metrics import EMBEDDING_BATCH_SIZE, EMBEDDING_CACHE_LOOKUPS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingService:
+    """
+    Embedding layer shared by memory and caches.
+    - LRU cache keyed by text hash (the same query is embedded several times per request).
+    - Dynamic micro-batching: concurrent requests are coalesced into one model call.
+    - Dedicated worker pool: embedding CPU work never runs on the event loop thread.
+
+    Implements Chroma's EmbeddingFunction protocol, so it can be passed as `embedding_function`.
+    Callable from sync code (blocks the calling thread) or awaited via embed().
+    """
+    def __init__(
+        self,
+        embedding_function,
+        max_batch_size: int = None,
+        max_wait_ms: float = None,
+        workers: int = None,
+        cache_size: int = None
+    ):
+        self._ef = embedding_function
+        self.max_batch_size = max_batch_size or settings.EMBEDDING_MAX_BATCH_SIZE
+        self.max_wait = (settings.EMBEDDING_BATCH_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self.cache_size = settings.EMBEDDING_CACHE_SIZE if cache_size is None else cache_size
+
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._pending: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers or settings.EMBEDDING_WORKERS,
+            thread_name_prefix="novalm-embed"
+        )
+        self._batcher = threading.Thread(target=self._batch_loop, name="novalm-embed-batcher", daemon=True)
+        self._batcher.start()
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return [f.result() for f in self.submit(input)]
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        return [await asyncio.wrap_future(f) for f in self.submit(texts)]
+
+    def submit(self, texts: List[str]) -> List[Future]:
+        """Returns one future per text. Cached and in-flight texts are never embedded twice."""
+        futures = []
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Embedding service is shut down")
+            for text in texts:
+                key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    EMBEDDING_CACHE_LOOKUPS_TOTAL.labels(result="hit").inc()
+                    future = Future()
+                    future.set_result(cached)
+                    futures.append(future)
+                    continue
+
+                EMBEDDING_CACHE_LOOKUPS_TOTAL.labels(result="miss").inc()
+                future = self._inflight.get(key)
+                if future is None:
+                    future = Future()
+                    self._inflight[key] = future
+                    self._pending.put((key, text, future))
+                futures.append(future)
+        return futures
+
+    def _batch_loop(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+
+            # Collect more requests until the batch is full or the wait window closes
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    nxt = self._pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._pending.put(None)  # Re-queue shutdown signal
+                    break
+                batch.append(nxt)
+
+            try:
+                self._pool.submit(self._run_batch, batch)
+            except RuntimeError:
+                # Shut down while this batch was being collected
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("Embedding service is shut down"))
+                return
+
+    def _run_batch(self, batch: List[tuple]):
+        EMBEDDING_BATCH_SIZE.observe(len(batch))
+        try:
+            vectors = self._ef([text for _, text, _ in batch])
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(batch)} failed: {e}")
+            with self._lock:
+                for key, _, _ in batch:
+                    self._inflight.pop(key, None)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        with self._lock:
+            for (key, _, _), vector in zip(batch, vectors):
+                self._inflight.pop(key, None)
+                if self.cache_size:
+                    self._cache[key] = vector
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        for (_, _, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def shutdown(self):
+        """Stops the batcher and workers; callers still waiting get a RuntimeError instead of hanging."""
+        with self._lock:
+            self._closed = True
+            inflight, self._inflight = self._inflight, {}
+        self._pending.put(None)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        for future in inflight.values():
+            if not future.done():
+                future.set_exception(RuntimeError("Embedding service is shut down"))
@@ -1,68 +1,187 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple
+import ast
+import time
 import asyncio
+import hashlib
 import logging
-from novalm.core.tools.python_exec import PythonExecTool
+from collections import OrderedDict
+from novalm.config.settings import settings
+from novalm.core.sandbox import SandboxPool, get_sandbox_pool
+from novalm.core.workspace import get_workspace_dir
+from novalm.core.metrics import EVALUATOR_CASES_TOTAL
 
 logger = logging.getLogger(__name__)
 
+# Characters of stderr kept per failing case in the feedback
+_FEEDBACK_CHARS = 2000
+
+def split_tests(test_code: str) -> Tuple[str, List[Tuple[str, Optional[str]]]]:
+    """
+    Splits a test module into (prelude, [(case_name, case_source), ...]).
+    Cases are top-level test_* functions and test_* methods of Test* classes; the prelude is
+    everything else (imports, fixtures, helpers) minus any `if __name__ == "__main__"` runner.
+    Cases that take arguments (pytest fixtures, parametrize) can't be called without pytest;
+    their source is None.
+    Returns no cases if the module has none or does not parse; callers then run it whole.
+    """
+    try:
+        tree = ast.parse(test_code)
+    except SyntaxError:
+        return test_code, []
+
+    lines = test_code.splitlines(keepends=True)
+    def source(node: ast.AST) -> str:
+        start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        return "".join(lines[start - 1:node.end_lineno])
+
+    prelude, cases = [], []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+            if _required_args(node):
+                cases.append((node.name, None))
+                continue
+            call = f"import asyncio\nasyncio.run({node.name}())" if isinstance(node, ast.AsyncFunctionDef) else f"{node.name}()"
+            cases.append((node.name, f"{source(node)}\n{call}\n"))
+        elif isinstance(node, ast.ClassDef) and node.name.startswith("Test"):
+            # The class stays in the prelude; each case instantiates it and runs one method
+            prelude.append(source(node))
+            for item in node.body:
+                if isinstance(item, ast.FunctionDef) and item.name.startswith("test"):
+                    runner = None if _required_args(item) > 1 else _method_runner(node.name, item.name)
+                    cases.append((f"{node.name}.{item.name}", runner))
+        elif _is_main_guard(node):
+            continue
+        else:
+            prelude.append(source(node))
+
+    return "\n".join(prelude), cases
+
+def _required_args(node: ast.AST) -> int:
+    """Positional parameters without defaults (including self)."""
+    args = node.args
+    return len(args.posonlyargs) + len(args.args) - len(args.defaults) + sum(
+        1 for default in args.kw_defaults if default is None
+    )
+
+def _method_runner(class_name: str, method: str) -> str:
+    # unittest cases run with setUp/tearDown via debug(), which raises on failure; plain classes are pytest-style
+    return (
+        "import unittest\n"
+        f"if issubclass({class_name}, unittest.TestCase):\n"
+        f"    {class_name}({method!r}).debug()\n"
+        "else:\n"
+        f"    getattr({class_name}(), {method!r})()\n"
+    )
+
+def _is_main_guard(node: ast.AST) -> bool:
+    if not isinstance(node, ast.If) or not isinstance(node.test, ast.Compare):
+        return False
+    parts = [node.test.left] + node.test.comparators
+    return any(isinstance(p, ast.Name) and p.id == "__name__" for p in parts)
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
 class Evaluator:
     """
     Evaluates generated code against provided tests.
-    
-    WARNING: This executes code. In production, this MUST run in a sandboxed environment
-    (e.g., Docker, gVisor, Firecracker).
-    Current implementation is for local development/research only.
+
+    The test module is split into independent cases that run in parallel across sandbox
+    workers (see core/sandbox.py), each as `code + prelude + one test`. At most
+    max_parallel cases are in flight, so one evaluation never occupies the whole shared pool.
+    Outcomes are cached by (code hash, case hash), so across ENGINEER/EVALUATOR iterations only
+    cases whose code or test changed are re-run. Modules without discoverable cases run as one
+    script; cases that need pytest (fixtures, parametrize) are reported as UNSUPPORTED.
     """
-    def __init__(self, timeout_seconds: int = 10):
-        self.exec_tool = PythonExecTool()
+    def __init__(self, timeout_seconds: int = 10, pool: Optional[SandboxPool] = None, max_parallel: int = None):
         self.timeout_seconds = timeout_seconds
+        self.pool = pool
+        self.max_parallel = max(1, max_parallel or settings.EVALUATOR_MAX_PARALLEL_CASES)
+        self._cache: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        # Lazy: created inside the running loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
 
     async def evaluate(self, code: str, test_code: str) -> Dict[str, Any]:
         """
-        Runs the code followed by the test_code.
-        Returns dictionary with status ('PASS'/'FAIL') and feedback.
-        Enforces timeout.
+        Runs every test case against the code.
+        Returns status ('PASS'/'FAIL'), feedback, pass/fail counts and per-test results
+        ({"name", "status": PASS/FAIL/TIMEOUT/UNSUPPORTED, "duration", "error", "cached"}).
         """
-        # Combine code and test
-        full_script = f"{code}\n\n# --- TEST HARNESS ---\n{test_code}"
-        
+        prelude, cases = split_tests(test_code)
+        unsupported = [
+            {"name": name, "status": "UNSUPPORTED", "duration": 0.0, "cached": False,
+             "error": "Takes arguments (pytest fixtures or parametrize); only plain test functions are run."}
+            for name, case in cases if case is None
+        ]
+        cases = [(name, case) for name, case in cases if case is not None]
+        if not cases:
+            # Nothing callable on its own: module-level asserts are all that can run
+            prelude, cases = "", [("<script>", test_code)]
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_parallel)
+        code_hash = _digest(code)
         try:
-            # Enforce Timeout
-            result = await asyncio.wait_for(
-                self.exec_tool.run({"code": full_script}),
-                timeout=self.timeout_seconds
-            )
-        except asyncio.TimeoutError:
-            logger.warning("Evaluation timed out.")
-            return {
-                "status": "FAIL",
-                "feedback": f"Timeout: Test execution exceeded {self.timeout_seconds} seconds. Infinite loop or slow code detected."
-            }
+            results = await asyncio.gather(*[
+                self._run_bounded(code, code_hash, prelude, name, case) for name, case in cases
+            ])
         except Exception as e:
             logger.error(f"Evaluation error: {e}")
             return {
                 "status": "FAIL",
-                "feedback": f"System Error during evaluation: {e}"
-            }
-        
-        # Check Result
-        if result.get("status") == "error":
-            return {
-                "status": "FAIL",
-                "feedback": f"Execution Error:\n{result.get('stderr', '')}\n{result.get('result_summary', '')}"
-            }
-            
-        # Exit Code Check (if tool supports it)
-        # Assuming tool returns 'status'='success' only on 0 exit code.
-        # But we double check stderr for common failures that might not crash python interpreter (e.g. caught exceptions but printed)
-        stderr = result.get("stderr", "")
-        if "Traceback" in stderr or "Error" in stderr or "FAILED" in stderr:
-             return {
-                "status": "FAIL",
-                "feedback": f"Test Failed (Error Detected in Output):\n{stderr}"
+                "feedback": f"System Error during evaluation: {e}",
+                "passed": 0, "failed": len(cases), "tests": []
             }
-            
+
+        failed = [r for r in results if r["status"] != "PASS"]
+        if failed:
+            feedback = f"{len(failed)} of {len(results)} tests failed:\n" + "\n\n".join(
+                f"[{r['status']}] {r['name']}\n{r['error']}" for r in failed
+            )
+        else:
+            feedback = f"All {len(results)} tests passed."
+        if unsupported:
+            feedback += f"\nNot run (need pytest): {', '.join(r['name'] for r in unsupported)}"
         return {
-            "status": "PASS",
-            "feedback": "Tests passed successfully."
+            "status": "FAIL" if failed else "PASS",
+            "feedback": feedback,
+            "passed": len(results) - len(failed),
+            "failed": len(failed),
+            "tests": results + unsupported
         }
+
+    async def _run_bounded(self, *args) -> Dict[str, Any]:
+        async with self._semaphore:
+            return await self._run_case(*args)
+
+    async def _run_case(self, code: str, code_hash: str, prelude: str, name: str, case: str) -> Dict[str, Any]:
+        key = (code_hash, _digest(f"{prelude}\0{case}"))
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            EVALUATOR_CASES_TOTAL.labels(result="cached").inc()
+            return {**cached, "name": name, "cached": True}
+
+        script = f"{code}\n\n# --- TEST HARNESS ---\n{prelude}\n\n{case}"
+        started = time.monotonic()
+        pool = self.pool or get_sandbox_pool()
+        output = await pool.run(script, timeout=self.timeout_seconds, cwd=get_workspace_dir())
+        duration = time.monotonic() - started
+
+        summary = output.get("result_summary", "")
+        if output.get("status") == "success":
+            status, error = "PASS", ""
+        elif "timed out" in summary:
+            status, error = "TIMEOUT", f"Test execution exceeded {self.timeout_seconds} seconds. Infinite loop or slow code detected."
+        else:
+            status = "FAIL"
+            error = (output.get("stderr") or summary)[-_FEEDBACK_CHARS:]
+        EVALUATOR_CASES_TOTAL.labels(result=status.lower()).inc()
+
+        result = {"name": name, "status": status, "duration": round(duration, 3), "error": error, "cached": False}
+        # Timeouts depend on load; only deterministic outcomes are reused
+        if status != "TIMEOUT":
+            self._cache[key] = result
+            while len(self._cache) > settings.EVALUATOR_CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+        return result
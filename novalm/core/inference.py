@@ -1,7 +1,32 @@
+import contextvars
 from abc import ABC, abstractmethod
-from typing import AsyncIterator, List
+from typing import AsyncIterator, List, Optional
 from novalm.core.types import SamplingParams
 
+class TokenUsage:
+    """Tokens generated for one request, summed over all of its engine calls (agent loops make several)."""
+    def __init__(self):
+        self.generated_tokens = 0
+
+# Usage of the request being served by the current task (None when nobody is counting)
+_current_usage: contextvars.ContextVar[Optional[TokenUsage]] = contextvars.ContextVar("novalm_usage", default=None)
+
+def set_usage(usage: Optional[TokenUsage]) -> contextvars.Token:
+    return _current_usage.set(usage)
+
+def reset_usage(token: contextvars.Token):
+    try:
+        _current_usage.reset(token)
+    except ValueError:
+        # Generator finalized from a different context; nothing to restore there
+        pass
+
+def record_generated_tokens(count: int):
+    """Called by engines as they stream, with the number of tokens actually generated."""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.generated_tokens += count
+
 class InferenceEngine(ABC):
     """
     Abstract Base Class for the Inference Engine.
@@ -30,6 +55,7 @@ class InferenceEngine(ABC):
     ) -> AsyncIterator[str]:
         """
         Generates text based on the prompt and sampling parameters.
-        Must return an AsyncIterator that yields strings (tokens/chunks).
+        Must return an AsyncIterator that yields strings (tokens/chunks), reporting the
+        tokens behind them with record_generated_tokens().
         """
         pass
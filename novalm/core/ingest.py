@@ -0,0 +1,158 @@
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+from typing import List, Dict, Optional, Iterator, Tuple, Any
+from novalm.config.settings import settings
+from novalm.core.metrics import INGEST_CHUNKS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+def chunk_text(text: str, chunk_size: int, overlap: int = 0) -> List[str]:
+    """
+    Splits text into chunks of at most chunk_size characters with the given overlap.
+    Prefers to break at paragraph, sentence, then word boundaries in the second half of a window.
+    """
+    text = text.strip()
+    if len(text) <= chunk_size:
+        return [text] if text else []
+
+    overlap = max(0, min(overlap, chunk_size // 2))
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            window = text[start:end]
+            for sep in ("\n\n", ". ", "\n", " "):
+                cut = window.rfind(sep)
+                if cut > chunk_size // 2:
+                    end = start + cut + len(sep)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = end - overlap
+    return chunks
+
+class IngestJob:
+    """Progress record for one background ingestion request."""
+    def __init__(self, total_documents: int):
+        self.id = f"ingest-{uuid.uuid4()}"
+        self.status = "queued"  # queued -> running -> completed | failed
+        self.total_documents = total_documents
+        self.processed_documents = 0
+        self.chunks_total = 0
+        self.chunks_written = 0
+        self.chunks_duplicate = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total_documents": self.total_documents,
+            "processed_documents": self.processed_documents,
+            "chunks_total": self.chunks_total,
+            "chunks_written": self.chunks_written,
+            "chunks_duplicate": self.chunks_duplicate,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+class IngestionPipeline:
+    """
+    Background bulk ingestion into semantic memory.
+    Pipeline: Documents -> Chunking -> Batched Embedding + Upsert (content-hash dedup).
+    Requests return a job immediately; progress is polled by job ID.
+    """
+    def __init__(self, memory):
+        self.memory = memory
+        self.jobs: Dict[str, IngestJob] = {}
+        self._tasks = set()
+        # Lazy: created inside the running loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def submit(
+        self,
+        documents: List[str],
+        metadatas: Optional[List[Dict[str, str]]] = None,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None
+    ) -> IngestJob:
+        if metadatas is not None and len(metadatas) != len(documents):
+            raise ValueError("metadatas must have the same length as documents")
+        chunk_size = chunk_size or settings.INGEST_CHUNK_SIZE
+        chunk_overlap = settings.INGEST_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+
+        job = IngestJob(total_documents=len(documents))
+        self.jobs[job.id] = job
+        self._prune_jobs()
+
+        task = asyncio.create_task(self._run(job, documents, metadatas, chunk_size, chunk_overlap))
+        # Keep a strong reference until done
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self.jobs.get(job_id)
+
+    async def _run(self, job: IngestJob, documents, metadatas, chunk_size: int, chunk_overlap: int):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.INGEST_MAX_CONCURRENT_JOBS)
+
+        async with self._semaphore:
+            job.status = "running"
+            try:
+                batch_docs, batch_metas = [], []
+                for doc_index, chunk, meta in self._iter_chunks(documents, metadatas, chunk_size, chunk_overlap):
+                    batch_docs.append(chunk)
+                    batch_metas.append(meta)
+                    job.chunks_total += 1
+                    if len(batch_docs) >= settings.INGEST_BATCH_SIZE:
+                        await self._flush(job, batch_docs, batch_metas)
+                        batch_docs, batch_metas = [], []
+                        # Chunks of the current document may still be pending
+                        job.processed_documents = doc_index
+                if batch_docs:
+                    await self._flush(job, batch_docs, batch_metas)
+                job.processed_documents = job.total_documents
+                job.status = "completed"
+                logger.info(f"Ingest job {job.id}: {job.chunks_written} chunks written, {job.chunks_duplicate} duplicates skipped")
+            except Exception as e:
+                logger.error(f"Ingest job {job.id} failed: {e}")
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+
+    async def _flush(self, job: IngestJob, docs: List[str], metas: List[Dict[str, Any]]):
+        # Embedding and disk writes are blocking; keep them off the event loop
+        written = await asyncio.to_thread(self.memory.add_semantic_batch, docs, metas, "ingest")
+        job.chunks_written += written
+        job.chunks_duplicate += len(docs) - written
+        INGEST_CHUNKS_TOTAL.labels(result="written").inc(written)
+        INGEST_CHUNKS_TOTAL.labels(result="duplicate").inc(len(docs) - written)
+
+    def _iter_chunks(self, documents, metadatas, chunk_size, chunk_overlap) -> Iterator[Tuple[int, str, Dict[str, Any]]]:
+        for i, document in enumerate(documents):
+            base_meta = dict(metadatas[i]) if metadatas else {}
+            doc_id = hashlib.sha256(document.encode("utf-8")).hexdigest()[:16]
+            for chunk_index, chunk in enumerate(chunk_text(document, chunk_size, chunk_overlap)):
+                yield i, chunk, {**base_meta, "doc_id": doc_id, "chunk_index": chunk_index}
+
+    def _prune_jobs(self):
+        """Drops the oldest finished jobs beyond the retention limit."""
+        finished = [j for j in self.jobs.values() if j.finished_at is not None]
+        excess = len(self.jobs) - settings.INGEST_MAX_JOBS_RETAINED
+        for job in sorted(finished, key=lambda j: j.finished_at)[:max(excess, 0)]:
+            del self.jobs[job.id]
@@ -0,0 +1,122 @@
+import re
+import math
+import threading
+from typing import List, Dict, Tuple, Iterable
+
+# Words that carry no retrieval signal on their own
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or so that the this "
+    "to was what when where which who why will with you your me my we our".split()
+)
+
+# Underscores join identifier parts ('max_tokens' is one word, split into parts below)
+_WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+def _stem(token: str) -> str:
+    """Minimal plural folding ('errors' -> 'error'); enough for triggers and identifiers."""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss") and not token.isdigit():
+        return token[:-1]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens. Code identifiers are kept whole and also split into parts:
+    'RecursionError' -> recursionerror, recursion, error; 'max_tokens' -> max_token, max, token.
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        lower = word.strip("_").lower()
+        if not lower:
+            continue
+        if lower not in STOPWORDS:
+            tokens.append(_stem(lower))
+        parts = _CAMEL_RE.findall(word)
+        if len(parts) > 1:
+            tokens.extend(_stem(p.lower()) for p in parts if p.lower() not in STOPWORDS)
+    return tokens
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring.
+    Maintained alongside a memory collection to catch exact keyword / identifier matches
+    that embedding search ranks poorly, without computing an embedding.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._total_len = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def add(self, doc_id: str, text: str):
+        with self._lock:
+            self._remove(doc_id)
+            terms: Dict[str, int] = {}
+            tokens = tokenize(text or "")
+            for token in tokens:
+                terms[token] = terms.get(token, 0) + 1
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            self._doc_terms[doc_id] = terms
+            self._doc_len[doc_id] = len(tokens)
+            self._total_len += len(tokens)
+
+    def add_many(self, items: Iterable[Tuple[str, str]]):
+        for doc_id, text in items:
+            self.add(doc_id, text)
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: str):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id, 0)
+
+    def search(self, query: str, n: int) -> List[Tuple[str, float, float]]:
+        """
+        Returns up to n (doc_id, score, coverage) sorted by score.
+        Coverage is the fraction of distinct query terms present in the document.
+        """
+        query_terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not query_terms or not n_docs:
+                return []
+            avg_len = self._total_len / n_docs or 1.0
+            scores: Dict[str, float] = {}
+            matched: Dict[str, int] = {}
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = tf + self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+                    matched[doc_id] = matched.get(doc_id, 0) + 1
+
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:n]
+        return [(doc_id, score, matched[doc_id] / len(query_terms)) for doc_id, score in ranked]
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """Fuses ranked ID lists: score(d) = sum 1 / (k + rank). Robust to incomparable score scales."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return [doc_id for doc_id, _ in sorted(scores.items(), key=lambda kv: kv[1], reverse=True)]
@@ -1,9 +1,13 @@
 import os
 import time
+import asyncio
 import logging
 import hashlib
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 from novalm.config.settings import settings
+from novalm.core.embeddings import EmbeddingService
+from novalm.core.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+from novalm.core.metrics import MEMORY_RETRIEVALS_TOTAL
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +17,21 @@ try:
     CHROMA_AVAILABLE = True
 except ImportError:
     CHROMA_AVAILABLE = False
-    logger.warning("ChromaDB not found. Memory will be disabled.")
+    if settings.MEMORY_BACKEND == "chroma":
+        logger.warning("ChromaDB not found. Memory will be disabled.")
+
+# Model behind _default_embedding_function (recorded in snapshots)
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+def _default_embedding_function():
+    """Chroma's default (all-MiniLM-L6-v2 via ONNX), or the same model via sentence-transformers."""
+    if CHROMA_AVAILABLE:
+        return embedding_functions.DefaultEmbeddingFunction()
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(EMBEDDING_MODEL)
+    return lambda input: model.encode(list(input)).tolist()
+
+TIERS = ("episodic", "semantic", "procedural")
 
 class AdvancedMemory:
     """
@@ -22,71 +40,244 @@ class AdvancedMemory:
     1. Episodic: Past task executions (Goal -> Result).
     2. Semantic: General knowledge, docs, facts (Concept -> Info).
     3. Procedural: Heuristics and standard workflows (Trigger -> Routine).
+    
+    Backends (settings.MEMORY_BACKEND):
+    - "chroma": chromadb.PersistentClient (default).
+    - "numpy": in-process memory-mapped NumPy store (see novalm.core.vector_store).
     """
     def __init__(self):
         self.client = None
         self.episodic = None
         self.semantic = None
         self.procedural = None
+        # Retrieval counts since the last compaction (memory ID -> hits)
+        self._hits: Dict[str, int] = {}
+        # BM25 inverted index per tier (built lazily from the collection)
+        self._lexical: Dict[str, BM25Index] = {}
+        self._embedding_dim: Optional[int] = None
         
-        if CHROMA_AVAILABLE:
-            try:
+        try:
+            if settings.MEMORY_BACKEND == "numpy":
+                from novalm.core.vector_store import NumpyVectorClient
+                self.client = NumpyVectorClient(settings.VECTOR_STORE_PATH, read_only=settings.MEMORY_READ_ONLY)
+            elif CHROMA_AVAILABLE:
                 # Persistent storage
                 self.client = chromadb.PersistentClient(path="./data/chroma")
-                self.ef = embedding_functions.DefaultEmbeddingFunction()
-                
-                # 1. Episodic (Formerly 'experiences')
-                self.episodic = self.client.get_or_create_collection(
-                    name="episodic_memory",
-                    embedding_function=self.ef
-                )
-                
-                # 2. Semantic (Formerly 'docs')
-                self.semantic = self.client.get_or_create_collection(
-                    name="semantic_memory",
-                    embedding_function=self.ef
-                )
-                
-                # 3. Procedural (New)
-                self.procedural = self.client.get_or_create_collection(
-                    name="procedural_memory",
-                    embedding_function=self.ef
-                )
+            else:
+                return
+            
+            # Cached, micro-batched, off the event loop
+            self.ef = EmbeddingService(_default_embedding_function())
+            
+            # 1. Episodic (Formerly 'experiences')
+            self.episodic = self.client.get_or_create_collection(
+                name="episodic_memory",
+                embedding_function=self.ef
+            )
+            
+            # 2. Semantic (Formerly 'docs')
+            self.semantic = self.client.get_or_create_collection(
+                name="semantic_memory",
+                embedding_function=self.ef
+            )
+            
+            # 3. Procedural (New)
+            self.procedural = self.client.get_or_create_collection(
+                name="procedural_memory",
+                embedding_function=self.ef
+            )
+        except Exception as e:
+            logger.error(f"Failed to initialize memory backend '{settings.MEMORY_BACKEND}': {e}")
+            self.client = None
+            self.episodic = self.semantic = self.procedural = None
+            return
+        
+        # Fast start for new replicas: seed empty memory from a snapshot (no re-embedding)
+        if settings.MEMORY_SNAPSHOT_PATH and not settings.MEMORY_READ_ONLY and os.path.exists(settings.MEMORY_SNAPSHOT_PATH):
+            try:
+                if all(self._collection(tier).count() == 0 for tier in TIERS):
+                    self.import_snapshot(settings.MEMORY_SNAPSHOT_PATH)
             except Exception as e:
-                logger.error(f"Failed to initialize ChromaDB: {e}")
+                logger.error(f"Failed to load memory snapshot {settings.MEMORY_SNAPSHOT_PATH}: {e}")
                 
     def _generate_id(self, content: str) -> str:
         """Stable ID generation using SHA-256."""
         return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
 
+    def _collection(self, tier: str):
+        return {"episodic": self.episodic, "semantic": self.semantic, "procedural": self.procedural}[tier]
+
+    def _lexical_index(self, tier: str) -> BM25Index:
+        """BM25 index for a tier, built from the collection on first use."""
+        index = self._lexical.get(tier)
+        if index is None:
+            index = BM25Index()
+            data = self._collection(tier).get(include=["documents"])
+            index.add_many(zip(data["ids"], data["documents"]))
+            self._lexical[tier] = index
+        return index
+
+    def _index_documents(self, tier: str, ids: List[str], documents: List[str]):
+        # Unbuilt indexes pick the documents up when they are built
+        index = self._lexical.get(tier)
+        if index is not None:
+            index.add_many(zip(ids, documents))
+
+    def _query(self, tier: str, query: str, n: int) -> List[str]:
+        return [doc for _, doc, _ in self._query_scored(tier, query, n)]
+
+    def _query_scored(self, tier: str, query: str, n: int) -> List[Tuple[str, str, float]]:
+        """
+        Hybrid retrieval: BM25 over the tier's inverted index fused (RRF) with vector search.
+        Lexical-only fast path (no embedding) when at least n documents match most terms of a
+        multi-term query and BM25 clearly separates the top n from the next candidate (with one
+        or two terms, coverage alone can't rank the many documents that contain them).
+        Also records which memories were retrieved (usefulness signal for compaction).
+        
+        Returns (id, document, distance) in rank order. Distance is cosine distance for vector
+        matches and query-term coverage mapped onto that scale for lexical matches (see
+        _lexical_distance; the smaller of the two if both), so scores are comparable across tiers.
+        """
+        collection = self._collection(tier)
+        lexical = []
+        if settings.MEMORY_HYBRID_ENABLED:
+            lexical = self._lexical_index(tier).search(query, n * settings.MEMORY_HYBRID_CANDIDATES)
+        distances = {doc_id: self._lexical_distance(coverage) for doc_id, _, coverage in lexical}
+        
+        if self._lexical_fastpath(query, lexical, n):
+            ids = [doc_id for doc_id, _, _ in lexical[:n]]
+            MEMORY_RETRIEVALS_TOTAL.labels(tier=tier, path="lexical").inc()
+            got = collection.get(ids=ids, include=["documents"])
+            docs_by_id = dict(zip(got["ids"], got["documents"]))
+        else:
+            res = collection.query(query_texts=[query], n_results=n * (settings.MEMORY_HYBRID_CANDIDATES if lexical else 1))
+            if not res or not res["documents"]:
+                return []
+            docs_by_id = dict(zip(res["ids"][0], res["documents"][0]))
+            for doc_id, distance in zip(res["ids"][0], (res.get("distances") or [[]])[0]):
+                distance = self._cosine_distance(collection, distance)
+                distances[doc_id] = min(distance, distances.get(doc_id, distance))
+            ids = res["ids"][0][:n]
+            if lexical:
+                MEMORY_RETRIEVALS_TOTAL.labels(tier=tier, path="hybrid").inc()
+                ids = reciprocal_rank_fusion(
+                    [res["ids"][0], [doc_id for doc_id, _, _ in lexical]], k=settings.MEMORY_HYBRID_RRF_K
+                )[:n]
+                missing = [uid for uid in ids if uid not in docs_by_id]
+                if missing:
+                    got = collection.get(ids=missing, include=["documents"])
+                    docs_by_id.update(zip(got["ids"], got["documents"]))
+            else:
+                MEMORY_RETRIEVALS_TOTAL.labels(tier=tier, path="vector").inc()
+        
+        for uid in ids:
+            self._hits[uid] = self._hits.get(uid, 0) + 1
+        return [(uid, docs_by_id[uid], distances.get(uid, 1.0)) for uid in ids if uid in docs_by_id]
+
+    @staticmethod
+    def _lexical_fastpath(query: str, lexical: List[Tuple[str, float, float]], n: int) -> bool:
+        """True if the top n BM25 results can be returned without vector search."""
+        if len(lexical) < n or len(set(tokenize(query))) < settings.MEMORY_LEXICAL_FASTPATH_MIN_TERMS:
+            return False
+        if any(coverage < settings.MEMORY_LEXICAL_FASTPATH_COVERAGE for _, _, coverage in lexical[:n]):
+            return False
+        if len(lexical) > n:
+            return lexical[n - 1][1] >= settings.MEMORY_LEXICAL_FASTPATH_SEPARATION * lexical[n][1]
+        return True
+
+    @staticmethod
+    def _lexical_distance(coverage: float) -> float:
+        """
+        Query-term coverage on the cosine-distance scale that ContextPacker thresholds. 1 - coverage
+        isn't on that scale: half the query terms (0.5) would beat many relevant embeddings. Full
+        coverage maps to 0 and MEMORY_LEXICAL_MIN_COVERAGE to MEMORY_CONTEXT_MAX_DISTANCE, so a
+        lexical-only match is packed exactly when it covers at least that fraction of the query.
+        """
+        floor = min(settings.MEMORY_LEXICAL_MIN_COVERAGE, 0.99)
+        return settings.MEMORY_CONTEXT_MAX_DISTANCE * (1.0 - coverage) / (1.0 - floor)
+
+    @staticmethod
+    def _cosine_distance(collection, distance: float) -> float:
+        """Maps a collection's native distance to cosine distance (embeddings are unit-normalized)."""
+        # Numpy collections expose .space; Chroma keeps it in the collection metadata
+        space = getattr(collection, "space", None) or (getattr(collection, "metadata", None) or {}).get("hnsw:space", "l2")
+        if space == "l2":
+            # Squared L2 between unit vectors = 2 * (1 - cos)
+            return distance / 2.0
+        return distance
+
     # --- EPISODIC (Past Runs) ---
     def add_episodic(self, task: str, solution: str, outcome: str, feedback: str = ""):
         if not self.episodic: return
         
         document = f"Task: {task}\nResult: {outcome}\nSolution:\n{solution}\nFeedback: {feedback}"
+        # Stable ID: solving the same task with the same outcome again refreshes the episode
+        uid = f"epi_{self._generate_id(task)}_{self._generate_id(outcome)[:4]}"
         meta = {"outcome": outcome, "timestamp": time.time(), "type": "episodic"}
-        # Unique ID based on task hash + timestamp
-        uid = f"epi_{self._generate_id(task)}_{int(time.time())}"
         
-        self.episodic.add(documents=[document], metadatas=[meta], ids=[uid])
+        existing = self.episodic.get(ids=[uid], include=["metadatas"])
+        if existing["ids"]:
+            meta["occurrences"] = existing["metadatas"][0].get("occurrences", 1) + 1
+        
+        # Large bodies go to cold storage; the index keeps a short, retrievable summary
+        if len(document) > settings.MEMORY_COLD_THRESHOLD_CHARS:
+            document = self._to_cold(uid, document, f"Task: {task}\nResult: {outcome}\nFeedback: {feedback[:500]}")
+            meta["cold"] = True
+        
+        self.episodic.upsert(documents=[document], metadatas=[meta], ids=[uid])
+        self._index_documents("episodic", [uid], [document])
         logger.info(f"Memory (Episodic): Saved '{task[:30]}...' ({outcome})")
 
     def retrieve_episodic(self, query: str, n=2) -> List[str]:
         if not self.episodic: return []
-        res = self.episodic.query(query_texts=[query], n_results=n)
-        return res["documents"][0] if res and res["documents"] else []
+        return self._query("episodic", query, n)
 
     # --- SEMANTIC (Knowledge) ---
     def add_semantic(self, content: str, source: str = "manual"):
         if not self.semantic: return
-        uid = f"sem_{self._generate_id(content)}_{int(time.time())}"
-        self.semantic.add(documents=[content], metadatas=[{"source": source, "timestamp": time.time()}], ids=[uid])
+        uid = f"sem_{self._generate_id(content)}"
+        self.semantic.upsert(documents=[content], metadatas=[{"source": source, "timestamp": time.time()}], ids=[uid])
+        self._index_documents("semantic", [uid], [content])
         logger.info(f"Memory (Semantic): Saved content from {source}")
 
+    def add_semantic_batch(self, contents: List[str], metadatas: Optional[List[Dict]] = None, source: str = "ingest", upsert: bool = False) -> int:
+        """
+        Bulk upsert into semantic memory with content-hash IDs.
+        Documents already stored (or repeated within the batch) are skipped, so re-ingesting is idempotent;
+        with upsert=True stored documents are rewritten instead, refreshing their metadata and timestamp
+        like add_semantic() does. All written documents are embedded in a single call.
+        Returns the number of documents written.
+        """
+        if not self.semantic or not contents: return 0
+        metadatas = metadatas or [{} for _ in contents]
+        
+        # Dedup within the batch
+        batch = {}
+        for content, meta in zip(contents, metadatas):
+            uid = f"sem_{self._generate_id(content)}"
+            if uid not in batch:
+                batch[uid] = (content, {"source": source, **meta, "timestamp": time.time()})
+        
+        if upsert:
+            new_ids = list(batch.keys())
+        else:
+            # Dedup against the store
+            existing = set(self.semantic.get(ids=list(batch.keys()), include=[])["ids"])
+            new_ids = [uid for uid in batch if uid not in existing]
+        if not new_ids: return 0
+        
+        self.semantic.upsert(
+            documents=[batch[uid][0] for uid in new_ids],
+            metadatas=[batch[uid][1] for uid in new_ids],
+            ids=new_ids
+        )
+        self._index_documents("semantic", new_ids, [batch[uid][0] for uid in new_ids])
+        logger.info(f"Memory (Semantic): Bulk saved {len(new_ids)} documents from {source}")
+        return len(new_ids)
+
     def retrieve_semantic(self, query: str, n=2) -> List[str]:
         if not self.semantic: return []
-        res = self.semantic.query(query_texts=[query], n_results=n)
-        return res["documents"][0] if res and res["documents"] else []
+        return self._query("semantic", query, n)
 
     # --- PROCEDURAL (Workflows/Heuristics) ---
     def add_procedural(self, trigger: str, routine: str):
@@ -96,16 +287,27 @@ class AdvancedMemory:
         """
         if not self.procedural: return
         document = f"Context: {trigger}\nWorkflow:\n{routine}"
-        uid = f"proc_{self._generate_id(trigger)}_{int(time.time())}"
-        self.procedural.add(documents=[document], metadatas=[{"trigger": trigger, "timestamp": time.time()}], ids=[uid])
+        # Stable ID: re-seeding the same heuristic overwrites it
+        uid = f"proc_{self._generate_id(trigger)}"
+        self.procedural.upsert(documents=[document], metadatas=[{"trigger": trigger, "timestamp": time.time()}], ids=[uid])
+        self._index_documents("procedural", [uid], [document])
         logger.info(f"Memory (Procedural): Saved workflow for '{trigger}'")
 
     def retrieve_procedural(self, query: str, n=2) -> List[str]:
         if not self.procedural: return []
-        res = self.procedural.query(query_texts=[query], n_results=n)
-        return res["documents"][0] if res and res["documents"] else []
+        return self._query("procedural", query, n)
 
     # --- AGGREGATE ---
+    def retrieve_scored(self, query: str, n: int = 4) -> List[Dict]:
+        """Top n candidates from each tier as {"tier", "id", "document", "distance"} (for context packing)."""
+        candidates = []
+        for tier in TIERS:
+            if self._collection(tier) is None:
+                continue
+            for uid, document, distance in self._query_scored(tier, query, n):
+                candidates.append({"tier": tier, "id": uid, "document": document, "distance": distance})
+        return candidates
+
     def retrieve_all(self, query: str) -> Dict[str, List[str]]:
         return {
             "episodic": self.retrieve_episodic(query),
@@ -113,5 +315,252 @@ class AdvancedMemory:
             "procedural": self.retrieve_procedural(query)
         }
 
+    # --- COLD STORAGE ---
+    def _to_cold(self, uid: str, document: str, summary: str) -> str:
+        """Writes the full body to cold storage and returns the summary to index instead."""
+        os.makedirs(settings.MEMORY_COLD_DIR, exist_ok=True)
+        with open(os.path.join(settings.MEMORY_COLD_DIR, f"{uid}.txt"), "w", encoding="utf-8") as f:
+            f.write(document)
+        return f"{summary}\n[Full episode in cold storage: {uid}]"
+
+    def load_cold(self, uid: str) -> Optional[str]:
+        """Returns the full body of a memory moved to cold storage."""
+        path = os.path.join(settings.MEMORY_COLD_DIR, f"{uid}.txt")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    # --- SNAPSHOTS ---
+    def _embedding_dimension(self) -> int:
+        """Output size of the embedding model (one probe embedding, then cached)."""
+        if self._embedding_dim is None:
+            self._embedding_dim = len(self.ef(["dimension probe"])[0])
+        return self._embedding_dim
+
+    def export_snapshot(self, path: str, batch_size: int = 1024) -> Dict[str, int]:
+        """
+        Writes all tiers (documents, metadata, embeddings, cold bodies) to one snapshot file.
+        Returns per-tier counts.
+        """
+        from novalm.core.memory_snapshot import write_snapshot
+        
+        tiers = {}
+        for tier in TIERS:
+            collection = self._collection(tier)
+            if collection is None:
+                continue
+            data = self._get_all(collection, ["documents", "metadatas", "embeddings"], batch_size)
+            cold = {}
+            for uid, meta in zip(data["ids"], data["metadatas"]):
+                if (meta or {}).get("cold"):
+                    body = self.load_cold(uid)
+                    if body is not None:
+                        cold[uid] = body
+            tiers[tier] = {**data, "cold": cold}
+        
+        write_snapshot(path, tiers, meta={
+            "backend": settings.MEMORY_BACKEND,
+            "embedding_model": EMBEDDING_MODEL,
+            "embedding_dim": self._embedding_dimension()
+        })
+        counts = {tier: len(data["ids"]) for tier, data in tiers.items()}
+        logger.info(f"Memory: Exported snapshot to {path} ({counts})")
+        return counts
+
+    def import_snapshot(self, path: str, batch_size: int = 1024) -> Dict[str, int]:
+        """
+        Upserts every memory in a snapshot, reusing its stored embeddings.
+        Existing memories with the same IDs are overwritten. Returns per-tier counts.
+        Raises ValueError, before writing anything, if the snapshot was embedded by another model
+        or with another dimension (its vectors would not be comparable to new queries).
+        """
+        from novalm.core.memory_snapshot import read_snapshot
+        
+        snapshot = read_snapshot(path)
+        meta = snapshot["meta"]
+        model, dim = meta.get("embedding_model"), meta.get("embedding_dim")
+        if model is None or dim is None:
+            raise ValueError(f"Memory snapshot {path} does not record its embedding model; re-export it")
+        if model != EMBEDDING_MODEL or dim != self._embedding_dimension():
+            raise ValueError(
+                f"Memory snapshot {path} was embedded with {model} ({dim} dims); "
+                f"this memory uses {EMBEDDING_MODEL} ({self._embedding_dimension()} dims)"
+            )
+        for tier, data in snapshot["tiers"].items():
+            if len(data["ids"]) and data["embeddings"].shape[1] != dim:
+                raise ValueError(f"Corrupt memory snapshot {path}: tier '{tier}' has {data['embeddings'].shape[1]}-dim embeddings, meta says {dim}")
+        counts = {}
+        for tier, data in snapshot["tiers"].items():
+            collection = self._collection(tier) if tier in TIERS else None
+            if collection is None:
+                logger.warning(f"Memory: Snapshot tier '{tier}' skipped (not available)")
+                continue
+            ids = data["ids"]
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                collection.upsert(
+                    ids=ids[start:end],
+                    documents=data["documents"][start:end],
+                    metadatas=data["metadatas"][start:end],
+                    embeddings=data["embeddings"][start:end].tolist()
+                )
+            self._index_documents(tier, ids, data["documents"])
+            for uid, body in data["cold"].items():
+                if self.load_cold(uid) is None:
+                    self._to_cold(uid, body, "")
+            counts[tier] = len(ids)
+        
+        logger.info(f"Memory: Imported snapshot {path} ({counts})")
+        return counts
+
+    # --- MAINTENANCE ---
+    @staticmethod
+    def _get_all(collection, include: List[str], batch_size: int) -> Dict[str, list]:
+        """collection.get() of every record, fetched batch_size records at a time."""
+        data: Dict[str, list] = {"ids": [], **{key: [] for key in include}}
+        offset = 0
+        while True:
+            page = collection.get(include=include, offset=offset, limit=batch_size)
+            for key in data:
+                data[key].extend(page[key])
+            if len(page["ids"]) < batch_size:
+                return data
+            offset += batch_size
+
+    def compact(self, batch_size: int = 1024) -> Dict[str, Dict[str, int]]:
+        """
+        Bounds collection sizes so retrieval latency stays flat:
+        1. Moves oversized episode bodies to cold storage.
+        2. Merges near-duplicates (cosine >= MEMORY_DEDUP_THRESHOLD), keeping the most useful copy.
+        3. Scores usefulness = (1 + hits + occurrences) decayed by age, and enforces per-tier caps.
+        Returns per-tier counts of merged and evicted memories.
+        Reads and writes go batch_size records at a time (Chroma caps the size of one call).
+        """
+        hits, self._hits = self._hits, {}
+        stats = {}
+        for tier, collection in (("episodic", self.episodic), ("semantic", self.semantic), ("procedural", self.procedural)):
+            if not collection:
+                continue
+            try:
+                stats[tier] = self._compact_collection(tier, collection, hits, batch_size)
+            except Exception as e:
+                logger.error(f"Memory compaction failed for {tier}: {e}")
+        return stats
+
+    def _near_duplicates(self, embeddings, block: int = 1024) -> Dict[int, List[int]]:
+        """Index -> indices with cosine similarity >= MEMORY_DEDUP_THRESHOLD (blocked matrix products)."""
+        import numpy as np
+        
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        duplicates: Dict[int, List[int]] = {}
+        for start in range(0, len(vectors), block):
+            sims = vectors[start:start + block] @ vectors.T
+            for r, c in zip(*np.nonzero(sims >= settings.MEMORY_DEDUP_THRESHOLD)):
+                i = start + int(r)
+                if i != int(c):
+                    duplicates.setdefault(i, []).append(int(c))
+        return duplicates
+
+    def _compact_collection(self, tier: str, collection, hits: Dict[str, int], batch_size: int = 1024) -> Dict[str, int]:
+        data = self._get_all(collection, ["documents", "metadatas", "embeddings"], batch_size)
+        ids, docs, metas = data["ids"], data["documents"], data["metadatas"]
+        if not ids:
+            return {"merged": 0, "evicted": 0, "cold": 0}
+        
+        now = time.time()
+        metas = [dict(m or {}) for m in metas]
+        for uid, meta in zip(ids, metas):
+            meta["hits"] = meta.get("hits", 0) + hits.get(uid, 0)
+        
+        # 1. Cold storage for oversized bodies
+        cold_ids, cold_docs = [], []
+        if tier == "episodic":
+            for i, (uid, doc) in enumerate(zip(ids, docs)):
+                if not metas[i].get("cold") and doc and len(doc) > settings.MEMORY_COLD_THRESHOLD_CHARS:
+                    summary = "\n".join(line for line in doc.splitlines() if line.startswith(("Task:", "Result:")))
+                    cold_docs.append(self._to_cold(uid, doc, summary))
+                    cold_ids.append(uid)
+                    metas[i]["cold"] = True
+        
+        # 2. Usefulness with age decay
+        half_life = settings.MEMORY_HALF_LIFE_DAYS.get(tier, 0) * 86400
+        def score(i: int) -> float:
+            value = 1.0 + metas[i]["hits"] + metas[i].get("occurrences", 1) - 1
+            if half_life:
+                age = now - metas[i].get("last_used", metas[i].get("timestamp", now))
+                value *= 0.5 ** (max(age, 0) / half_life)
+            return value
+        scores = [score(i) for i in range(len(ids))]
+        
+        # 3. Greedy near-duplicate merge, most useful first
+        order = sorted(range(len(ids)), key=lambda i: scores[i], reverse=True)
+        duplicates = self._near_duplicates(data["embeddings"]) if len(ids) <= settings.MEMORY_DEDUP_MAX_ITEMS else {}
+        kept: List[int] = []
+        kept_set = set()
+        removed = set()
+        for i in order:
+            survivor = next((j for j in duplicates.get(i, ()) if j in kept_set), None)
+            if survivor is not None:
+                metas[survivor]["hits"] += metas[i]["hits"]
+                metas[survivor]["occurrences"] = metas[survivor].get("occurrences", 1) + metas[i].get("occurrences", 1)
+                scores[survivor] += scores[i]
+                removed.add(i)
+                continue
+            kept.append(i)
+            kept_set.add(i)
+        merged = len(removed)
+        
+        # 4. Per-tier cap: evict the least useful
+        cap = settings.MEMORY_MAX_ITEMS.get(tier, 0)
+        evicted = 0
+        if cap and len(kept) > cap:
+            kept.sort(key=lambda i: scores[i], reverse=True)
+            for i in kept[cap:]:
+                removed.add(i)
+                evicted += 1
+            kept = kept[:cap]
+        
+        # Apply
+        if removed:
+            removed_ids = [ids[i] for i in removed]
+            for start in range(0, len(removed_ids), batch_size):
+                collection.delete(ids=removed_ids[start:start + batch_size])
+            index = self._lexical.get(tier)
+            for uid in removed_ids:
+                if index is not None:
+                    index.remove(uid)
+                cold_path = os.path.join(settings.MEMORY_COLD_DIR, f"{uid}.txt")
+                if os.path.exists(cold_path):
+                    os.remove(cold_path)
+        
+        for i in kept:
+            if hits.get(ids[i]):
+                metas[i]["last_used"] = now
+        for start in range(0, len(kept), batch_size):
+            batch = kept[start:start + batch_size]
+            collection.update(ids=[ids[i] for i in batch], metadatas=[metas[i] for i in batch])
+        
+        removed_ids = set(ids[i] for i in removed)
+        cold_kept = [(uid, doc) for uid, doc in zip(cold_ids, cold_docs) if uid not in removed_ids]
+        if cold_kept:
+            for start in range(0, len(cold_kept), batch_size):
+                batch = cold_kept[start:start + batch_size]
+                collection.update(ids=[uid for uid, _ in batch], documents=[doc for _, doc in batch])
+            self._index_documents(tier, [uid for uid, _ in cold_kept], [doc for _, doc in cold_kept])
+        
+        logger.info(f"Memory compaction ({tier}): merged {merged}, evicted {evicted}, cold {len(cold_kept)}, kept {len(kept)}")
+        return {"merged": merged, "evicted": evicted, "cold": len(cold_kept)}
+
+async def compaction_loop(memory: "AdvancedMemory", interval_seconds: int):
+    """Periodic background compaction. Runs in a worker thread so it never blocks the event loop."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await asyncio.to_thread(memory.compact)
+        except Exception as e:
+            logger.error(f"Memory compaction failed: {e}")
+
 # Alias for compatibility
 VectorMemory = AdvancedMemory
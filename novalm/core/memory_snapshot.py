@@ -0,0 +1,97 @@
+"""
+Memory snapshot file format (little-endian):
+
+    header   : magic b"NVMS" | version u16 | tier count u16 | meta length u32 | meta JSON
+    per tier : name length u16 | name | count u32 | dim u32 | payload length u64
+               | embeddings (count * dim float32, row-major)
+               | payload (zlib-compressed JSON: ids, documents, metadatas, cold bodies)
+
+Embeddings are stored raw so importing never re-embeds; text is compressed. The meta JSON
+records the embedding model and dimension, so vectors are never imported into a memory that
+embeds queries differently.
+"""
+
+import os
+import json
+import time
+import zlib
+import struct
+from typing import Dict, Any, BinaryIO
+
+import numpy as np
+
+MAGIC = b"NVMS"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHHI")
+_TIER = struct.Struct("<IIQ")
+
+def write_snapshot(path: str, tiers: Dict[str, Dict[str, Any]], meta: Dict[str, Any] = None):
+    """
+    tiers: name -> {"ids", "documents", "metadatas", "embeddings", "cold"}.
+    Written to a temp file and renamed, so readers never see a partial snapshot.
+    """
+    meta_bytes = json.dumps({"created_at": time.time(), **(meta or {})}).encode("utf-8")
+    tmp = f"{path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(tiers), len(meta_bytes)))
+        f.write(meta_bytes)
+        for name, data in tiers.items():
+            _write_tier(f, name, data)
+    os.replace(tmp, path)
+
+def _write_tier(f: BinaryIO, name: str, data: Dict[str, Any]):
+    ids = list(data["ids"])
+    embeddings = np.asarray(data["embeddings"] if len(ids) else [], dtype="<f4")
+    dim = embeddings.shape[1] if embeddings.ndim == 2 else 0
+    payload = zlib.compress(json.dumps({
+        "ids": ids,
+        "documents": list(data["documents"]),
+        "metadatas": list(data["metadatas"]),
+        "cold": data.get("cold", {})
+    }).encode("utf-8"))
+
+    name_bytes = name.encode("utf-8")
+    f.write(struct.pack("<H", len(name_bytes)))
+    f.write(name_bytes)
+    f.write(_TIER.pack(len(ids), dim, len(payload)))
+    f.write(np.ascontiguousarray(embeddings).tobytes())
+    f.write(payload)
+
+def read_snapshot(path: str) -> Dict[str, Any]:
+    """Returns {"meta": {...}, "tiers": name -> {"ids", "documents", "metadatas", "embeddings", "cold"}}."""
+    with open(path, "rb") as f:
+        buf = f.read()
+
+    if len(buf) < _HEADER.size:
+        raise ValueError(f"{path} is not a memory snapshot (too short)")
+    magic, version, tier_count, meta_len = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a memory snapshot (bad magic)")
+    if version > VERSION:
+        raise ValueError(f"Unsupported memory snapshot version {version} (max {VERSION})")
+
+    offset = _HEADER.size
+    meta = json.loads(buf[offset:offset + meta_len])
+    offset += meta_len
+
+    tiers = {}
+    for _ in range(tier_count):
+        (name_len,) = struct.unpack_from("<H", buf, offset)
+        offset += 2
+        name = buf[offset:offset + name_len].decode("utf-8")
+        offset += name_len
+        count, dim, payload_len = _TIER.unpack_from(buf, offset)
+        offset += _TIER.size
+
+        emb_len = count * dim * 4
+        embeddings = np.frombuffer(buf, dtype="<f4", count=count * dim, offset=offset).reshape(count, dim)
+        offset += emb_len
+        payload = json.loads(zlib.decompress(buf[offset:offset + payload_len]))
+        offset += payload_len
+
+        if len(payload["ids"]) != count:
+            raise ValueError(f"Corrupt memory snapshot: tier '{name}' has {len(payload['ids'])} ids, header says {count}")
+        tiers[name] = {**payload, "embeddings": embeddings}
+    return {"meta": meta, "tiers": tiers}
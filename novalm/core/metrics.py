@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Histogram, Gauge
 
 # Metric Definitions
 GENERATED_TOKENS_TOTAL = Counter(
@@ -12,3 +12,172 @@ INFERENCE_LATENCY_SECONDS = Histogram(
     "Time taken for inference request processing",
     ["model"]
 )
+
+# Semantic Cache
+SEMANTIC_CACHE_LOOKUPS_TOTAL = Counter(
+    "novalm_semantic_cache_lookups_total",
+    "Semantic cache lookups by result (hit/miss)",
+    ["model", "preset", "result"]
+)
+
+SEMANTIC_CACHE_FALSE_HITS_TOTAL = Counter(
+    "novalm_semantic_cache_false_hits_total",
+    "Verified semantic cache hits whose fresh generation diverged from the cached response",
+    ["model", "preset"]
+)
+
+SEMANTIC_CACHE_SIMILARITY = Histogram(
+    "novalm_semantic_cache_similarity",
+    "Similarity of the nearest cached request at lookup time",
+    buckets=[0.5, 0.7, 0.8, 0.85, 0.9, 0.925, 0.95, 0.975, 0.99, 1.0]
+)
+
+# Tool Result Cache
+TOOL_CACHE_LOOKUPS_TOTAL = Counter(
+    "novalm_tool_cache_lookups_total",
+    "Tool result cache lookups by tool and result (hit/miss)",
+    ["tool", "result"]
+)
+
+# Document Ingestion
+INGEST_CHUNKS_TOTAL = Counter(
+    "novalm_ingest_chunks_total",
+    "Chunks processed by the ingestion pipeline by result (written/duplicate)",
+    ["result"]
+)
+
+# Embedding Service
+EMBEDDING_BATCH_SIZE = Histogram(
+    "novalm_embedding_batch_size",
+    "Number of texts per embedding model call after micro-batching",
+    buckets=[1, 2, 4, 8, 16, 32, 64, 128]
+)
+
+EMBEDDING_CACHE_LOOKUPS_TOTAL = Counter(
+    "novalm_embedding_cache_lookups_total",
+    "Embedding LRU cache lookups by result (hit/miss)",
+    ["result"]
+)
+
+# Memory Retrieval
+MEMORY_RETRIEVALS_TOTAL = Counter(
+    "novalm_memory_retrievals_total",
+    "Memory retrievals by tier and path (lexical fast path / hybrid / vector)",
+    ["tier", "path"]
+)
+
+# Memory Write-Behind Queue
+MEMORY_WRITE_QUEUE_DEPTH = Gauge(
+    "novalm_memory_write_queue_depth",
+    "Memory writes waiting to be flushed"
+)
+
+MEMORY_WRITE_LAG_SECONDS = Histogram(
+    "novalm_memory_write_lag_seconds",
+    "Time from submitting a memory write to it being persisted",
+    buckets=[0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30]
+)
+
+MEMORY_WRITES_TOTAL = Counter(
+    "novalm_memory_writes_total",
+    "Write-behind memory writes by tier and result (written/failed/dropped)",
+    ["tier", "result"]
+)
+
+# Code Execution Sandbox
+SANDBOX_RUNS_TOTAL = Counter(
+    "novalm_sandbox_runs_total",
+    "Sandboxed code executions by result (success/error/timeout/crashed)",
+    ["result"]
+)
+
+SANDBOX_WORKER_STARTUP_SECONDS = Histogram(
+    "novalm_sandbox_worker_startup_seconds",
+    "Time from starting a sandbox worker until it is ready to run code (preloads included)",
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5]
+)
+
+SANDBOX_RUN_SECONDS = Histogram(
+    "novalm_sandbox_run_seconds",
+    "Time from dispatching code to a warm sandbox worker until its result is available",
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1, 5, 10]
+)
+
+# Tool Scheduler
+TOOL_QUEUE_WAIT_SECONDS = Histogram(
+    "novalm_tool_queue_wait_seconds",
+    "Time a tool call waited for a concurrency slot",
+    ["tool"],
+    buckets=[0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30]
+)
+
+TOOL_RUN_SECONDS = Histogram(
+    "novalm_tool_run_seconds",
+    "Tool execution time (excluding queue wait)",
+    ["tool"],
+    buckets=[0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60]
+)
+
+TOOL_QUEUE_DEPTH = Gauge(
+    "novalm_tool_queue_depth",
+    "Tool calls waiting for a concurrency slot",
+    ["tool"]
+)
+
+# Tool Output Shaping
+TOOL_OUTPUT_SHAPED_TOTAL = Counter(
+    "novalm_tool_output_shaped_total",
+    "Tool results by shaping outcome (passthrough, truncated, spilled)",
+    ["tool", "action"]
+)
+
+# Evaluator
+EVALUATOR_CASES_TOTAL = Counter(
+    "novalm_evaluator_cases_total",
+    "Evaluator test cases by outcome (pass, fail, timeout, cached)",
+    ["result"]
+)
+
+# Rate Limiting
+RATE_LIMIT_DECISIONS_TOTAL = Counter(
+    "novalm_rate_limit_decisions_total",
+    "Rate limit decisions (allowed via Redis, allowed from a local lease, limited)",
+    ["result"]
+)
+
+# Generation Scheduler
+GENERATION_QUEUE_WAIT_SECONDS = Histogram(
+    "novalm_generation_queue_wait_seconds",
+    "Time a generation waited for an engine slot",
+    ["qos"],
+    buckets=[0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+)
+
+GENERATION_QUEUE_DEPTH = Gauge(
+    "novalm_generation_queue_depth",
+    "Generations waiting for an engine slot",
+    ["qos"]
+)
+
+GENERATIONS_RUNNING = Gauge(
+    "novalm_generations_running",
+    "Generations holding an engine slot",
+    ["qos"]
+)
+
+GENERATION_KV_RESERVED_TOKENS = Gauge(
+    "novalm_generation_kv_reserved_tokens",
+    "Prompt + max_tokens footprint of admitted generations"
+)
+
+GENERATION_MAX_TOKENS_SCALED_TOTAL = Counter(
+    "novalm_generation_max_tokens_scaled_total",
+    "Generations admitted with a reduced max_tokens under KV pressure",
+    ["qos"]
+)
+
+# Agent Sessions (WebSocket)
+AGENT_SESSIONS_ACTIVE = Gauge(
+    "novalm_agent_sessions_active",
+    "Requests running as detachable WebSocket sessions"
+)
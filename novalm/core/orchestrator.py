@@ -1,20 +1,29 @@
+import os
 import time
 import uuid
 import json
+import asyncio
 import logging
 from typing import AsyncIterator, List, Dict, Any, Optional
 from novalm.core.types import ChatCompletionRequest, ChatCompletionResponseChunk, ChatMessage
-from novalm.core.inference import InferenceEngine
+from novalm.core.inference import InferenceEngine, TokenUsage, set_usage, reset_usage
 from novalm.core.safety import SafetyLayer
 from novalm.config.settings import settings
 from novalm.core.memory import VectorMemory
 from novalm.core.tools import get_tool_by_name
+from novalm.core.tools.scheduler import ToolScheduler, PRIORITY_INTERACTIVE, PRIORITY_AGENT
+from novalm.core.workspace import WorkspaceManager, set_workspace, reset_workspace, resolve_in_workspace
+from novalm.core.scheduler import QOS_INTERACTIVE, QOS_AGENT, set_lane, reset_lane
+from novalm.core.context_packer import estimate_tokens
+from novalm.core.sessions import get_session_control
+from novalm.core.evaluator import Evaluator
 from novalm.core.metrics import GENERATED_TOKENS_TOTAL
 
 # Import Role Prompts
 from novalm.core.prompts import (
     PLANNER_PROMPT, ARCHITECT_PROMPT, ENGINEER_PROMPT, 
     EVALUATOR_PROMPT, CRITIC_PROMPT, JSON_ENFORCEMENT,
+    EVALUATOR_EXPLAIN_PROMPT, ENGINEER_TEST_CODE_HINT,
     RESEARCH_PROBLEM_PROMPT, RESEARCH_HYPOTHESIS_PROMPT,
     RESEARCH_DESIGN_PROMPT, RESEARCH_EXECUTION_PROMPT,
     RESEARCH_ANALYSIS_PROMPT, AGENT_INSTRUCTIONS
@@ -41,19 +50,81 @@ class Orchestrator:
         from novalm.core.cache import CacheManager
         self.cache_manager = CacheManager()
         
-    async def handle_chat(self, request: ChatCompletionRequest) -> AsyncIterator[str]:
+        from novalm.core.semantic_cache import SemanticCache
+        self.semantic_cache = SemanticCache(self.memory)
+        
+        from novalm.core.tools.result_cache import ToolResultCache
+        self.tool_cache = ToolResultCache()
+        
+        # Bounds concurrent tool work across all sessions
+        self.tool_scheduler = ToolScheduler()
+        
+        # Caps what each tool result costs in the prompt; full output is spilled to the workspace
+        from novalm.core.tools.output_shaper import ToolOutputShaper
+        self.output_shaper = ToolOutputShaper()
+        
+        from novalm.core.ingest import IngestionPipeline
+        self.ingestion = IngestionPipeline(self.memory)
+        
+        from novalm.core.context_packer import ContextPacker
+        self.context_packer = ContextPacker()
+        
+        # Memory writes from request paths are buffered and flushed in the background
+        from novalm.core.write_behind import MemoryWriteQueue
+        self.memory_writer = MemoryWriteQueue(self.memory)
+        
+        # Per-session tool workspaces, cloned from the base workspace
+        self.workspaces = WorkspaceManager()
+        
+        # Runs user-supplied test_code directly, without an EVALUATOR generation
+        self.evaluator = Evaluator()
+        
+        # QoS lanes and fair queuing per API key in front of the engine
+        from novalm.core.scheduler import FairScheduler
+        self.scheduler = FairScheduler()
+        # Agent step (FSM state) -> recent largest output in tokens, decaying
+        self._step_tokens: Dict[str, float] = {}
+        
+    async def handle_chat(self, request: ChatCompletionRequest, client_id: str = "anonymous", usage: Optional[TokenUsage] = None) -> AsyncIterator[str]:
         """
         Main entry point. Dispatches to Autonomous Loop or Standard Loop.
+        Agentic requests get a private copy-on-write workspace for their tool calls.
+        Generations are queued fairly per client_id within the request's QoS class.
+        Tokens the engine generates for the request are added to usage (for rate limiting).
         """
-        if request.sampling_params and request.sampling_params.preset == "autonomous":
-            async for chunk in self._run_autonomous_loop(request):
-                yield chunk
-        elif request.sampling_params and request.sampling_params.preset == "research":
-             async for chunk in self._run_research_loop(request):
-                yield chunk
-        else:
-            async for chunk in self._run_standard_loop(request):
-                yield chunk
+        preset = request.sampling_params.preset if request.sampling_params else None
+        qos = request.qos or QOS_INTERACTIVE
+        if preset in ("autonomous", "research") and qos == QOS_INTERACTIVE:
+            # Multi-step loops never ride the interactive lane
+            qos = QOS_AGENT
+        lane_token = set_lane(qos, client_id)
+        usage_token = set_usage(usage)
+        session_id = None
+        token = None
+        if settings.WORKSPACE_PER_SESSION and (preset in ("autonomous", "research") or request.tools):
+            session_id = f"session-{uuid.uuid4()}"
+            try:
+                token = set_workspace(await self.workspaces.create(session_id))
+            except OSError as e:
+                logging.error(f"Workspace creation failed, using the shared workspace: {e}")
+                session_id = None
+        
+        try:
+            if preset == "autonomous":
+                async for chunk in self._run_autonomous_loop(request):
+                    yield chunk
+            elif preset == "research":
+                 async for chunk in self._run_research_loop(request):
+                    yield chunk
+            else:
+                async for chunk in self._run_standard_loop(request):
+                    yield chunk
+        finally:
+            if session_id:
+                reset_workspace(token)
+                await self.workspaces.teardown(session_id)
+            reset_usage(usage_token)
+            reset_lane(lane_token)
 
     async def _run_autonomous_loop(self, request: ChatCompletionRequest) -> AsyncIterator[str]:
         """
@@ -69,15 +140,23 @@ class Orchestrator:
         messages = list(request.messages)
         max_steps = 20 # Hard cap for safety
         steps = 0
+        # Results of failed test_code runs; the next EVALUATOR turn only explains them
+        failure_report = None
         
         yield self._status_chunk(request_id, model_name, "[System: Starting Autonomous FSM...]")
         
         while state != "DONE" and steps < max_steps:
             steps += 1
+            # Pause / injected messages from a WebSocket client, between steps
+            await self._checkpoint(messages)
             yield self._status_chunk(request_id, model_name, f"\n\n--- ROLE: {state} ---\n")
             
             # 1. Select Prompt
             system_prompt = self._get_prompt_for_role(state)
+            if request.test_code and state == "ENGINEER":
+                system_prompt += ENGINEER_TEST_CODE_HINT
+            elif failure_report is not None and state == "EVALUATOR":
+                system_prompt = f"{EVALUATOR_EXPLAIN_PROMPT}\n\nTest Results: {failure_report}"
             
             # 2. Build Messages
             # We must ensure the System Prompt is correct for THIS role. 
@@ -103,9 +182,9 @@ class Orchestrator:
                 params = SamplingParams()
             
             params.temperature = 0.1
-            params.max_tokens = 4096
+            params.max_tokens = settings.AGENT_MAX_TOKENS
             
-            async for text_chunk in self.inference_engine.generate(prompt_str, params, f"{request_id}-{steps}"):
+            async for text_chunk in self._generate(prompt_str, params, f"{request_id}-{steps}", step=state):
                  full_response += text_chunk
                  # Stream content to user so they see the thought process
                  yield ChatCompletionResponseChunk(
@@ -150,26 +229,45 @@ class Orchestrator:
                 elif state == "ENGINEER":
                     action = data.get("action")
                     if action == "final_answer":
-                        state = "EVALUATOR"
+                        code = await self._solution_code(data.get("input", {})) if request.test_code else None
+                        if code:
+                            yield self._status_chunk(request_id, model_name, "\n[Running Tests...]\n")
+                            result = await self.evaluator.evaluate(code, request.test_code)
+                            yield self._status_chunk(
+                                request_id, model_name,
+                                f"[Tests: {result['passed']} passed, {result['failed']} failed]\n"
+                            )
+                            if result["status"] == "PASS":
+                                state = "CRITIC"
+                            else:
+                                failure_report = await self.output_shaper.shape("evaluator", result)
+                                state = "EVALUATOR"
+                        else:
+                            state = "EVALUATOR"
                     elif action:
                         # Tool Execution
                         tool_input = data.get("input", {})
                         yield self._status_chunk(request_id, model_name, f"\n[Executing {action}...]\n")
                         
-                        tool_output = await self._execute_tool(action, tool_input)
+                        tool_output = await self._execute_tool(action, tool_input, request_id, PRIORITY_AGENT)
                         
-                        messages.append(ChatMessage(role="system", content=f"Tool Output: {json.dumps(tool_output)}"))
+                        messages.append(ChatMessage(role="system", content=f"Tool Output: {await self.output_shaper.shape(action, tool_output, tool_input)}"))
                         # Stay in ENGINEER to continue implementing or fix errors
                     else:
                         messages.append(ChatMessage(role="system", content="Error: No action found."))
                         
                 elif state == "EVALUATOR":
                     status = data.get("status")
-                    if data.get("action") == "python_exec":
+                    if failure_report is not None:
+                        # The tests already failed; this turn only explained why
+                        failure_report = None
+                        messages.append(ChatMessage(role="system", content=f"Evaluator Feedback: {data.get('issues')}"))
+                        state = "ENGINEER"
+                    elif data.get("action") == "python_exec":
                          # Running a test
                          yield self._status_chunk(request_id, model_name, "\n[Running Tests...]\n")
-                         tool_output = await self._execute_tool("python_exec", data.get("input", {}))
-                         messages.append(ChatMessage(role="system", content=f"Test Results: {json.dumps(tool_output)}"))
+                         tool_output = await self._execute_tool("python_exec", data.get("input", {}), request_id, PRIORITY_AGENT)
+                         messages.append(ChatMessage(role="system", content=f"Test Results: {await self.output_shaper.shape('python_exec', tool_output)}"))
                          # Stay in Evaluator to analyze results
                     elif status == "pass":
                         state = "CRITIC"
@@ -197,7 +295,7 @@ class Orchestrator:
                         # Ideally the final solution artifact. 
                         # But loop history is long.
                         # Let's save the summary.
-                        self.memory.add_episodic(
+                        self.memory_writer.add_episodic(
                             task=user_query,
                             solution="See conversation history.", # TODO: extract final code
                             outcome="SUCCESS",
@@ -238,6 +336,8 @@ class Orchestrator:
         
         while state != "DONE" and steps < max_steps:
             steps += 1
+            # Pause / injected messages from a WebSocket client, between steps
+            await self._checkpoint(messages)
             yield self._status_chunk(request_id, model_name, f"\n\n--- PHASE: {state} ---\n")
             
             # 1. Select Prompt
@@ -255,10 +355,10 @@ class Orchestrator:
                  from novalm.core.types import SamplingParams
                  params = SamplingParams()
             params.temperature = 0.2
-            params.max_tokens = 4096
+            params.max_tokens = settings.AGENT_MAX_TOKENS
             
             full_response = ""
-            async for text_chunk in self.inference_engine.generate(prompt_str, params, f"{request_id}-{steps}"):
+            async for text_chunk in self._generate(prompt_str, params, f"{request_id}-{steps}", step=state):
                  full_response += text_chunk
                  yield ChatCompletionResponseChunk(
                     id=request_id, created=created_time, model=model_name,
@@ -302,8 +402,8 @@ class Orchestrator:
                     action = data.get("action")
                     if action:
                         yield self._status_chunk(request_id, model_name, f"\n[Running Experiment: {action}...]\n")
-                        tool_output = await self._execute_tool(action, data.get("input", {}))
-                        messages.append(ChatMessage(role="system", content=f"Experiment Output: {json.dumps(tool_output)}"))
+                        tool_output = await self._execute_tool(action, data.get("input", {}), request_id, PRIORITY_AGENT)
+                        messages.append(ChatMessage(role="system", content=f"Experiment Output: {await self.output_shaper.shape(action, tool_output, data.get('input', {}))}"))
                         state = "ANALYSIS"
                     else:
                         state = "ANALYSIS" # Skip execution if no action? Or retry?
@@ -313,7 +413,7 @@ class Orchestrator:
                         yield self._status_chunk(request_id, model_name, "\n[System: Research Concluded]\n")
                         
                         # SAVE SEMANTIC MEMORY (Knowledge)
-                        self.memory.add_semantic(
+                        self.memory_writer.add_semantic(
                             content=f"Research Conclusion: {data.get('conclusion')}\nObservation: {data.get('observation')}",
                             source="research_agent"
                         )
@@ -329,6 +429,7 @@ class Orchestrator:
                 logging.error(f"Research FSM Error: {e}")
                 messages.append(ChatMessage(role="system", content=f"Error: {e}"))
 
+    async def _run_standard_loop(self, request: ChatCompletionRequest) -> AsyncIterator[str]:
         """
         The Standard Orchestrator Loop (Legacy + Research Mode).
         """
@@ -336,8 +437,9 @@ class Orchestrator:
         created_time = int(time.time())
         model_name = request.model
         
-        # 1. Assemble Prompt
-        prompt = self._assemble_prompt(request.messages, request.tools)
+        # 1. Assemble Prompt (memory retrieval embeds the query; keep it off the event loop)
+        preset = request.sampling_params.preset if request.sampling_params else None
+        prompt = await asyncio.to_thread(self._assemble_prompt, request.messages, request.tools, preset)
         
         # 1.5 JSON Mode Injection
         if request.response_format and request.response_format.get("type") == "json_object":
@@ -376,12 +478,33 @@ class Orchestrator:
         is_agent_mode = bool(request.tools)
         messages = list(request.messages)
         
+        # 4.0 Semantic Cache (plain chat only; agent turns depend on tool state)
+        semantic_key = None
+        semantic_cached = None
+        if self.semantic_cache.enabled and not is_agent_mode and not request.response_format:
+            semantic_key = self._semantic_cache_key(messages)
+            if semantic_key:
+                semantic_cached = await asyncio.to_thread(
+                    self.semantic_cache.get,
+                    semantic_key["query"], model_name, sampling_params.preset, semantic_key["system"],
+                    sampling_params
+                )
+            if semantic_cached and not self.semantic_cache.should_verify():
+                # Skip the GPU entirely
+                yield ChatCompletionResponseChunk(
+                    id=request_id, created=created_time, model=model_name,
+                    choices=[{"index": 0, "delta": {"content": semantic_cached}, "finish_reason": "stop"}]
+                )
+                return
+        
         while current_step < max_steps:
             current_step += 1
+            # Pause / injected messages from a WebSocket client, between steps
+            await self._checkpoint(messages)
             request_id_step = f"{request_id}-step-{current_step}"
             
             # Re-assemble prompt if loop
-            prompt = self._assemble_prompt(messages, request.tools)
+            prompt = await asyncio.to_thread(self._assemble_prompt, messages, request.tools, sampling_params.preset)
             
             # 4.5.0 Research Persona Injection
             if sampling_params and sampling_params.preset == "research":
@@ -407,7 +530,7 @@ class Orchestrator:
                     )
             else:
                 try:
-                    async for text_chunk in self.inference_engine.generate(prompt, sampling_params, request_id_step):
+                    async for text_chunk in self._generate(prompt, sampling_params, request_id_step):
                         if settings.ENABLE_SAFETY_CHECKS:
                             text_chunk = self.safety_layer.check_output(text_chunk)
                         
@@ -421,6 +544,19 @@ class Orchestrator:
                     
                     if self.cache_manager and collected_response:
                         self.cache_manager.set(prompt, collected_response, sampling_params)
+                    
+                    if semantic_key and collected_response:
+                        if semantic_cached:
+                            # Sampled hit that was re-generated to measure false hits
+                            await asyncio.to_thread(
+                                self.semantic_cache.record_verification,
+                                semantic_cached, collected_response, model_name, sampling_params.preset
+                            )
+                        await asyncio.to_thread(
+                            self.semantic_cache.set,
+                            semantic_key["query"], collected_response,
+                            model_name, sampling_params.preset, semantic_key["system"], sampling_params
+                        )
                         
                 except Exception as e:
                      logging.error(f"Inference error: {e}")
@@ -450,15 +586,15 @@ class Orchestrator:
                     choices=[{"index": 0, "delta": {"content": f"\n\n[System: Executing {tool_name}...]\n\n"}, "finish_reason": None}]
                 )
                 
-                tool_output = await self._execute_tool(tool_name, tool_input)
+                tool_output = await self._execute_tool(tool_name, tool_input, request_id)
                 
                 # Loop continuation
                 messages.append(ChatMessage(role="assistant", content=collected_response))
-                messages.append(ChatMessage(role="system", content=f"Tool Output: {json.dumps(tool_output)}"))
+                messages.append(ChatMessage(role="system", content=f"Tool Output: {await self.output_shaper.shape(tool_name, tool_output, tool_input)}"))
             else:
                 break # Failed to parse or final answer
 
-    def _assemble_prompt(self, messages, tools=None) -> str:
+    def _assemble_prompt(self, messages, tools=None, preset: Optional[str] = None) -> str:
         # 1. Extract latest user query
         latest_query = ""
         for msg in reversed(messages):
@@ -467,35 +603,11 @@ class Orchestrator:
                 break
         
         # 2. Retrieve Context & Experiences (Multi-Layer Memory)
-        context_str = ""
-        episodic_str = ""
-        semantic_str = ""
-        procedural_str = ""
-        
-        if latest_query:
-            # We call the new retrieve_all method via cast or direct usage if typed
-            # Or retrieve individually for control
-            
-            # A. Episodic (Past Runs)
-            episodes = self.memory.retrieve_episodic(latest_query)
-            if episodes:
-                episodic_str = "\n[MEMORY: PAST EPISODES]\n" + "\n".join(episodes) + "\n"
-            
-            # B. Semantic (Knowledge)
-            semantics = self.memory.retrieve_semantic(latest_query)
-            if semantics:
-                semantic_str = "\n[MEMORY: KNOWLEDGE BASE]\n" + "\n".join(semantics) + "\n"
-                
-            # C. Procedural (Heuristics)
-            procedures = self.memory.retrieve_procedural(latest_query)
-            if procedures:
-                procedural_str = "\n[MEMORY: RECOMMENDED WORKFLOWS]\n" + "\n".join(procedures) + "\n"
-        
-        # Combine into a single Memory Block
+        # Candidates from all tiers compete for one per-preset token budget
         memory_block = ""
-        if episodic_str: memory_block += episodic_str
-        if semantic_str: memory_block += semantic_str
-        if procedural_str: memory_block += procedural_str
+        if latest_query:
+            candidates = self.memory.retrieve_scored(latest_query, n=settings.MEMORY_CONTEXT_CANDIDATES)
+            memory_block = self.context_packer.pack(candidates, self.context_packer.budget_for(preset))
         
         # 3. Prepare Tools Prompt
         tools_str = ""
@@ -509,7 +621,8 @@ class Orchestrator:
         for msg in messages:
             role = msg.role.upper()
             content = msg.content
-            if role == "SYSTEM":
+            if role == "SYSTEM" and not system_msg_found:
+                # Memory and tools go into the first system message only
                 content += "\n" + memory_block
                 if tools_str: content += tools_str
                 system_msg_found = True
@@ -518,12 +631,69 @@ class Orchestrator:
         prefix = ""
         if tools_str: prefix += f"{tools_str}"
             
-        if prefix and not system_msg_found:
+        if (prefix or memory_block) and not system_msg_found:
              prompt = f"SYSTEM: {prefix}{memory_block}\n" + prompt
 
         prompt += "ASSISTANT:"
         return prompt
 
+    def _semantic_cache_key(self, messages: List[ChatMessage]) -> Optional[Dict[str, str]]:
+        """
+        Semantic cache applies to single-turn requests only: one user query plus optional system prompt.
+        Returns None for multi-turn conversations, whose answers depend on prior turns.
+        """
+        user_msgs = [m for m in messages if m.role == "user"]
+        if len(user_msgs) != 1 or any(m.role == "assistant" for m in messages):
+            return None
+        system = "\n".join(m.content for m in messages if m.role == "system")
+        return {"query": user_msgs[0].content, "system": system}
+
+    async def _checkpoint(self, messages: List[ChatMessage]):
+        control = get_session_control()
+        if control is not None:
+            await control.checkpoint(messages)
+
+    async def _generate(self, prompt: str, params, generation_id: str, step: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Engine generation behind the fair scheduler; the slot is held until the stream ends.
+        Admission is by KV footprint (prompt tokens + max_tokens). Agent steps (step = FSM state)
+        are scalable: under pressure they start sooner with a smaller max_tokens, but never below
+        AGENT_MIN_TOKENS or what that step recently needed, so its JSON is not cut off; below
+        that they wait for room instead.
+        """
+        min_tokens = None
+        if step is not None:
+            needed = self._step_tokens.get(step, 0.0) * settings.AGENT_STEP_HEADROOM
+            min_tokens = max(settings.AGENT_MIN_TOKENS, int(needed) + 1)
+        generated_chars = 0
+        async with self.scheduler.slot(estimate_tokens(prompt), params.max_tokens, min_tokens) as max_tokens:
+            if max_tokens != params.max_tokens:
+                params = params.model_copy(update={"max_tokens": max_tokens})
+            async for text_chunk in self.inference_engine.generate(prompt, params, generation_id):
+                generated_chars += len(text_chunk)
+                yield text_chunk
+        if step is not None:
+            # Decaying peak: one long answer raises the floor at once, it then relaxes over ~10 steps
+            observed = generated_chars / 4  # Same ~4 characters per token as estimate_tokens
+            self._step_tokens[step] = max(observed, self._step_tokens.get(step, 0.0) * 0.9)
+
+    async def _solution_code(self, final_input: Dict[str, Any]) -> Optional[str]:
+        """Solution source from an ENGINEER final_answer: inline "code", or the workspace "files" it names."""
+        if isinstance(final_input.get("code"), str) and final_input["code"].strip():
+            return final_input["code"]
+        files = final_input.get("files") or ([final_input["filename"]] if final_input.get("filename") else [])
+        parts = []
+        for name in files:
+            path = resolve_in_workspace(str(name))
+            if path and os.path.isfile(path):
+                parts.append(await asyncio.to_thread(self._read_text, path))
+        return "\n\n".join(parts) or None
+
+    @staticmethod
+    def _read_text(path: str) -> str:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+
     def _get_prompt_for_role(self, role: str) -> str:
         if role == "PLANNER": return PLANNER_PROMPT
         if role == "ARCHITECT": return ARCHITECT_PROMPT
@@ -532,13 +702,18 @@ class Orchestrator:
         if role == "CRITIC": return CRITIC_PROMPT
         return JSON_ENFORCEMENT
 
-    async def _execute_tool(self, name: str, input_data: dict) -> dict:
+    async def _execute_tool(self, name: str, input_data: dict, session_id: Optional[str] = None, priority: int = PRIORITY_INTERACTIVE) -> dict:
         tool = get_tool_by_name(name)
         if tool:
+            cached = self.tool_cache.get(tool, input_data)
+            if cached is not None:
+                return cached
             try:
-                return await tool.run(input_data)
+                output = await self.tool_scheduler.run(tool, input_data, session_id=session_id, priority=priority)
             except Exception as e:
                 return {"error": str(e)}
+            self.tool_cache.set(tool, input_data, output)
+            return output
         return {"error": "Tool not found"}
 
     def _get_prompt_for_research_role(self, role: str) -> str:
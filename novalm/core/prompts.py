@@ -60,6 +60,27 @@ EVALUATOR_PROMPT = (
     "}"
 ) + JSON_ENFORCEMENT
 
+# Used instead of EVALUATOR_PROMPT when the user supplied test_code: the tests have already run
+EVALUATOR_EXPLAIN_PROMPT = (
+    "You are the EVALUATOR agent. The user's tests have already been run against the implementation "
+    "and some failed. Do NOT run tests. Explain the root cause of each failure and what must change.\n"
+    "Output JSON format:\n"
+    "{\n"
+    '  "role": "evaluator",\n'
+    '  "test_plan": "User-supplied tests",\n'
+    '  "status": "fail",\n'
+    '  "issues": ["..."],\n'
+    '  "next_step": "retry_engineer"\n'
+    "}"
+) + JSON_ENFORCEMENT
+
+# Appended to ENGINEER_PROMPT when the user supplied test_code
+ENGINEER_TEST_CODE_HINT = (
+    "\nThe user supplied tests that run automatically on your final answer. "
+    'Put the complete solution in "final_answer" input as { "code": "..." } '
+    'or list the workspace files that contain it as { "files": ["..."] }.'
+)
+
 CRITIC_PROMPT = (
     "You are the CRITIC agent. Your job is to perform a final review.\n"
     "Check for edge cases, security flaws, and architectural integrity. If good, approve.\n"
@@ -0,0 +1,318 @@
+import io
+import os
+import sys
+import math
+import time
+import asyncio
+import logging
+import traceback
+import multiprocessing
+from typing import Dict, Any, Optional, List
+from novalm.config.settings import settings
+from novalm.core.metrics import SANDBOX_RUNS_TOTAL, SANDBOX_WORKER_STARTUP_SECONDS, SANDBOX_RUN_SECONDS
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:  # Non-POSIX
+    RESOURCE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# --- Worker process side ---
+
+class _CappedBuffer(io.StringIO):
+    """stdout/stderr replacement that keeps at most max_chars and remembers if it dropped any."""
+    def __init__(self, max_chars: int):
+        super().__init__()
+        self.max_chars = max_chars
+        self.truncated = False
+
+    def write(self, s: str) -> int:
+        room = self.max_chars - self.tell()
+        if room <= 0:
+            self.truncated = True
+            return len(s)
+        if len(s) > room:
+            self.truncated = True
+            super().write(s[:room])
+        else:
+            super().write(s)
+        return len(s)
+
+def _disable_network():
+    """
+    Blocks non-local sockets inside the worker. Best effort (code can still reach _socket);
+    use a container network policy where hard isolation is required.
+    """
+    import socket
+
+    def _blocked(*args, **kwargs):
+        raise PermissionError("Network access is disabled in the sandbox")
+
+    class _LocalOnlySocket(socket.socket):
+        def __init__(self, family=-1, *args, **kwargs):
+            if family not in (-1, socket.AF_UNIX):
+                _blocked()
+            super().__init__(family, *args, **kwargs)
+
+    socket.socket = _LocalOnlySocket
+    socket.create_connection = _blocked
+    socket.getaddrinfo = _blocked
+    socket.gethostbyname = _blocked
+
+def _apply_static_limits(limits: Dict[str, Any]):
+    if not RESOURCE_AVAILABLE:
+        return
+    if limits["memory_mb"]:
+        size = limits["memory_mb"] * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (size, size))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+def _set_cpu_budget(cpu_seconds: int):
+    """RLIMIT_CPU is cumulative per process, so each run gets 'CPU used so far + budget'."""
+    if not RESOURCE_AVAILABLE or not cpu_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = math.ceil(usage.ru_utime + usage.ru_stime) + cpu_seconds
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+def _execute(code: str, max_output: int) -> Dict[str, Any]:
+    stdout, stderr = _CappedBuffer(max_output), _CappedBuffer(max_output)
+    old_stdout, old_stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = stdout, stderr
+    failed = False
+    try:
+        exec(compile(code, "<sandbox>", "exec"), {"__name__": "__main__", "__builtins__": __builtins__})
+        result = "Executed successfully."
+    except SystemExit as e:
+        failed = e.code not in (None, 0)
+        result = f"Exited with status {e.code}." if failed else "Executed successfully."
+    except BaseException as e:
+        failed = True
+        # Drop this module's frame: the traceback should start at the user's code
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next, file=stderr)
+        result = f"Error: {type(e).__name__}: {e}"
+    finally:
+        sys.stdout, sys.stderr = old_stdout, old_stderr
+
+    return {
+        "status": "error" if failed or stderr.getvalue() else "success",
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "result_summary": result,
+        "truncated": stdout.truncated or stderr.truncated
+    }
+
+def _worker_main(conn, limits: Dict[str, Any]):
+    # Keep stray fd-level output (C extensions, subprocesses) out of the server's logs
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+
+    _apply_static_limits(limits)
+    if not limits["allow_network"]:
+        _disable_network()
+
+    # Preloaded modules are normally inherited from the forkserver template already
+    for module in limits["preload"]:
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+    conn.send({"ready_at": time.time()})
+
+    cwd = os.getcwd()
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+        try:
+            os.chdir(job.get("cwd") or cwd)
+        except OSError:
+            os.chdir(cwd)
+        _set_cpu_budget(limits["cpu_seconds"])
+        conn.send(_execute(job["code"], limits["max_output"]))
+
+# --- Server side ---
+
+class _Worker:
+    def __init__(self, ctx, limits: Dict[str, Any]):
+        parent_conn, child_conn = ctx.Pipe()
+        self.conn = parent_conn
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, limits), daemon=True, name="novalm-sandbox")
+        self.started_at = time.time()
+        self.process.start()
+        child_conn.close()
+        self.runs = 0
+        self.ready = False
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+class SandboxPool:
+    """
+    Pool of pre-started worker processes for untrusted Python snippets.
+    Each run gets wall-clock, CPU and address-space limits, no network and capped output.
+    Workers are replaced after max_runs (state leaks between runs otherwise) and on timeout/crash.
+    """
+    def __init__(
+        self,
+        size: int = None,
+        max_runs: int = None,
+        timeout: float = None,
+        cpu_seconds: int = None,
+        memory_mb: int = None,
+        max_output: int = None,
+        allow_network: bool = None
+    ):
+        self.size = size or settings.SANDBOX_WORKERS
+        self.max_runs = max_runs or settings.SANDBOX_MAX_RUNS_PER_WORKER
+        self.timeout = timeout or settings.SANDBOX_TIMEOUT
+        self.limits = {
+            "cpu_seconds": settings.SANDBOX_CPU_SECONDS if cpu_seconds is None else cpu_seconds,
+            "memory_mb": settings.SANDBOX_MEMORY_MB if memory_mb is None else memory_mb,
+            "max_output": max_output or settings.SANDBOX_MAX_OUTPUT_CHARS,
+            "allow_network": settings.SANDBOX_ALLOW_NETWORK if allow_network is None else allow_network,
+        }
+        self.limits["preload"] = list(settings.SANDBOX_PRELOAD_MODULES)
+        self._ctx = self._make_context()
+        self._workers: List[_Worker] = []
+        # Lazy: created inside the running loop
+        self._idle: Optional[asyncio.Queue] = None
+
+    def _make_context(self):
+        """
+        Workers must not inherit the server's threads (embedding batcher, engine), so they are never
+        forked from the server itself. With "forkserver", a clean template process imports the preload
+        modules once and every worker is a copy-on-write fork of it: warm imports, millisecond startup.
+        """
+        method = settings.SANDBOX_START_METHOD
+        if method not in multiprocessing.get_all_start_methods():
+            logger.warning(f"Sandbox start method '{method}' unavailable; using 'spawn'")
+            method = "spawn"
+        ctx = multiprocessing.get_context(method)
+        if method == "forkserver":
+            # Only takes effect if the forkserver has not been started yet
+            ctx.set_forkserver_preload(["novalm.core.sandbox"] + self.limits["preload"])
+        return ctx
+
+    def start(self):
+        """Starts all workers up front so the first tool call does not pay for process startup."""
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            self._idle.put_nowait(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._ctx, self.limits)
+        self._workers.append(worker)
+        return worker
+
+    async def _replace(self, worker: _Worker) -> _Worker:
+        # Reaping the old process can block for up to a second; keep it off the event loop
+        await asyncio.to_thread(worker.kill)
+        if worker in self._workers:
+            self._workers.remove(worker)
+        return self._spawn()
+
+    async def run(self, code: str, timeout: float = None, cwd: str = None) -> Dict[str, Any]:
+        self.start()
+        timeout = timeout or self.timeout
+        worker = await self._idle.get()
+        try:
+            if not worker.process.is_alive():
+                worker = await self._replace(worker)
+            result, healthy = await self._dispatch(worker, code, timeout, cwd)
+            worker.runs += 1
+            if not healthy or worker.runs >= self.max_runs:
+                worker = await self._replace(worker)
+        except asyncio.CancelledError:
+            # The worker may still be running the snippet; never hand it to another caller
+            worker = await self._replace(worker)
+            raise
+        finally:
+            self._idle.put_nowait(worker)
+        return result
+
+    async def _dispatch(self, worker: _Worker, code: str, timeout: float, cwd: Optional[str] = None):
+        """Returns (result, worker_still_usable)."""
+        if not worker.ready and not await self._wait_ready(worker, timeout):
+            SANDBOX_RUNS_TOTAL.labels(result="crashed").inc()
+            return self._failure("Error: Sandbox worker failed to start"), False
+        
+        started = time.monotonic()
+        worker.conn.send({"code": code, "cwd": cwd})
+        ready = await asyncio.to_thread(worker.conn.poll, timeout)
+        SANDBOX_RUN_SECONDS.observe(time.monotonic() - started)
+        if not ready:
+            SANDBOX_RUNS_TOTAL.labels(result="timeout").inc()
+            return self._failure(f"Error: Execution timed out after {timeout}s"), False
+        try:
+            result = worker.conn.recv()
+        except (EOFError, OSError):
+            # Killed by the kernel: CPU limit (SIGXCPU), out of memory, or a crash
+            await asyncio.to_thread(worker.process.join, 1)
+            SANDBOX_RUNS_TOTAL.labels(result="crashed").inc()
+            return self._failure(
+                f"Error: Sandbox worker died (exit code {worker.process.exitcode}); CPU or memory limit exceeded?"
+            ), False
+        SANDBOX_RUNS_TOTAL.labels(result=result["status"]).inc()
+        return result, True
+
+    async def _wait_ready(self, worker: _Worker, timeout: float) -> bool:
+        if not worker.conn.poll(0) and not await asyncio.to_thread(worker.conn.poll, timeout):
+            return False
+        try:
+            message = worker.conn.recv()
+        except (EOFError, OSError):
+            return False
+        # Measured by the worker itself, so time spent idle in the pool is not counted
+        SANDBOX_WORKER_STARTUP_SECONDS.observe(max(message["ready_at"] - worker.started_at, 0.0))
+        worker.ready = True
+        return True
+
+    @staticmethod
+    def _failure(message: str) -> Dict[str, Any]:
+        return {"status": "error", "stdout": "", "stderr": "", "result_summary": message, "truncated": False}
+
+    def shutdown(self):
+        """Stops all workers, waiting up to a second for each; blocking, so async callers use a thread."""
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+        self._idle = None
+
+# Shared by PythonExecTool and the Evaluator
+_pool: Optional[SandboxPool] = None
+
+def get_sandbox_pool() -> SandboxPool:
+    global _pool
+    if _pool is None:
+        _pool = SandboxPool()
+    return _pool
+
+def shutdown_sandbox_pool():
+    """Stops sandbox worker processes. Called on app shutdown."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
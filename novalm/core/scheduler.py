@@ -0,0 +1,211 @@
+import time
+import asyncio
+import logging
+import contextvars
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Tuple, Deque, Optional, AsyncIterator
+from novalm.config.settings import settings
+from novalm.core.metrics import (
+    GENERATION_QUEUE_WAIT_SECONDS, GENERATION_QUEUE_DEPTH, GENERATIONS_RUNNING,
+    GENERATION_KV_RESERVED_TOKENS, GENERATION_MAX_TOKENS_SCALED_TOTAL
+)
+
+logger = logging.getLogger(__name__)
+
+QOS_INTERACTIVE = "interactive"
+QOS_AGENT = "agent"
+QOS_BATCH = "batch"
+QOS_CLASSES = (QOS_INTERACTIVE, QOS_AGENT, QOS_BATCH)
+
+# (qos, client_id) of the request being served by the current task
+_current_lane: contextvars.ContextVar[Tuple[str, str]] = contextvars.ContextVar(
+    "novalm_lane", default=(QOS_INTERACTIVE, "anonymous")
+)
+
+def get_lane() -> Tuple[str, str]:
+    return _current_lane.get()
+
+def set_lane(qos: str, client_id: str) -> contextvars.Token:
+    return _current_lane.set((qos, client_id))
+
+def reset_lane(token: contextvars.Token):
+    try:
+        _current_lane.reset(token)
+    except ValueError:
+        # Generator finalized from a different context; nothing to restore there
+        pass
+
+class FairScheduler:
+    """
+    Admission in front of the inference engine: at most max_concurrency generations run at once,
+    and their combined footprint (prompt tokens + max_tokens) must fit kv_capacity tokens, so a
+    burst of long agent steps queues here instead of triggering preemption storms in the engine.
+    Callers that allow it (agent loops) pass min_tokens and may be admitted early with a smaller
+    max_tokens when the full request does not fit.
+
+    Waiting generations are served by weighted fair queuing in two levels: QoS classes share
+    slots by SCHEDULER_QOS_WEIGHTS, and within a class every client (API key) gets an equal
+    share, charged by footprint (clients sending short requests are served more often). The last
+    reserved_interactive slots are only granted to interactive requests.
+
+    Preemption is soft: agent loops take a slot per LLM step, so a waiting interactive request
+    gets the next free slot instead of queuing behind a whole multi-step run.
+    """
+    def __init__(
+        self,
+        max_concurrency: int = None,
+        reserved_interactive: int = None,
+        weights: Dict[str, float] = None,
+        kv_capacity: int = None
+    ):
+        self.max_concurrency = max_concurrency or settings.SCHEDULER_MAX_CONCURRENT_GENERATIONS
+        self.kv_capacity = kv_capacity or settings.SCHEDULER_KV_CAPACITY_TOKENS
+        self._reserved_tokens = 0
+        self.reserved_interactive = min(
+            settings.SCHEDULER_RESERVED_INTERACTIVE if reserved_interactive is None else reserved_interactive,
+            self.max_concurrency - 1
+        )
+        self.weights = dict(settings.SCHEDULER_QOS_WEIGHTS if weights is None else weights)
+        self._running: Dict[str, int] = {qos: 0 for qos in QOS_CLASSES}
+        # qos -> client_id -> FIFO of (prompt_tokens, max_tokens, min_tokens, future)
+        self._queues: Dict[str, Dict[str, Deque[Tuple[int, int, Optional[int], asyncio.Future]]]] = {qos: {} for qos in QOS_CLASSES}
+        # Virtual time consumed per class and per (class, client); lowest goes next
+        self._class_pass: Dict[str, float] = {qos: 0.0 for qos in QOS_CLASSES}
+        self._client_pass: Dict[Tuple[str, str], float] = {}
+        # Start tags of the last grant, overall and per class: where newly active flows join
+        self._vtime = 0.0
+        self._class_vtime: Dict[str, float] = {qos: 0.0 for qos in QOS_CLASSES}
+
+    @property
+    def running(self) -> int:
+        return sum(self._running.values())
+
+    def waiting(self, qos: str = None) -> int:
+        classes = [qos] if qos else QOS_CLASSES
+        return sum(len(q) for c in classes for q in self._queues[c].values())
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        prompt_tokens: int,
+        max_tokens: int,
+        min_tokens: Optional[int] = None,
+        qos: str = None,
+        client_id: str = None
+    ) -> AsyncIterator[int]:
+        """
+        Holds one generation slot for the current lane (see set_lane) or the one given.
+        Yields the max_tokens granted: max_tokens, or at least min_tokens if down-scaling is allowed.
+        """
+        lane_qos, lane_client = get_lane()
+        qos = qos or lane_qos
+        if qos not in self._running:
+            qos = QOS_INTERACTIVE
+        client_id = client_id or lane_client
+        prompt_tokens, max_tokens = max(int(prompt_tokens), 0), max(int(max_tokens), 1)
+        if min_tokens is not None:
+            min_tokens = max(1, min(int(min_tokens), max_tokens))
+
+        enqueued = time.monotonic()
+        granted = await self._acquire(qos, client_id, prompt_tokens, max_tokens, min_tokens)
+        GENERATION_QUEUE_WAIT_SECONDS.labels(qos=qos).observe(time.monotonic() - enqueued)
+        try:
+            yield granted
+        finally:
+            self._release(qos, prompt_tokens + granted)
+
+    async def _acquire(self, qos: str, client_id: str, prompt_tokens: int, max_tokens: int, min_tokens: Optional[int]) -> int:
+        future = asyncio.get_running_loop().create_future()
+        clients = self._queues[qos]
+        if not any(clients.values()) and not self._running[qos]:
+            # Class was idle: no credit for the time it did not use
+            self._class_pass[qos] = max(self._class_pass[qos], self._vtime)
+        if not clients.get(client_id):
+            # Same for a client joining a busy class
+            key = (qos, client_id)
+            self._client_pass[key] = max(self._client_pass.get(key, 0.0), self._class_vtime[qos])
+        entry = (prompt_tokens, max_tokens, min_tokens, future)
+        clients.setdefault(client_id, deque()).append(entry)
+        GENERATION_QUEUE_DEPTH.labels(qos=qos).inc()
+        self._wake()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just as we were cancelled; hand it on
+                self._release(qos, prompt_tokens + future.result())
+            else:
+                queue = clients.get(client_id)
+                if queue is not None and entry in queue:
+                    queue.remove(entry)
+                    if not queue:
+                        del clients[client_id]
+                GENERATION_QUEUE_DEPTH.labels(qos=qos).dec()
+            raise
+
+    def _release(self, qos: str, footprint: int):
+        self._running[qos] -= 1
+        self._reserved_tokens -= footprint
+        GENERATIONS_RUNNING.labels(qos=qos).dec()
+        GENERATION_KV_RESERVED_TOKENS.set(self._reserved_tokens)
+        if len(self._client_pass) > 10000:
+            # Idle clients restart from the class floor anyway
+            self._client_pass = {k: v for k, v in self._client_pass.items() if self._queues[k[0]].get(k[1])}
+        self._wake()
+
+    def _eligible(self, qos: str) -> bool:
+        if not any(self._queues[qos].values()):
+            return False
+        if qos == QOS_INTERACTIVE:
+            return True
+        # Non-interactive work never takes the reserved slots
+        background = self.running - self._running[QOS_INTERACTIVE]
+        return background < self.max_concurrency - self.reserved_interactive
+
+    def _wake(self):
+        while self.running < self.max_concurrency:
+            candidates = sorted((c for c in QOS_CLASSES if self._eligible(c)), key=lambda c: self._class_pass[c])
+            for qos in candidates:
+                clients = self._queues[qos]
+                client_id = min((c for c, q in clients.items() if q), key=lambda c: self._client_pass[(qos, c)])
+                prompt_tokens, max_tokens, min_tokens, future = clients[client_id][0]
+                granted = self._fit(qos, prompt_tokens, max_tokens, min_tokens)
+                if granted is not None:
+                    break
+                # This lane's fairest request waits for KV room; nothing in the lane jumps ahead of it
+            else:
+                return
+
+            clients[client_id].popleft()
+            if not clients[client_id]:
+                del clients[client_id]
+            GENERATION_QUEUE_DEPTH.labels(qos=qos).dec()
+            if granted < max_tokens:
+                GENERATION_MAX_TOKENS_SCALED_TOTAL.labels(qos=qos).inc()
+            cost = prompt_tokens + granted
+            self._reserved_tokens += cost
+            GENERATION_KV_RESERVED_TOKENS.set(self._reserved_tokens)
+            self._vtime = self._class_pass[qos]
+            self._class_vtime[qos] = self._client_pass[(qos, client_id)]
+            self._class_pass[qos] += cost / max(self.weights.get(qos, 1.0), 1e-6)
+            self._client_pass[(qos, client_id)] += cost
+            self._running[qos] += 1
+            GENERATIONS_RUNNING.labels(qos=qos).inc()
+            future.set_result(granted)
+
+    def _fit(self, qos: str, prompt_tokens: int, max_tokens: int, min_tokens: Optional[int]) -> Optional[int]:
+        """max_tokens to grant within the free KV capacity, or None if the request must wait."""
+        if self.running == 0:
+            # Alone on the engine, even an oversized request runs (the engine enforces the real limit)
+            return max_tokens
+        capacity = self.kv_capacity
+        if qos != QOS_INTERACTIVE:
+            # KV share of the reserved interactive slots stays free as well
+            capacity = capacity * (self.max_concurrency - self.reserved_interactive) // self.max_concurrency
+        free = capacity - self._reserved_tokens
+        if prompt_tokens + max_tokens <= free:
+            return max_tokens
+        if min_tokens is not None and prompt_tokens + min_tokens <= free:
+            return free - prompt_tokens
+        return None
@@ -0,0 +1,169 @@
+import json
+import time
+import random
+import hashlib
+import logging
+from typing import Optional, List, Any
+from novalm.config.settings import settings
+from novalm.core.metrics import (
+    SEMANTIC_CACHE_LOOKUPS_TOTAL,
+    SEMANTIC_CACHE_FALSE_HITS_TOTAL,
+    SEMANTIC_CACHE_SIMILARITY
+)
+
+logger = logging.getLogger(__name__)
+
+class SemanticCache:
+    """
+    Opt-in response cache keyed by embedding similarity instead of exact prompt hash.
+    Reuses the embedding function and vector store already loaded by AdvancedMemory.
+    Entries are scoped per (model, preset, system prompt, sampling parameters) so answers never
+    leak across modes, and a low-temperature answer is never served to a high-temperature request.
+    Expired entries are deleted on writes (at most every SEMANTIC_CACHE_PURGE_INTERVAL seconds)
+    and the oldest are evicted beyond SEMANTIC_CACHE_MAX_ENTRIES.
+    """
+    def __init__(self, memory):
+        self.collection = None
+        self.ef = None
+        self.threshold = settings.SEMANTIC_CACHE_THRESHOLD
+        self._last_purge = 0.0
+
+        if not settings.SEMANTIC_CACHE_ENABLED:
+            return
+
+        if not getattr(memory, "client", None):
+            logger.warning("Semantic cache enabled but memory store is unavailable. Semantic caching disabled.")
+            return
+
+        try:
+            self.ef = memory.ef
+            self.collection = memory.client.get_or_create_collection(
+                name="semantic_cache",
+                embedding_function=memory.ef,
+                metadata={"hnsw:space": "cosine"}
+            )
+        except Exception as e:
+            logger.warning(f"Semantic cache initialization failed: {e}. Semantic caching disabled.")
+            self.collection = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.collection is not None
+
+    def _scope(self, model: str, preset: Optional[str], system_prompt: str = "", sampling_params: Any = None) -> str:
+        system_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:8]
+        scope = f"{model}|{preset or 'default'}|{system_hash}"
+        if sampling_params is not None:
+            # Everything that shapes the generation (the preset is already part of the scope)
+            params = sampling_params.model_dump(exclude={"preset", "max_debug_attempts"})
+            params_hash = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+            scope += f"|{params_hash}"
+        return scope
+
+    def get(
+        self, query: str, model: str, preset: Optional[str], system_prompt: str = "", sampling_params: Any = None
+    ) -> Optional[str]:
+        """
+        Returns the cached response of the nearest previous request in the same scope,
+        if its similarity is above the configured threshold.
+        """
+        if not self.enabled or not query:
+            return None
+
+        scope = self._scope(model, preset, system_prompt, sampling_params)
+        preset_label = preset or "default"
+        try:
+            res = self.collection.query(
+                query_texts=[query],
+                n_results=1,
+                where={"$and": [{"scope": scope}, {"expires_at": {"$gt": time.time()}}]},
+                include=["metadatas", "distances"]
+            )
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed: {e}")
+            return None
+
+        if not res or not res.get("distances") or not res["distances"][0]:
+            SEMANTIC_CACHE_LOOKUPS_TOTAL.labels(model=model, preset=preset_label, result="miss").inc()
+            return None
+
+        # Cosine space: distance = 1 - similarity
+        similarity = 1.0 - res["distances"][0][0]
+        SEMANTIC_CACHE_SIMILARITY.observe(max(similarity, 0.0))
+
+        if similarity < self.threshold:
+            SEMANTIC_CACHE_LOOKUPS_TOTAL.labels(model=model, preset=preset_label, result="miss").inc()
+            return None
+
+        SEMANTIC_CACHE_LOOKUPS_TOTAL.labels(model=model, preset=preset_label, result="hit").inc()
+        return res["metadatas"][0][0].get("response")
+
+    def set(
+        self, query: str, response: str, model: str, preset: Optional[str], system_prompt: str = "",
+        sampling_params: Any = None
+    ):
+        """
+        Stores a response. Exact duplicates in the same scope overwrite each other.
+        """
+        if not self.enabled or not query or not response:
+            return
+
+        scope = self._scope(model, preset, system_prompt, sampling_params)
+        uid = "sc_" + hashlib.sha256(f"{scope}|{query}".encode("utf-8")).hexdigest()[:16]
+        meta = {
+            "scope": scope,
+            "response": response,
+            "expires_at": time.time() + settings.SEMANTIC_CACHE_TTL
+        }
+        try:
+            self.collection.upsert(documents=[query], metadatas=[meta], ids=[uid])
+            self._purge()
+        except Exception as e:
+            logger.error(f"Semantic cache write failed: {e}")
+
+    def _purge(self):
+        now = time.time()
+        max_entries = settings.SEMANTIC_CACHE_MAX_ENTRIES
+        over = max_entries and self.collection.count() > max_entries
+        if not over and now - self._last_purge < settings.SEMANTIC_CACHE_PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        self.collection.delete(where={"expires_at": {"$lte": now}})
+
+        excess = self.collection.count() - max_entries if max_entries else 0
+        if excess > 0:
+            # Evict down to 90% so the next writes don't each pay for a full scan
+            excess += max_entries // 10
+            data = self.collection.get(include=["metadatas"])
+            by_age = sorted(zip(data["ids"], data["metadatas"]), key=lambda item: item[1].get("expires_at", 0))
+            self.collection.delete(ids=[uid for uid, _ in by_age[:excess]])
+
+    def should_verify(self) -> bool:
+        """Samples hits that are re-generated anyway to measure the false-hit rate."""
+        return self.enabled and random.random() < settings.SEMANTIC_CACHE_VERIFY_RATE
+
+    def record_verification(self, cached: str, fresh: str, model: str, preset: Optional[str]) -> bool:
+        """
+        Compares a cached response against a fresh generation for the same request.
+        Counts a false hit when they are not semantically equivalent. Returns True on a false hit.
+        """
+        if not self.enabled or not cached or not fresh:
+            return False
+        try:
+            a, b = self.ef([cached, fresh])
+        except Exception as e:
+            logger.warning(f"Semantic cache verification failed: {e}")
+            return False
+
+        if _cosine(a, b) < self.threshold:
+            SEMANTIC_CACHE_FALSE_HITS_TOTAL.labels(model=model, preset=preset or "default").inc()
+            return True
+        return False
+
+def _cosine(a: List[Any], b: List[Any]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm_a = sum(x * x for x in a) ** 0.5
+    norm_b = sum(y * y for y in b) ** 0.5
+    if not norm_a or not norm_b:
+        return 0.0
+    return dot / (norm_a * norm_b)
@@ -0,0 +1,198 @@
+import time
+import uuid
+import asyncio
+import logging
+import contextvars
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from novalm.config.settings import settings
+from novalm.core.types import ChatMessage
+from novalm.core.inference import TokenUsage
+from novalm.core.metrics import AGENT_SESSIONS_ACTIVE
+
+logger = logging.getLogger(__name__)
+
+class OffsetExpired(ValueError):
+    """The requested resume offset is older than the session's retained chunks."""
+
+class SessionControl:
+    """
+    Client steering for a running request. The orchestrator loops call checkpoint() at each
+    step boundary (never while holding an engine slot): it blocks while paused and hands over
+    messages injected since the last step.
+    """
+    def __init__(self):
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._injected: List[ChatMessage] = []
+
+    @property
+    def paused(self) -> bool:
+        return not self._resumed.is_set()
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def inject(self, message: ChatMessage):
+        self._injected.append(message)
+
+    async def checkpoint(self, messages: List[ChatMessage]):
+        await self._resumed.wait()
+        if self._injected:
+            messages.extend(self._injected)
+            self._injected = []
+
+# Control of the session being served by the current task (None for plain HTTP requests)
+_current_control: contextvars.ContextVar[Optional[SessionControl]] = contextvars.ContextVar("novalm_session_control", default=None)
+
+def get_session_control() -> Optional[SessionControl]:
+    return _current_control.get()
+
+class AgentSession:
+    """
+    A request running independently of any connection. Serialized chunks are numbered from 0
+    and the last WS_SESSION_BUFFER_CHUNKS are retained, so a client can re-attach and resume
+    from the last offset it received.
+    """
+    def __init__(self, session_id: str, client_id: str, max_chunks: int = None):
+        self.id = session_id
+        self.client_id = client_id
+        self.control = SessionControl()
+        self.task: Optional[asyncio.Task] = None
+        self.done = False
+        self.error: Optional[str] = None
+        self.attached = 0
+        self.last_seen = time.monotonic()
+        self.finished_at: Optional[float] = None
+        # Tokens generated so far (set by whoever started the session) and how many are charged
+        self.usage: Optional[TokenUsage] = None
+        self.charged_tokens = 0
+        self._chunks: Deque[str] = deque(maxlen=max_chunks or settings.WS_SESSION_BUFFER_CHUNKS)
+        self._next_offset = 0
+        self._changed = asyncio.Condition()
+
+    @property
+    def next_offset(self) -> int:
+        return self._next_offset
+
+    @property
+    def first_offset(self) -> int:
+        return self._next_offset - len(self._chunks)
+
+    async def append(self, payload: str):
+        async with self._changed:
+            self._chunks.append(payload)
+            self._next_offset += 1
+            self._changed.notify_all()
+
+    async def finish(self, error: Optional[str] = None):
+        async with self._changed:
+            self.done = True
+            self.error = error
+            self.finished_at = time.monotonic()
+            self._changed.notify_all()
+
+    async def read_from(self, offset: int) -> Tuple[List[Tuple[int, str]], bool]:
+        """Waits for chunks at or after offset; returns ([(offset, payload), ...], finished)."""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._next_offset > offset or self.done)
+            if offset < self.first_offset:
+                raise OffsetExpired(f"Offset {offset} expired; oldest retained is {self.first_offset}")
+            start = offset - self.first_offset
+            chunks = [(self.first_offset + i, self._chunks[i]) for i in range(start, len(self._chunks))]
+            return chunks, self.done and offset + len(chunks) >= self._next_offset
+
+    def cancel(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+
+class SessionRegistry:
+    """
+    Running and recently finished sessions. Finished sessions are kept for WS_SESSION_TTL
+    seconds for late re-attach; running sessions nobody is attached to (paused ones included)
+    are cancelled after WS_SESSION_DETACHED_TIMEOUT seconds. Sweeps happen on start()/get()
+    and periodically in reap_loop().
+    """
+    def __init__(self):
+        self._sessions: Dict[str, AgentSession] = {}
+
+    def start(
+        self,
+        chunks: AsyncIterator,
+        client_id: str,
+        on_finish: Optional[Callable[[AgentSession], Awaitable[None]]] = None
+    ) -> AgentSession:
+        self.collect()
+        session = AgentSession(f"ws-{uuid.uuid4()}", client_id)
+        self._sessions[session.id] = session
+        session.task = asyncio.create_task(self._run(session, chunks, on_finish))
+        AGENT_SESSIONS_ACTIVE.inc()
+        return session
+
+    def get(self, session_id: str) -> Optional[AgentSession]:
+        self.collect()
+        return self._sessions.get(session_id)
+
+    async def _run(self, session: AgentSession, chunks: AsyncIterator, on_finish):
+        # Set in this task's context, so the orchestrator loops driven below can see it
+        _current_control.set(session.control)
+        error = None
+        try:
+            async for chunk in chunks:
+                await session.append(chunk.model_dump_json())
+        except asyncio.CancelledError:
+            error = "cancelled"
+        except Exception as e:
+            logger.error(f"Session {session.id} failed: {e}")
+            error = str(e)
+        finally:
+            AGENT_SESSIONS_ACTIVE.dec()
+            # Runs the request's own cleanup (workspace teardown, lane reset) now, even if the
+            # cancellation landed while the generator was suspended at a yield
+            try:
+                await chunks.aclose()
+            except Exception as e:
+                logger.warning(f"Session {session.id} cleanup failed: {e}")
+        await session.finish(error)
+        if on_finish is not None:
+            try:
+                await on_finish(session)
+            except Exception as e:
+                logger.warning(f"Session {session.id} finish hook failed: {e}")
+
+    def collect(self):
+        now = time.monotonic()
+        for session_id, session in list(self._sessions.items()):
+            if session.done:
+                if now - session.finished_at > settings.WS_SESSION_TTL:
+                    del self._sessions[session_id]
+            elif not session.attached and now - session.last_seen > settings.WS_SESSION_DETACHED_TIMEOUT:
+                logger.info(f"Cancelling detached session {session_id}")
+                session.cancel()
+
+    async def shutdown(self):
+        tasks = [s.task for s in self._sessions.values() if s.task and not s.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._sessions.clear()
+
+async def reap_loop(registry: SessionRegistry, interval_seconds: float):
+    """Periodic sweep, so abandoned sessions are cancelled even when no new client arrives."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            registry.collect()
+        except Exception as e:
+            logger.error(f"Session sweep failed: {e}")
+
+_registry: Optional[SessionRegistry] = None
+
+def get_session_registry() -> SessionRegistry:
+    global _registry
+    if _registry is None:
+        _registry = SessionRegistry()
+    return _registry
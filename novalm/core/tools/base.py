@@ -1,11 +1,19 @@
+import os
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 class Tool(ABC):
     name: str = "base_tool"
     description: str = "Base tool description"
     parameters: Dict[str, Any] = {} # JSON Schema
 
+    # Deterministic tools may opt into the result cache.
+    # A cached result is reused only while cache_fingerprint() returns the same value.
+    cacheable: bool = False
+
+    # Max concurrent runs of this tool, enforced by the ToolScheduler (None = global limit only)
+    max_concurrency: Optional[int] = None
+
     @abstractmethod
     async def run(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -13,3 +21,18 @@ class Tool(ABC):
         Returns a dictionary representing the output.
         """
         pass
+
+    def cache_fingerprint(self, input_data: Dict[str, Any]) -> Optional[str]:
+        """
+        Returns a fingerprint of the content this call depends on (e.g. file mtime/size),
+        or None if this particular call must not be cached (writes, missing files).
+        """
+        return None
+
+def file_fingerprint(path: str) -> Optional[str]:
+    """Cheap content fingerprint: resolved path + mtime (ns) + size. None if the file is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{path}:{st.st_mtime_ns}:{st.st_size}"
@@ -1,43 +1,315 @@
 import os
+import re
+import mmap
+import stat
+import asyncio
+import hashlib
+import tempfile
 import aiofiles
-from typing import Dict, Any
-from novalm.core.tools.base import Tool
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
+from novalm.config.settings import settings
+from novalm.core.tools.base import Tool, file_fingerprint
+from novalm.core.workspace import get_workspace_dir, resolve_in_workspace, check_quota, record_write
 
-WORKSPACE_DIR = os.path.abspath("workspace")
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# fingerprint -> newline offsets, for repeated ranged reads of the same large file
+_line_index_cache: "OrderedDict[str, Any]" = OrderedDict()
+# path -> (mtime_ns, size, sha256), so listings only hash files that changed
+_hash_cache: Dict[str, Tuple[int, int, str]] = {}
+# Newline scan window over the mmap, so the comparison never allocates a file-sized array
+_SCAN_CHUNK_BYTES = 16 * 1024 * 1024
+# Process umask, for the mode of newly created files (mkstemp creates them 0600)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _split_lines(text: str) -> List[str]:
+    """Lines with their endings kept. Only "\n" ends a line, as in the mmap path and in diffs."""
+    lines = [line + "\n" for line in text.split("\n")]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+def _line_offsets(path: str, fingerprint: str):
+    """Byte offset of every newline in the file, computed over an mmap (never read into memory whole)."""
+    import numpy as np
+
+    offsets = _line_index_cache.get(fingerprint)
+    if offsets is not None:
+        _line_index_cache.move_to_end(fingerprint)
+        return offsets
+    chunks = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for start in range(0, len(mm), _SCAN_CHUNK_BYTES):
+            count = min(_SCAN_CHUNK_BYTES, len(mm) - start)
+            window = np.frombuffer(mm, dtype=np.uint8, count=count, offset=start)
+            chunks.append(np.flatnonzero(window == 10) + start)
+            # Release the buffer export before the mmap is closed
+            del window
+    offsets = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+    _line_index_cache[fingerprint] = offsets
+    while len(_line_index_cache) > 8:
+        _line_index_cache.popitem(last=False)
+    return offsets
+
+def _read_lines(path: str, start_line: int, end_line: Optional[int]) -> Dict[str, Any]:
+    """Reads 1-based inclusive lines [start_line, end_line]. Large files are sliced via mmap."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return {"content": "", "start_line": 1, "end_line": 0, "total_lines": 0}
+
+    if size < settings.FILE_MMAP_THRESHOLD_BYTES:
+        with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+            lines = _split_lines(f.read())
+        total = len(lines)
+        end = min(end_line or total, total)
+        content = "".join(lines[start_line - 1:end])
+    else:
+        offsets = _line_offsets(path, file_fingerprint(path))
+        # A final line without a trailing newline still counts
+        total = len(offsets) + (1 if offsets.size == 0 or offsets[-1] != size - 1 else 0)
+        end = min(end_line or total, total)
+        content = ""
+        if start_line <= end:
+            begin = 0 if start_line <= 1 else int(offsets[start_line - 2]) + 1
+            stop = size if end > len(offsets) else int(offsets[end - 1]) + 1
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                content = mm[begin:stop].decode("utf-8", errors="replace")
+    return {"content": content, "start_line": start_line, "end_line": max(end, start_line - 1), "total_lines": total}
+
+def apply_unified_diff(original: str, diff: str) -> Tuple[str, int, int]:
+    """
+    Applies a single-file unified diff. Context and removed lines must match exactly;
+    hunks may have drifted (the nearest matching position is used).
+    Returns (new_text, lines_added, lines_removed). Raises ValueError if a hunk does not apply.
+    """
+    lines = _split_lines(original)
+    diff_lines = [line[:-1] if line.endswith("\n") else line for line in _split_lines(diff)]
+    result: List[str] = []
+    cursor = 0  # Index into `lines` up to which content has been copied
+    added = removed = 0
+    i = 0
+    hunks = 0
+
+    while i < len(diff_lines):
+        match = _HUNK_RE.match(diff_lines[i])
+        i += 1
+        if not match:
+            continue  # File headers (---/+++), git metadata
+        hunks += 1
+        old_start = int(match.group(1))
+        # A pure insertion ("-N,0") goes after old line N, not at it
+        anchor = old_start if match.group(2) == "0" else old_start - 1
+
+        old_block, new_block = [], []
+        last_tag = None
+        while i < len(diff_lines) and not diff_lines[i].startswith("@@"):
+            line = diff_lines[i]
+            i += 1
+            if line.startswith("\\"):
+                # "\ No newline at end of file" applies to the previous line
+                if last_tag in (" ", "-"):
+                    old_block[-1] = old_block[-1].rstrip("\n")
+                if last_tag in (" ", "+"):
+                    new_block[-1] = new_block[-1].rstrip("\n")
+                continue
+            # Some editors strip the single space of empty context lines
+            tag, text = (line[:1], line[1:]) if line else (" ", "")
+            if tag == " ":
+                old_block.append(text + "\n")
+                new_block.append(text + "\n")
+            elif tag == "-":
+                old_block.append(text + "\n")
+                removed += 1
+            elif tag == "+":
+                new_block.append(text + "\n")
+                added += 1
+            else:
+                raise ValueError(f"Malformed diff line in hunk {hunks}: {line[:80]!r}")
+            last_tag = tag
+
+        position = _find_block(lines, old_block, max(anchor, 0), cursor)
+        if position is None:
+            raise ValueError(f"Hunk {hunks} (@@ -{old_start}) does not match the file contents")
+        result.extend(lines[cursor:position])
+        result.extend(new_block)
+        cursor = position + len(old_block)
+
+    if not hunks:
+        raise ValueError("No hunks found in diff")
+    result.extend(lines[cursor:])
+    return "".join(result), added, removed
+
+def _find_block(lines: List[str], block: List[str], expected: int, lower: int) -> Optional[int]:
+    """Nearest index >= lower where `block` matches, searching outwards from `expected`."""
+    def matches(pos: int) -> bool:
+        return all(
+            pos + k < len(lines) and _same_line(lines[pos + k], want)
+            for k, want in enumerate(block)
+        )
+
+    if not block:
+        return min(max(expected, lower), len(lines))
+    for delta in range(len(lines) + 1):
+        for pos in (expected - delta, expected + delta) if delta else (expected,):
+            if lower <= pos <= len(lines) - len(block) and matches(pos):
+                return pos
+    return None
+
+def _same_line(actual: str, wanted: str) -> bool:
+    # Tolerate a missing trailing newline on the file's last line
+    return actual == wanted or actual.rstrip("\r\n") == wanted.rstrip("\n")
+
+def _atomic_write(path: str, content: str):
+    try:
+        old = os.lstat(path)
+        old_size, mode = old.st_size, stat.S_IMODE(old.st_mode)
+    except FileNotFoundError:
+        old_size, mode = 0, 0o666 & ~_UMASK
+    # Unique per writer: concurrent writes of one path must not share a temp file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    record_write(path, old_size, os.lstat(path).st_size)
+
+def _file_hash(path: str, st: os.stat_result) -> str:
+    cached = _hash_cache.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    value = digest.hexdigest()[:16]
+    if len(_hash_cache) >= 10000:
+        _hash_cache.clear()
+    _hash_cache[path] = (st.st_mtime_ns, st.st_size, value)
+    return value
+
+def _list_files(root: str, workspace: str) -> Dict[str, Any]:
+    """
+    Walks root on every call; only the hashes are cached. Directory mtimes can't key the walk:
+    sandboxed code and shell commands rewrite files in place, which leaves them unchanged.
+    """
+    entries = []
+    truncated = False
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if len(entries) >= settings.FILE_LIST_MAX_ENTRIES:
+                truncated = True
+                break
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+                entries.append({
+                    "path": os.path.relpath(path, workspace),
+                    "size": st.st_size,
+                    "sha256": _file_hash(path, st)
+                })
+            except OSError:
+                continue
+        if truncated:
+            break
+    return {"files": entries, "truncated": truncated}
 
 class FileTool(Tool):
     name = "file_tool"
-    description = "Read or Write files in the workspace. Operations: 'read', 'write'."
+    description = (
+        "Read or Write files in the workspace. Operations: 'read', 'write', 'patch', 'list'. "
+        "'read' accepts optional 'start_line'/'end_line' (1-based, inclusive) for large files. "
+        "'patch' applies a unified diff given in 'content' (prefer it over rewriting whole files). "
+        "'list' returns files under 'filename' (default: workspace root) with sizes and hashes."
+    )
     parameters = {
         "type": "object",
         "properties": {
-            "operation": {"type": "string", "enum": ["read", "write"]},
+            "operation": {"type": "string", "enum": ["read", "write", "patch", "list"]},
             "filename": {"type": "string"},
-            "content": {"type": "string", "description": "Content to write (required for write op)"}
+            "content": {"type": "string", "description": "Content to write (write op) or unified diff (patch op)"},
+            "start_line": {"type": "integer", "description": "First line to read (read op)"},
+            "end_line": {"type": "integer", "description": "Last line to read (read op)"}
         },
-        "required": ["operation", "filename"]
+        "required": ["operation"]
     }
+    cacheable = True
+
+    def cache_fingerprint(self, input_data: Dict[str, Any]) -> Optional[str]:
+        # Only reads are deterministic; writes always execute.
+        if input_data.get("operation") != "read" or not input_data.get("filename"):
+            return None
+        path = resolve_in_workspace(input_data["filename"])
+        return file_fingerprint(path) if path else None
 
     async def run(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         op = input_data.get("operation")
-        filename = input_data.get("filename")
+        filename = input_data.get("filename") or ("." if op == "list" else None)
         content = input_data.get("content", "")
-        
-        # Path safety check
-        safe_path = os.path.abspath(os.path.join(WORKSPACE_DIR, filename))
-        if not safe_path.startswith(WORKSPACE_DIR):
+        if not filename:
+            return {"status": "error", "output": "filename is required."}
+
+        # Path safety check (against this session's workspace)
+        safe_path = resolve_in_workspace(filename)
+        if safe_path is None:
              return {"status": "error", "output": "Access denied: Path outside workspace."}
-             
+
         if op == "read":
-            if not os.path.exists(safe_path):
+            if not os.path.isfile(safe_path):
                 return {"status": "error", "output": "File not found."}
-            async with aiofiles.open(safe_path, "r") as f:
-                data = await f.read()
-            return {"status": "success", "content": data}
-            
+            start_line = input_data.get("start_line")
+            end_line = input_data.get("end_line")
+            if start_line is None and end_line is None:
+                async with aiofiles.open(safe_path, "r", newline="") as f:
+                    data = await f.read()
+                return {"status": "success", "content": data}
+            start_line = max(int(start_line or 1), 1)
+            end_line = int(end_line) if end_line is not None else None
+            if end_line is not None and end_line < start_line:
+                return {"status": "error", "output": "end_line must be >= start_line."}
+            window = await asyncio.to_thread(_read_lines, safe_path, start_line, end_line)
+            return {"status": "success", **window}
+
         elif op == "write":
-            async with aiofiles.open(safe_path, "w") as f:
-                await f.write(content)
+            quota_error = check_quota(len(content.encode("utf-8")))
+            if quota_error:
+                return {"status": "error", "output": quota_error}
+            # Replace, never write in place: the old inode may be shared with the base snapshot
+            await asyncio.to_thread(_atomic_write, safe_path, content)
             return {"status": "success", "output": f"File {filename} written."}
-            
+
+        elif op == "patch":
+            if not os.path.isfile(safe_path):
+                return {"status": "error", "output": "File not found."}
+            quota_error = check_quota(os.path.getsize(safe_path) + len(content))
+            if quota_error:
+                return {"status": "error", "output": quota_error}
+            try:
+                added, removed = await asyncio.to_thread(self._patch, safe_path, content)
+            except ValueError as e:
+                return {"status": "error", "output": f"Patch failed: {e}. Re-read the affected lines and regenerate the diff."}
+            return {"status": "success", "output": f"File {filename} patched (+{added} -{removed} lines)."}
+
+        elif op == "list":
+            if not os.path.isdir(safe_path):
+                return {"status": "error", "output": "Directory not found."}
+            listing = await asyncio.to_thread(_list_files, safe_path, os.path.realpath(get_workspace_dir()))
+            return {"status": "success", **listing}
+
         return {"status": "error", "output": "Unknown operation."}
+
+    @staticmethod
+    def _patch(path: str, diff: str) -> Tuple[int, int]:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            original = f.read()
+        patched, added, removed = apply_unified_diff(original, diff)
+        # Readers never see a half-written file
+        _atomic_write(path, patched)
+        return added, removed
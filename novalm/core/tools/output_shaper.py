@@ -0,0 +1,174 @@
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import Dict, Any, Optional, List
+from novalm.config.settings import settings
+from novalm.core.workspace import get_workspace_dir, SPILL_DIR
+from novalm.core.metrics import TOOL_OUTPUT_SHAPED_TOTAL
+
+logger = logging.getLogger(__name__)
+
+# Lines worth keeping from the omitted middle of a long output
+_SIGNAL_RE = re.compile(r"error|exception|traceback|failed|fail:|assert|fatal|panic|warning", re.IGNORECASE)
+_MAX_SIGNAL_LINES = 20
+# String fields shorter than this are never truncated
+_MIN_FIELD_CHARS = 200
+
+def _size(value: Any) -> int:
+    """Prompt cost of a field value in characters."""
+    return len(value) if isinstance(value, str) else len(json.dumps(value, ensure_ascii=False))
+
+# Seconds between sweeps of a spill directory for expired outputs
+_SWEEP_INTERVAL = 60
+
+class ToolOutputShaper:
+    """
+    Bounds what a tool result costs in the prompt before it is appended to the conversation.
+    Oversized string fields (stdout, content, ...) keep their head and tail plus any error-looking
+    lines from the middle; oversized lists keep their leading items and say how many were left out.
+    If the result is still far over budget (bulk in nested objects), the whole payload is spilled
+    and only a preview is kept. The full text is spilled to the session workspace and referenced by path,
+    so the model can page through it with file_tool ranged reads instead of carrying it in every prompt.
+    Spills don't count against the session quota. Session workspaces drop them on teardown; in the
+    shared workspace they are deleted after TOOL_OUTPUT_SPILL_TTL seconds.
+    """
+    def __init__(self):
+        # spill directory -> last sweep (monotonic)
+        self._swept: Dict[str, float] = {}
+
+    def budget_chars(self, tool_name: str) -> int:
+        budgets = settings.TOOL_OUTPUT_TOKEN_BUDGET
+        # ~4 characters per token
+        return budgets.get(tool_name, budgets.get("default", 1000)) * 4
+
+    async def shape(self, tool_name: str, output: Dict[str, Any], input_data: Optional[Dict[str, Any]] = None) -> str:
+        # Measured as it is sent: non-ASCII text stays unescaped
+        serialized = json.dumps(output, ensure_ascii=False)
+        budget = self.budget_chars(tool_name)
+        if len(serialized) <= budget or not isinstance(output, dict):
+            TOOL_OUTPUT_SHAPED_TOTAL.labels(tool=tool_name, action="passthrough").inc()
+            return serialized
+
+        fields = sorted(
+            (k for k, v in output.items() if isinstance(v, (str, list)) and _size(v) > _MIN_FIELD_CHARS),
+            key=lambda k: _size(output[k])
+        )
+        shaped = dict(output)
+        overhead = len(json.dumps({k: v for k, v in output.items() if k not in fields}, ensure_ascii=False))
+        remaining = max(budget - overhead, _MIN_FIELD_CHARS * len(fields))
+        references = {}
+        for i, field in enumerate(fields):
+            value = output[field]
+            allowance = remaining // (len(fields) - i)
+            if _size(value) <= allowance:
+                remaining -= _size(value)
+                continue
+            if isinstance(value, str):
+                reference = await self._reference(tool_name, field, value, input_data or {})
+                shaped[field] = self._truncate(value, allowance, reference)
+            else:
+                # One item per line, so the spill pages like any other text
+                lines = "\n".join(json.dumps(item, ensure_ascii=False) for item in value)
+                reference = await self._reference(tool_name, field, lines, input_data or {})
+                shaped[field] = self._truncate_list(value, allowance, reference)
+            if reference:
+                references[field] = reference
+            remaining -= _size(shaped[field])
+
+        if references:
+            shaped["full_output"] = references
+            shaped["note"] = "Output truncated. Page through the full text with file_tool read (start_line/end_line)."
+        result = json.dumps(shaped, ensure_ascii=False)
+        if len(result) > budget * 1.5:
+            # Bulk is in nested or small fields: spill the whole payload instead
+            return await self._spill_whole(tool_name, output, result[:budget], input_data or {})
+        TOOL_OUTPUT_SHAPED_TOTAL.labels(tool=tool_name, action="spilled" if references else "truncated").inc()
+        return result
+
+    async def _spill_whole(self, tool_name: str, output: Dict[str, Any], preview: str, input_data: Dict[str, Any]) -> str:
+        text = json.dumps(output, ensure_ascii=False, indent=1)
+        reference = await self._reference(tool_name, "output", text, input_data)
+        shaped: Dict[str, Any] = {"status": output["status"]} if "status" in output else {}
+        shaped["preview"] = preview
+        if reference:
+            shaped["full_output"] = {"output": reference}
+            shaped["note"] = "Output truncated. Page through the full JSON with file_tool read (start_line/end_line)."
+        TOOL_OUTPUT_SHAPED_TOTAL.labels(tool=tool_name, action="spilled" if reference else "truncated").inc()
+        return json.dumps(shaped, ensure_ascii=False)
+
+    @staticmethod
+    def _truncate_list(items: List[Any], allowance: int, reference: Optional[str]) -> List[Any]:
+        """Leading items that fit the allowance, then a marker with the number left out."""
+        kept: List[Any] = []
+        used = 100  # Room for the marker
+        for item in items:
+            size = len(json.dumps(item, ensure_ascii=False)) + 2
+            if used + size > allowance:
+                break
+            kept.append(item)
+            used += size
+        marker = f"... [{len(items) - len(kept)} more items"
+        marker += f"; full list, one per line: {reference}]" if reference else "]"
+        return kept + [marker]
+
+    def _truncate(self, text: str, allowance: int, reference: Optional[str]) -> str:
+        signal_budget = allowance // 5
+        head_len = tail_len = (allowance - signal_budget) // 2
+        head, middle, tail = text[:head_len], text[head_len:len(text) - tail_len], text[len(text) - tail_len:]
+
+        signals: List[str] = []
+        used = 0
+        for line in middle.splitlines():
+            if _SIGNAL_RE.search(line):
+                line = line[:200]
+                if used + len(line) > signal_budget or len(signals) >= _MAX_SIGNAL_LINES:
+                    break
+                signals.append(line)
+                used += len(line) + 1
+
+        marker = f"\n... [{len(middle)} chars omitted"
+        marker += f"; full text: {reference}]" if reference else "]"
+        if signals:
+            marker += " lines of interest:\n" + "\n".join(signals)
+        return f"{head}{marker} ...\n{tail}"
+
+    async def _reference(self, tool_name: str, field: str, text: str, input_data: Dict[str, Any]) -> Optional[str]:
+        # A file read already has a handle: the file itself
+        if tool_name == "file_tool" and field == "content" and input_data.get("filename"):
+            return input_data["filename"]
+        if len(text) > settings.TOOL_OUTPUT_SPILL_MAX_CHARS:
+            text = text[:settings.TOOL_OUTPUT_SPILL_MAX_CHARS]
+        relative = os.path.join(SPILL_DIR, f"{tool_name}-{uuid.uuid4().hex[:8]}-{field}.txt")
+        try:
+            await asyncio.to_thread(self._spill, os.path.join(get_workspace_dir(), relative), text)
+        except OSError as e:
+            logger.warning(f"Could not spill {tool_name} output: {e}")
+            return None
+        return relative
+
+    def _spill(self, path: str, text: str):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+        now = time.monotonic()
+        if now - self._swept.get(directory, 0.0) >= _SWEEP_INTERVAL:
+            self._swept[directory] = now
+            self._sweep(directory)
+        if len(self._swept) > 10000:
+            self._swept.clear()
+
+    @staticmethod
+    def _sweep(directory: str):
+        cutoff = time.time() - settings.TOOL_OUTPUT_SPILL_TTL
+        for entry in os.scandir(directory):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+            except OSError:
+                continue
@@ -1,7 +1,16 @@
 import os
+import json
+import shutil
 import asyncio
-from typing import Dict, Any
-from novalm.core.tools.base import Tool
+import hashlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, List, Tuple
+from novalm.config.settings import settings
+from novalm.core.tools.base import Tool, file_fingerprint
+from novalm.core.workspace import resolve_in_workspace
 
 try:
     from pypdf import PdfReader
@@ -9,11 +18,34 @@ try:
 except ImportError:
     PYPDF_AVAILABLE = False
 
-WORKSPACE_DIR = os.path.abspath("workspace")
+# Shared across PDFReaderTool calls; created lazily on the first large extraction.
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # Never forked from the server itself (threads, engine state); see SandboxPool._make_context
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _process_pool = ProcessPoolExecutor(max_workers=settings.PDF_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _process_pool
+
+# file_fingerprint -> content hash, so unchanged files are hashed once per path
+_content_hashes: "OrderedDict[str, str]" = OrderedDict()
+_content_hashes_lock = threading.Lock()
+
+def shutdown_pdf_pool():
+    """Stops PDF extraction worker processes. Called on app shutdown."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
 
 class PDFReaderTool(Tool):
     name = "pdf_reader"
-    description = "Extracts text from a PDF file. The file must be in the workspace."
+    description = (
+        "Extracts text from a PDF file. The file must be in the workspace. "
+        "Results are paginated: use 'next_page_start' from the output to read further pages."
+    )
     parameters = {
         "type": "object",
         "properties": {
@@ -28,10 +60,23 @@ class PDFReaderTool(Tool):
             "page_end": {
                 "type": "integer",
                 "description": "Optional end page"
+            },
+            "max_pages": {
+                "type": "integer",
+                "description": "Optional maximum number of pages to return in this call"
             }
         },
         "required": ["filename"]
     }
+    cacheable = True
+    # Each call already fans out over the PDF worker pool
+    max_concurrency = 2
+
+    def cache_fingerprint(self, input_data: Dict[str, Any]) -> Optional[str]:
+        if not input_data.get("filename"):
+            return None
+        path = resolve_in_workspace(input_data["filename"])
+        return file_fingerprint(path) if path else None
 
     async def run(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         if not PYPDF_AVAILABLE:
@@ -40,35 +85,166 @@ class PDFReaderTool(Tool):
         filename = input_data.get("filename")
         page_start = input_data.get("page_start", 0)
         page_end = input_data.get("page_end", None)
+        max_pages = input_data.get("max_pages") or settings.PDF_MAX_PAGES_PER_CALL
 
-        safe_path = os.path.abspath(os.path.join(WORKSPACE_DIR, filename))
-        if not safe_path.startswith(WORKSPACE_DIR):
+        safe_path = resolve_in_workspace(filename)
+        if safe_path is None:
              return {"status": "error", "output": "Access denied: Path outside workspace."}
-             
+
         if not os.path.exists(safe_path):
             return {"status": "error", "output": f"File {filename} not found in workspace."}
-            
+
         try:
-            # CPU-bound blocking call, run in executor
-            loop = asyncio.get_event_loop()
-            text = await loop.run_in_executor(None, self._extract_text, safe_path, page_start, page_end)
-            return {"status": "success", "content": text}
+            text, start, end, total_pages = await self._extract_text(safe_path, page_start, page_end, max_pages)
         except Exception as e:
             return {"status": "error", "output": f"Failed to read PDF: {str(e)}"}
 
-    def _extract_text(self, path, start, end):
-        reader = PdfReader(path)
-        text = ""
-        total_pages = len(reader.pages)
-        
+        result = {
+            "status": "success",
+            "content": text,
+            "page_start": start,
+            "page_end": end,
+            "total_pages": total_pages
+        }
+        requested_end = total_pages if page_end is None else min(page_end, total_pages)
+        if end < requested_end:
+            result["next_page_start"] = end
+        return result
+
+    async def _extract_text(self, path: str, start: int, end: Optional[int], max_pages: int) -> Tuple[str, int, int, int]:
+        """
+        Returns (text, start, end, total_pages) for the requested window.
+        Pages come from the on-disk cache when available; missing pages are extracted
+        in parallel page ranges across the process pool and written back to the cache,
+        which is then trimmed to PDF_CACHE_MAX_BYTES.
+        """
+        loop = asyncio.get_event_loop()
+
+        # CPU/IO-bound blocking calls, run in executor
+        # Keyed by content: per-session workspace copies of a PDF share one entry
+        content_hash = await loop.run_in_executor(None, _content_hash, path)
+        cache_dir = os.path.join(settings.PDF_CACHE_DIR, content_hash)
+        total_pages = await loop.run_in_executor(None, _load_page_count, path, cache_dir)
+
         # Validate range
         if start < 0: start = 0
         if end is None or end > total_pages: end = total_pages
-        
+        if max_pages and end - start > max_pages: end = start + max_pages
+
+        pages = await loop.run_in_executor(None, _read_cached_pages, cache_dir, start, end)
+        missing = [i for i in range(start, end) if i not in pages]
+
+        if missing:
+            ranges = _split_ranges(missing, settings.PDF_PAGES_PER_TASK)
+            # Small requests are not worth the inter-process hop
+            executor = _get_process_pool() if len(ranges) > 1 else None
+            results = await asyncio.gather(*[
+                loop.run_in_executor(executor, _extract_page_range, path, a, b) for a, b in ranges
+            ])
+            extracted = {i: page_text for chunk in results for i, page_text in chunk}
+            pages.update(extracted)
+            await loop.run_in_executor(None, _write_cached_pages, cache_dir, extracted)
+            await loop.run_in_executor(None, _evict_cache, settings.PDF_CACHE_DIR, settings.PDF_CACHE_MAX_BYTES, cache_dir)
+
+        parts = []
         for i in range(start, end):
-            page = reader.pages[i]
-            extracted = page.extract_text()
-            if extracted:
-                text += f"\n--- Page {i+1} ---\n{extracted}"
-        
-        return text
+            if pages.get(i):
+                parts.append(f"\n--- Page {i+1} ---\n{pages[i]}")
+
+        return "".join(parts), start, end, total_pages
+
+# --- Worker / Executor Helpers (module level so they pickle into the process pool) ---
+
+def _extract_page_range(path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    reader = PdfReader(path)
+    return [(i, reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _content_hash(path: str) -> str:
+    """SHA-256 of the file, memoised by (path, mtime, size) so repeat reads only stat it."""
+    fingerprint = file_fingerprint(path)
+    if fingerprint is None:
+        raise FileNotFoundError(path)
+    with _content_hashes_lock:
+        cached = _content_hashes.get(fingerprint)
+        if cached is not None:
+            _content_hashes.move_to_end(fingerprint)
+            return cached
+    content_hash = _hash_file(path)
+    with _content_hashes_lock:
+        _content_hashes[fingerprint] = content_hash
+        while len(_content_hashes) > 1024:
+            _content_hashes.popitem(last=False)
+    return content_hash
+
+def _load_page_count(path: str, cache_dir: str) -> int:
+    meta_path = os.path.join(cache_dir, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, "r") as f:
+            return json.load(f)["total_pages"]
+
+    total_pages = len(PdfReader(path).pages)
+    os.makedirs(cache_dir, exist_ok=True)
+    _atomic_write(meta_path, json.dumps({"total_pages": total_pages}))
+    return total_pages
+
+def _read_cached_pages(cache_dir: str, start: int, end: int) -> Dict[int, str]:
+    # Directory mtime marks the document as recently read, for eviction
+    os.utime(cache_dir)
+    pages = {}
+    for i in range(start, end):
+        page_path = os.path.join(cache_dir, f"{i}.txt")
+        if os.path.exists(page_path):
+            with open(page_path, "r", encoding="utf-8") as f:
+                pages[i] = f.read()
+    return pages
+
+def _write_cached_pages(cache_dir: str, pages: Dict[int, str]):
+    os.makedirs(cache_dir, exist_ok=True)
+    for i, page_text in pages.items():
+        _atomic_write(os.path.join(cache_dir, f"{i}.txt"), page_text)
+
+def _evict_cache(root: str, max_bytes: int, keep: str):
+    """Removes least recently read documents until the cache fits max_bytes (keep is never removed)."""
+    entries = []
+    total = 0
+    for entry in os.scandir(root):
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        size = 0
+        for f in os.scandir(entry.path):
+            try:
+                size += f.stat().st_size
+            except OSError:
+                pass
+        total += size
+        entries.append((entry.stat().st_mtime, entry.path, size))
+    for _, path, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+def _atomic_write(path: str, data: str):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _split_ranges(indices: List[int], max_len: int) -> List[Tuple[int, int]]:
+    """Groups sorted page indices into contiguous [start, end) ranges of at most max_len pages."""
+    ranges = []
+    for i in indices:
+        if ranges and ranges[-1][1] == i and ranges[-1][1] - ranges[-1][0] < max_len:
+            ranges[-1][1] = i + 1
+        else:
+            ranges.append([i, i + 1])
+    return [(a, b) for a, b in ranges]
@@ -1,8 +1,9 @@
-import sys
-import io
 import asyncio
 from typing import Dict, Any
+from novalm.config.settings import settings
 from novalm.core.tools.base import Tool
+from novalm.core.sandbox import get_sandbox_pool
+from novalm.core.workspace import get_workspace_dir, check_quota, invalidate_usage
 
 class PythonExecTool(Tool):
     name = "python_exec"
@@ -18,40 +19,24 @@ class PythonExecTool(Tool):
         "required": ["code"]
     }
 
+    @property
+    def max_concurrency(self) -> int:
+        # Queue in the scheduler (visible in metrics) rather than inside the sandbox pool
+        return settings.SANDBOX_WORKERS
+
     async def run(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         code = input_data.get("code", "")
         if not code:
             return {"status": "error", "output": "No code provided."}
 
-        # Capture stdout/stderr
-        old_stdout = sys.stdout
-        old_stderr = sys.stderr
-        redirected_output = io.StringIO()
-        redirected_error = io.StringIO()
-        
-        sys.stdout = redirected_output
-        sys.stderr = redirected_error
-        
+        # Files the code writes land in the session workspace; refuse once it is over quota
+        quota_error = await asyncio.to_thread(check_quota)
+        if quota_error:
+            return {"status": "error", "output": quota_error}
+
+        # Runs in a separate worker process with CPU/memory/time limits and no network,
+        # so snippets neither block the event loop nor share stdout with each other.
         try:
-            # Run in a separate thread/executor to avoid blocking the async loop
-            # But exec is tricky with async. For MVP, we run sync or use run_in_executor if needed.
-            # exec() runs in the current context global/local. 
-            # We should give it a restricted scope.
-            local_scope = {}
-            exec(code, {}, local_scope)
-            result = "Executed successfully."
-        except Exception as e:
-            result = f"Error: {e}"
+            return await get_sandbox_pool().run(code, cwd=get_workspace_dir())
         finally:
-            sys.stdout = old_stdout
-            sys.stderr = old_stderr
-            
-        stdout = redirected_output.getvalue()
-        stderr = redirected_error.getvalue()
-        
-        return {
-            "status": "success" if not stderr and "Error" not in result else "error", 
-            "stdout": stdout,
-            "stderr": stderr,
-            "result_summary": result
-        }
+            invalidate_usage()
@@ -0,0 +1,76 @@
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from novalm.config.settings import settings
+from novalm.core.tools.base import Tool
+from novalm.core.metrics import TOOL_CACHE_LOOKUPS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+class ToolResultCache:
+    """
+    In-process LRU cache for deterministic tool results.
+    Key = Hash(Tool Name + Normalized Input + Content Fingerprint).
+    Evicts least recently used entries beyond the entry or byte budget.
+    """
+    def __init__(self, max_entries: int = None, max_bytes: int = None):
+        self.max_entries = max_entries or settings.TOOL_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes or settings.TOOL_CACHE_MAX_BYTES
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._bytes = 0
+
+    def _generate_key(self, tool: Tool, input_data: Dict[str, Any]) -> Optional[str]:
+        if not tool.cacheable:
+            return None
+        fingerprint = tool.cache_fingerprint(input_data)
+        if fingerprint is None:
+            return None
+        # Normalize: drop unset args, stable key order
+        normalized = {k: v for k, v in input_data.items() if v is not None}
+        try:
+            input_str = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+        except TypeError:
+            return None
+        key_str = "|".join([tool.name, input_str, fingerprint])
+        return hashlib.sha256(key_str.encode()).hexdigest()
+
+    def get(self, tool: Tool, input_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = self._generate_key(tool, input_data)
+        if key is None:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is None:
+            TOOL_CACHE_LOOKUPS_TOTAL.labels(tool=tool.name, result="miss").inc()
+            return None
+
+        self._entries.move_to_end(key)
+        TOOL_CACHE_LOOKUPS_TOTAL.labels(tool=tool.name, result="hit").inc()
+        return dict(entry[0])
+
+    def set(self, tool: Tool, input_data: Dict[str, Any], output: Dict[str, Any]):
+        # Never cache failures; the next attempt may succeed.
+        if not isinstance(output, dict) or output.get("status") == "error" or "error" in output:
+            return
+        key = self._generate_key(tool, input_data)
+        if key is None:
+            return
+
+        size = len(json.dumps(output, default=str))
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (dict(output), size)
+        self._bytes += size
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
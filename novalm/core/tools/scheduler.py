@@ -0,0 +1,103 @@
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+from typing import Dict, Any, Optional, List, Tuple
+from novalm.config.settings import settings
+from novalm.core.tools.base import Tool
+from novalm.core.metrics import TOOL_QUEUE_WAIT_SECONDS, TOOL_RUN_SECONDS, TOOL_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_AGENT = 1
+
+class ToolScheduler:
+    """
+    Admission control for tool calls, in front of the shared tool singletons.
+    - Global limit on concurrently running tools, plus per-tool limits
+      (Tool.max_concurrency, overridable via settings.TOOL_CONCURRENCY_LIMITS).
+    - Waiting calls are ordered by priority, then by how many calls their session already
+      has running (one busy agent cannot monopolize a tool), then FIFO.
+    """
+    def __init__(self, global_limit: int = None, per_tool_limits: Dict[str, int] = None):
+        self.global_limit = global_limit or settings.TOOL_MAX_CONCURRENCY
+        self.per_tool_limits = dict(settings.TOOL_CONCURRENCY_LIMITS if per_tool_limits is None else per_tool_limits)
+        self._running = 0
+        self._running_by_tool: Dict[str, int] = {}
+        self._running_by_session: Dict[str, int] = {}
+        # (priority, session_running, seq, tool_name, tool_limit, session_id, future)
+        self._waiters: List[Tuple[int, int, int, str, Optional[int], Optional[str], asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    def limit_for(self, tool: Tool) -> Optional[int]:
+        return self.per_tool_limits.get(tool.name, tool.max_concurrency)
+
+    async def run(self, tool: Tool, input_data: Dict[str, Any], session_id: str = None, priority: int = PRIORITY_INTERACTIVE) -> Dict[str, Any]:
+        enqueued = time.monotonic()
+        await self._acquire(tool, session_id, priority)
+        TOOL_QUEUE_WAIT_SECONDS.labels(tool=tool.name).observe(time.monotonic() - enqueued)
+
+        started = time.monotonic()
+        try:
+            return await tool.run(input_data)
+        finally:
+            TOOL_RUN_SECONDS.labels(tool=tool.name).observe(time.monotonic() - started)
+            self._release(tool.name, session_id)
+
+    def _can_start(self, tool_name: str, limit: Optional[int]) -> bool:
+        if self._running >= self.global_limit:
+            return False
+        return limit is None or self._running_by_tool.get(tool_name, 0) < limit
+
+    def _start(self, tool_name: str, session_id: Optional[str]):
+        self._running += 1
+        self._running_by_tool[tool_name] = self._running_by_tool.get(tool_name, 0) + 1
+        if session_id:
+            self._running_by_session[session_id] = self._running_by_session.get(session_id, 0) + 1
+
+    async def _acquire(self, tool: Tool, session_id: Optional[str], priority: int):
+        limit = self.limit_for(tool)
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, self._running_by_session.get(session_id, 0), next(self._seq), tool.name, limit, session_id, future)
+        heapq.heappush(self._waiters, entry)
+        TOOL_QUEUE_DEPTH.labels(tool=tool.name).inc()
+        # Grants immediately if a slot is free and nothing better is waiting for it
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just as we were cancelled; hand it on
+                self._release(tool.name, session_id)
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                TOOL_QUEUE_DEPTH.labels(tool=tool.name).dec()
+            raise
+
+    def _release(self, tool_name: str, session_id: Optional[str]):
+        self._running -= 1
+        self._running_by_tool[tool_name] -= 1
+        if session_id:
+            self._running_by_session[session_id] -= 1
+            if not self._running_by_session[session_id]:
+                del self._running_by_session[session_id]
+        self._wake()
+
+    def _wake(self):
+        """Grants free slots to the best waiters whose tool is under its limit."""
+        skipped = []
+        while self._waiters and self._running < self.global_limit:
+            entry = heapq.heappop(self._waiters)
+            _, _, _, tool_name, tool_limit, session_id, future = entry
+            if not self._can_start(tool_name, tool_limit):
+                skipped.append(entry)
+                continue
+            TOOL_QUEUE_DEPTH.labels(tool=tool_name).dec()
+            self._start(tool_name, session_id)
+            future.set_result(None)
+        for entry in skipped:
+            heapq.heappush(self._waiters, entry)
@@ -1,9 +1,58 @@
+import os
+import signal
 import asyncio
 from typing import Dict, Any
+from novalm.config.settings import settings
 from novalm.core.tools.base import Tool
+from novalm.core.workspace import get_workspace_dir, check_quota, invalidate_usage
 
 WHITELISTED_COMMANDS = ["ls", "grep", "cat", "git status", "echo"]
 
+class _HeadTailBuffer:
+    """Keeps the first head_bytes and last tail_bytes of a stream; the middle is counted, not stored."""
+    def __init__(self, head_bytes: int, tail_bytes: int):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, chunk: bytes):
+        self.total += len(chunk)
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if chunk and self.tail_bytes:
+            self.tail += chunk
+            if len(self.tail) > self.tail_bytes:
+                del self.tail[:len(self.tail) - self.tail_bytes]
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > len(self.head) + len(self.tail)
+
+    def text(self) -> str:
+        head = self.head.decode(errors="replace")
+        if not self.truncated:
+            return head + self.tail.decode(errors="replace")
+        dropped = self.total - len(self.head) - len(self.tail)
+        return f"{head}\n... [{dropped} bytes truncated] ...\n{self.tail.decode(errors='replace')}"
+
+async def _pump(stream: asyncio.StreamReader, buffer: _HeadTailBuffer):
+    while True:
+        chunk = await stream.read(64 * 1024)
+        if not chunk:
+            return
+        buffer.write(chunk)
+
+def _kill_group(proc):
+    """Kills the command and everything it spawned (it runs in its own session)."""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
 class ShellTool(Tool):
     name = "shell_tool"
     description = f"Execute shell commands. Allowed: {', '.join(WHITELISTED_COMMANDS)}"
@@ -15,24 +64,66 @@ class ShellTool(Tool):
         "required": ["command"]
     }
 
+    @property
+    def max_concurrency(self) -> int:
+        return settings.SHELL_MAX_CONCURRENCY
+
     async def run(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         command = input_data.get("command", "")
-        
+
         # Simple whitelist check (naive, splitting by space)
         cmd_base = command.split()[0] if command else ""
         if cmd_base not in WHITELISTED_COMMANDS:
              return {"status": "error", "output": f"Command '{cmd_base}' is not allowed."}
-        
+
+        # Commands write in the session workspace (e.g. `echo x > f`); refuse once it is over quota
+        quota_error = await asyncio.to_thread(check_quota)
+        if quota_error:
+            return {"status": "error", "output": quota_error}
+
+        try:
+            return await self._run_command(command)
+        finally:
+            invalidate_usage()
+
+    async def _run_command(self, command: str) -> Dict[str, Any]:
+        # Output is streamed into bounded buffers, so a huge `cat` never sits in memory whole
+        stdout = _HeadTailBuffer(settings.SHELL_OUTPUT_HEAD_BYTES, settings.SHELL_OUTPUT_TAIL_BYTES)
+        stderr = _HeadTailBuffer(settings.SHELL_OUTPUT_HEAD_BYTES, settings.SHELL_OUTPUT_TAIL_BYTES)
+
+        cwd = get_workspace_dir()
         proc = await asyncio.create_subprocess_shell(
             command,
             stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd if os.path.isdir(cwd) else None,
+            start_new_session=True
         )
-        stdout, stderr = await proc.communicate()
-        
-        return {
-            "status": "success" if proc.returncode == 0 else "error",
-            "stdout": stdout.decode(),
-            "stderr": stderr.decode(),
-            "returncode": proc.returncode
+        tasks = [
+            asyncio.ensure_future(_pump(proc.stdout, stdout)),
+            asyncio.ensure_future(_pump(proc.stderr, stderr)),
+            asyncio.ensure_future(proc.wait())
+        ]
+        timed_out = True
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=settings.SHELL_TIMEOUT)
+            timed_out = bool(pending)
+        finally:
+            # Deadline passed or the caller was cancelled
+            if timed_out:
+                _kill_group(proc)
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await proc.wait()
+
+        result = {
+            "status": "success" if proc.returncode == 0 and not timed_out else "error",
+            "stdout": stdout.text(),
+            "stderr": stderr.text(),
+            "returncode": proc.returncode,
+            "truncated": stdout.truncated or stderr.truncated
         }
+        if timed_out:
+            result["stderr"] += f"\nCommand killed after {settings.SHELL_TIMEOUT}s timeout."
+        return result
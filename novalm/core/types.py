@@ -38,6 +38,9 @@ class ChatCompletionRequest(BaseModel):
     # Evaluation / Self-Correction
     test_code: Optional[str] = None # Code to run to verify the answer
     
+    # Scheduling class; defaults to "interactive" for chat and "agent" for autonomous/research loops
+    qos: Optional[Literal["interactive", "agent", "batch"]] = None
+    
     # Allow extra fields for flexibility but validate the core ones
     class Config:
         extra = "allow" 
@@ -0,0 +1,565 @@
+import os
+import json
+import heapq
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Iterable
+from novalm.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Small logs are never worth rewriting
+_LOG_COMPACT_MIN_ENTRIES = 1024
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+class NumpyVectorClient:
+    """
+    In-process vector store backed by memory-mapped NumPy arrays.
+    Drop-in for the subset of chromadb.PersistentClient used by AdvancedMemory.
+
+    Layout per collection (<path>/<name>/):
+    - vectors.f32: float32 memmap (capacity x dim)
+    - graph.i32:   int32 memmap (capacity x M) neighbor lists of the approximate index
+    - records.jsonl: append-only log of ids/documents/metadatas, replayed on open; rewritten as
+      one put per live record once it passes VECTOR_LOG_COMPACT_RATIO entries per record
+    - header.json: dim, capacity, distance space, graph state
+
+    read_only=True opens the arrays with mode 'r', so several replicas can share one snapshot.
+    """
+    def __init__(self, path: str, read_only: bool = False):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("numpy is not installed. Cannot use the numpy memory backend.")
+        self.path = path
+        self.read_only = read_only
+        self._collections: Dict[str, "NumpyVectorCollection"] = {}
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+
+    def get_or_create_collection(self, name: str, embedding_function=None, metadata: Optional[Dict[str, Any]] = None) -> "NumpyVectorCollection":
+        if name not in self._collections:
+            self._collections[name] = NumpyVectorCollection(
+                os.path.join(self.path, name), name, embedding_function, metadata, self.read_only
+            )
+        return self._collections[name]
+
+class NumpyVectorCollection:
+    """
+    One collection. Chroma-compatible add/upsert/update/get/query/delete/count.
+    Search is vectorized brute force below VECTOR_INDEX_GRAPH_THRESHOLD rows and a navigable
+    small-world graph (greedy beam search) above it. The graph is built in the background once
+    a collection crosses the threshold and then maintained incrementally.
+    """
+    def __init__(self, path: str, name: str, embedding_function, metadata: Optional[Dict[str, Any]], read_only: bool):
+        self.name = name
+        self.dir = path
+        self.read_only = read_only
+        self._ef = embedding_function
+        self._lock = threading.RLock()
+
+        self.ids: List[str] = []
+        self.documents: List[Optional[str]] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}
+        # Entries in records.jsonl (live records plus superseded puts and deletes)
+        self._log_entries = 0
+
+        self._vectors = None
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._graph = None
+        self._graph_ready = False
+        self._graph_building = False
+        self._graph_aborted = False
+
+        self.graph_threshold = settings.VECTOR_INDEX_GRAPH_THRESHOLD
+        self.graph_m = settings.VECTOR_INDEX_GRAPH_NEIGHBORS
+        self.ef_search = settings.VECTOR_INDEX_EF_SEARCH
+
+        header = self._load_header()
+        self.dim: Optional[int] = header.get("dim")
+        self.capacity: int = header.get("capacity", 0)
+        self.space: str = header.get("space") or (metadata or {}).get("hnsw:space", "l2")
+
+        self._replay_log()
+        if not read_only:
+            self._maybe_compact_log()
+        if self.dim:
+            self._open_arrays()
+            if header.get("graph") and os.path.exists(self._path("graph.i32")):
+                self._graph_ready = True
+        self._maybe_build_graph()
+
+    # --- Persistence ---
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.dir, filename)
+
+    def _load_header(self) -> Dict[str, Any]:
+        if os.path.exists(self._path("header.json")):
+            with open(self._path("header.json"), "r") as f:
+                return json.load(f)
+        return {}
+
+    def _save_header(self):
+        header = {
+            "dim": self.dim,
+            "capacity": self.capacity,
+            "space": self.space,
+            "count": len(self.ids),
+            "graph": self._graph_ready
+        }
+        tmp_path = self._path("header.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(header, f)
+        os.replace(tmp_path, self._path("header.json"))
+
+    def _replay_log(self):
+        log_path = self._path("records.jsonl")
+        if not os.path.exists(log_path):
+            return
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._log_entries += 1
+                if entry["op"] == "put":
+                    self._apply_put(entry["id"], entry.get("document"), entry.get("metadata") or {})
+                elif entry["op"] == "del":
+                    self._apply_delete(entry["id"])
+
+    def _append_log(self, entries: List[Dict[str, Any]]):
+        os.makedirs(self.dir, exist_ok=True)
+        with open(self._path("records.jsonl"), "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        self._log_entries += len(entries)
+        self._maybe_compact_log()
+
+    def _maybe_compact_log(self):
+        """
+        Rewrites the log as one put per live record, in row order (so replay reproduces the rows),
+        once superseded entries dominate it. Updates rewrite whole records, so without this the
+        log grows by a collection's size on every memory compaction.
+        """
+        live = len(self.ids)
+        if self._log_entries <= max(_LOG_COMPACT_MIN_ENTRIES, settings.VECTOR_LOG_COMPACT_RATIO * live):
+            return
+        tmp_path = self._path("records.jsonl.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for uid, document, metadata in zip(self.ids, self.documents, self.metadatas):
+                f.write(json.dumps({"op": "put", "id": uid, "document": document, "metadata": metadata}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path("records.jsonl"))
+        logger.info(f"Vector store ({self.name}): compacted record log from {self._log_entries} to {live} entries")
+        self._log_entries = live
+
+    def _open_arrays(self):
+        mode = "r" if self.read_only else "r+"
+        if self.capacity:
+            self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode=mode, shape=(self.capacity, self.dim))
+            if os.path.exists(self._path("graph.i32")):
+                self._graph = np.memmap(self._path("graph.i32"), dtype=np.int32, mode=mode, shape=(self.capacity, self.graph_m))
+        count = len(self.ids)
+        self._norms = np.linalg.norm(self._vectors[:count], axis=1) if count else np.zeros(0, dtype=np.float32)
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self.capacity:
+            return
+        new_capacity = max(needed, self.capacity * 2, 1024)
+        os.makedirs(self.dir, exist_ok=True)
+        for filename, width, itemsize in (("vectors.f32", self.dim, 4), ("graph.i32", self.graph_m, 4)):
+            if filename == "graph.i32" and self._graph is None:
+                continue
+            with open(self._path(filename), "ab") as f:
+                f.truncate(new_capacity * width * itemsize)
+        if self._graph is not None:
+            self._graph.flush()
+            self._graph = np.memmap(self._path("graph.i32"), dtype=np.int32, mode="r+", shape=(new_capacity, self.graph_m))
+            self._graph[self.capacity:] = -1
+        self.capacity = new_capacity
+        self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+
+    def _flush(self):
+        if self._vectors is not None:
+            self._vectors.flush()
+        if self._graph is not None:
+            self._graph.flush()
+        self._save_header()
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"Collection '{self.name}' is a read-only snapshot.")
+
+    # --- Record bookkeeping (row order must be reproducible by log replay) ---
+
+    def _apply_put(self, uid: str, document: Optional[str], metadata: Dict[str, Any]) -> int:
+        row = self._rows.get(uid)
+        if row is None:
+            row = len(self.ids)
+            self._rows[uid] = row
+            self.ids.append(uid)
+            self.documents.append(document)
+            self.metadatas.append(metadata)
+        else:
+            self.documents[row] = document
+            self.metadatas[row] = metadata
+        return row
+
+    def _apply_delete(self, uid: str) -> Optional[int]:
+        """Swap-deletes: the last row moves into the freed slot. Returns the freed row."""
+        row = self._rows.pop(uid, None)
+        if row is None:
+            return None
+        last = len(self.ids) - 1
+        if row != last:
+            moved = self.ids[last]
+            self.ids[row] = moved
+            self.documents[row] = self.documents[last]
+            self.metadatas[row] = self.metadatas[last]
+            self._rows[moved] = row
+        self.ids.pop()
+        self.documents.pop()
+        self.metadatas.pop()
+        return row
+
+    # --- Chroma-compatible API ---
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def add(self, ids: List[str], documents: Optional[List[str]] = None, metadatas: Optional[List[Dict[str, Any]]] = None, embeddings=None):
+        """Inserts new records. Existing IDs are skipped, as in Chroma."""
+        with self._lock:
+            keep = [i for i, uid in enumerate(ids) if uid not in self._rows]
+        if not keep:
+            return
+        self._write(
+            [ids[i] for i in keep],
+            [documents[i] for i in keep] if documents else None,
+            [metadatas[i] for i in keep] if metadatas else None,
+            [embeddings[i] for i in keep] if embeddings is not None else None
+        )
+
+    def upsert(self, ids: List[str], documents: Optional[List[str]] = None, metadatas: Optional[List[Dict[str, Any]]] = None, embeddings=None):
+        self._write(ids, documents, metadatas, embeddings)
+
+    def update(self, ids: List[str], documents: Optional[List[str]] = None, metadatas: Optional[List[Dict[str, Any]]] = None, embeddings=None):
+        """Updates existing records only. Omitted fields keep their current value."""
+        with self._lock:
+            present = [i for i, uid in enumerate(ids) if uid in self._rows]
+            if not present:
+                return
+            rows = [self._rows[ids[i]] for i in present]
+            new_docs = [documents[i] for i in present] if documents else [self.documents[r] for r in rows]
+            new_metas = [metadatas[i] for i in present] if metadatas else [self.metadatas[r] for r in rows]
+            if embeddings is not None:
+                new_embs = [embeddings[i] for i in present]
+            elif documents:
+                new_embs = None  # Re-embed changed documents
+            else:
+                new_embs = [self._vectors[r] for r in rows]
+        self._write([ids[i] for i in present], new_docs, new_metas, new_embs)
+
+    def _write(self, ids, documents, metadatas, embeddings):
+        self._check_writable()
+        if embeddings is None:
+            if not documents:
+                raise ValueError("documents or embeddings are required")
+            embeddings = self._ef(documents)
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [{} for _ in ids]
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimension {self.dim}")
+
+            self._ensure_capacity(len(self.ids) + len(ids))
+            log_entries = []
+            new_rows = []
+            for uid, document, metadata, vector in zip(ids, documents, metadatas, vectors):
+                is_new = uid not in self._rows
+                row = self._apply_put(uid, document, metadata)
+                self._vectors[row] = vector
+                if row == len(self._norms):
+                    self._norms = np.append(self._norms, np.float32(np.linalg.norm(vector)))
+                else:
+                    self._norms[row] = np.linalg.norm(vector)
+                if is_new:
+                    new_rows.append(row)
+                log_entries.append({"op": "put", "id": uid, "document": document, "metadata": metadata})
+
+            if self._graph_ready:
+                for row in new_rows:
+                    self._graph_insert(row)
+
+            self._append_log(log_entries)
+            self._flush()
+        self._maybe_build_graph()
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        self._check_writable()
+        with self._lock:
+            if where:
+                matched = set(uid for uid, meta in zip(self.ids, self.metadatas) if _match(meta, where))
+                ids = [uid for uid in (ids if ids is not None else list(matched)) if uid in matched]
+            log_entries = []
+            for uid in ids or []:
+                if uid not in self._rows:
+                    continue
+                last = len(self.ids) - 1
+                row = self._apply_delete(uid)
+                if row != last:
+                    self._vectors[row] = self._vectors[last]
+                    self._norms[row] = self._norms[last]
+                self._norms = self._norms[:last]
+                self._graph_remove(row, last)
+                log_entries.append({"op": "del", "id": uid})
+            if log_entries:
+                self._append_log(log_entries)
+                self._flush()
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        include: Iterable[str] = ("documents", "metadatas"),
+        offset: Optional[int] = None
+    ) -> Dict[str, Any]:
+        with self._lock:
+            if ids is not None:
+                rows = [self._rows[uid] for uid in ids if uid in self._rows]
+            else:
+                rows = list(range(len(self.ids)))
+            if where:
+                rows = [r for r in rows if _match(self.metadatas[r], where)]
+            if offset:
+                rows = rows[offset:]
+            if limit is not None:
+                rows = rows[:limit]
+            return self._result(rows, include)
+
+    def query(
+        self,
+        query_texts: Optional[List[str]] = None,
+        query_embeddings=None,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Iterable[str] = ("documents", "metadatas", "distances")
+    ) -> Dict[str, Any]:
+        if query_embeddings is None:
+            query_embeddings = self._ef(query_texts)
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+
+        out: Dict[str, Any] = {"ids": []}
+        for key in include:
+            out[key] = []
+        with self._lock:
+            for q in queries:
+                rows, dists = self._search(q, n_results, where)
+                res = self._result(rows, include)
+                out["ids"].append(res["ids"])
+                for key in include:
+                    if key == "distances":
+                        out[key].append([float(d) for d in dists])
+                    else:
+                        out[key].append(res[key])
+        return out
+
+    def _result(self, rows: List[int], include: Iterable[str]) -> Dict[str, Any]:
+        res: Dict[str, Any] = {"ids": [self.ids[r] for r in rows]}
+        if "documents" in include:
+            res["documents"] = [self.documents[r] for r in rows]
+        if "metadatas" in include:
+            res["metadatas"] = [self.metadatas[r] for r in rows]
+        if "embeddings" in include:
+            res["embeddings"] = [self._vectors[r].tolist() for r in rows]
+        return res
+
+    # --- Search ---
+
+    def _distances(self, q, rows=None):
+        count = len(self.ids)
+        vectors = self._vectors[:count] if rows is None else self._vectors[rows]
+        norms = self._norms[:count] if rows is None else self._norms[rows]
+        dots = vectors @ q
+        if self.space == "cosine":
+            return 1.0 - dots / (norms * np.linalg.norm(q) + 1e-12)
+        if self.space == "ip":
+            return 1.0 - dots
+        # Squared L2 (Chroma's default)
+        return norms ** 2 + float(q @ q) - 2.0 * dots
+
+    def _search(self, q, n: int, where: Optional[Dict[str, Any]]):
+        count = len(self.ids)
+        if count == 0 or n <= 0:
+            return [], []
+
+        if where:
+            candidates = np.array([r for r in range(count) if _match(self.metadatas[r], where)], dtype=np.int64)
+            if len(candidates) == 0:
+                return [], []
+            dists = self._distances(q, candidates)
+            return _top_k(candidates, dists, n)
+
+        if self._graph_ready and count >= self.graph_threshold:
+            return self._graph_search(q, n, max(self.ef_search, n))
+
+        dists = self._distances(q)
+        return _top_k(np.arange(count), dists, n)
+
+    # --- Approximate Graph Index (navigable small world) ---
+
+    def _maybe_build_graph(self):
+        with self._lock:
+            if (self.read_only or self._graph_ready or self._graph_building
+                    or len(self.ids) < self.graph_threshold):
+                return
+            self._graph_building = True
+            self._graph_aborted = False
+        threading.Thread(target=self._build_graph, name=f"novalm-graph-{self.name}", daemon=True).start()
+
+    def _build_graph(self):
+        """Inserts rows in small locked chunks so queries (brute force meanwhile) are not starved."""
+        try:
+            with self._lock:
+                with open(self._path("graph.i32"), "wb") as f:
+                    f.truncate(self.capacity * self.graph_m * 4)
+                self._graph = np.memmap(self._path("graph.i32"), dtype=np.int32, mode="r+", shape=(self.capacity, self.graph_m))
+                self._graph[:] = -1
+            built = 0
+            while True:
+                with self._lock:
+                    if self._graph_aborted:
+                        self._graph = None
+                        return
+                    if built >= len(self.ids):
+                        self._graph_ready = True
+                        self._flush()
+                        logger.info(f"Vector index for '{self.name}' built over {built} rows")
+                        return
+                    end = min(built + 256, len(self.ids))
+                    for row in range(built, end):
+                        self._graph_insert(row)
+                    built = end
+        except Exception as e:
+            logger.error(f"Vector index build for '{self.name}' failed: {e}")
+            self._graph = None
+        finally:
+            self._graph_building = False
+
+    def _entry_points(self, limit: int) -> List[int]:
+        # Fixed, evenly spread entry rows keep search deterministic
+        step = max(limit // 4, 1)
+        return list(range(0, limit, step))[:4]
+
+    def _graph_search(self, q, n: int, ef: int, limit: Optional[int] = None):
+        limit = len(self.ids) if limit is None else limit
+        entries = self._entry_points(limit)
+        if not entries:
+            return [], []
+        entry_dists = self._distances(q, np.array(entries))
+        visited = set(entries)
+        candidates = [(float(d), r) for d, r in zip(entry_dists, entries)]
+        heapq.heapify(candidates)
+        best = [(-d, r) for d, r in candidates]  # Max-heap of the current ef nearest
+        heapq.heapify(best)
+
+        while candidates:
+            dist, row = heapq.heappop(candidates)
+            if len(best) >= ef and dist > -best[0][0]:
+                break
+            neighbors = [int(r) for r in self._graph[row] if 0 <= r < limit and int(r) not in visited]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            for d, r in zip(self._distances(q, np.array(neighbors)), neighbors):
+                d = float(d)
+                if len(best) < ef or d < -best[0][0]:
+                    heapq.heappush(candidates, (d, r))
+                    heapq.heappush(best, (-d, r))
+                    if len(best) > ef:
+                        heapq.heappop(best)
+
+        ranked = sorted((-d, r) for d, r in best)[:n]
+        return [r for _, r in ranked], [d for d, _ in ranked]
+
+    def _graph_insert(self, row: int):
+        self._graph[row] = -1
+        if row == 0:
+            return
+        q = self._vectors[row]
+        nearest, _ = self._graph_search(q, self.graph_m, max(self.ef_search, self.graph_m), limit=row)
+        self._graph[row, :len(nearest)] = nearest
+        for neighbor in nearest:
+            links = self._graph[neighbor]
+            free = np.where(links < 0)[0]
+            if len(free):
+                links[free[0]] = row
+                continue
+            # Full: replace the farthest link if the new row is closer
+            candidates = np.append(links, row)
+            dists = self._distances(self._vectors[neighbor], candidates)
+            keep = candidates[np.argsort(dists)[:self.graph_m]]
+            self._graph[neighbor] = keep
+
+    def _graph_remove(self, row: int, last: int):
+        """Patches neighbor lists after a swap-delete of `row` (row `last` moved into it)."""
+        if self._graph_building:
+            # Rebuild from scratch on the next write rather than patch a half-built graph
+            self._graph_aborted = True
+            return
+        if self._graph is None:
+            return
+        graph = self._graph[:last + 1]
+        graph[graph == row] = -1
+        if row != last:
+            graph[row] = graph[last]
+            graph[graph == last] = row
+        graph[last] = -1
+        if len(self.ids) < self.graph_threshold and self._graph_ready:
+            # Below threshold brute force is exact and cheap again
+            self._graph_ready = False
+
+def _top_k(rows, dists, n: int):
+    n = min(n, len(rows))
+    if n < len(rows):
+        part = np.argpartition(dists, n - 1)[:n]
+    else:
+        part = np.arange(len(rows))
+    order = part[np.argsort(dists[part])]
+    return [int(rows[i]) for i in order], [float(dists[i]) for i in order]
+
+def _match(meta: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """Evaluates the Chroma `where` subset used in NovaLM: equality, $eq/$ne/$gt/$gte/$lt/$lte/$in, $and/$or."""
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(_match(meta, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(_match(meta, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = meta.get(key)
+            for op, target in cond.items():
+                if op == "$eq" and value != target: return False
+                if op == "$ne" and value == target: return False
+                if op == "$in" and value not in target: return False
+                if op in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None: return False
+                    if op == "$gt" and not value > target: return False
+                    if op == "$gte" and not value >= target: return False
+                    if op == "$lt" and not value < target: return False
+                    if op == "$lte" and not value <= target: return False
+        elif meta.get(key) != cond:
+            return False
+    return True
@@ -0,0 +1,224 @@
+import os
+import uuid
+import stat
+import shutil
+import asyncio
+import logging
+import contextvars
+from typing import Optional, Dict
+from novalm.config.settings import settings
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Non-POSIX
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# ioctl request for a copy-on-write clone of a whole file (btrfs, XFS, overlay on those)
+FICLONE = 0x40049409
+
+# Full tool outputs spilled for paging (see ToolOutputShaper); not user data, so outside the quota
+SPILL_DIR = ".tool_outputs"
+
+# Workspace of the session being served by the current task; tools resolve paths against it
+_current_workspace: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("novalm_workspace", default=None)
+
+def get_workspace_dir() -> str:
+    """Absolute workspace directory for the current session (the shared base workspace outside sessions)."""
+    return _current_workspace.get() or os.path.abspath(settings.WORKSPACE_BASE_DIR)
+
+def set_workspace(path: Optional[str]) -> contextvars.Token:
+    return _current_workspace.set(path)
+
+def reset_workspace(token: contextvars.Token):
+    try:
+        _current_workspace.reset(token)
+    except ValueError:
+        # Generator finalized from a different context; nothing to restore there
+        pass
+
+def _is_within(path: str, root: str) -> bool:
+    return path == root or path.startswith(root + os.sep)
+
+def resolve_in_workspace(relative_path: str) -> Optional[str]:
+    """
+    Real path inside the current workspace, or None if it would escape it. Symlinks are
+    resolved before the check, so `link/file` is refused when `link` points outside.
+    """
+    root = os.path.realpath(get_workspace_dir())
+    path = os.path.realpath(os.path.join(root, relative_path))
+    if not _is_within(path, root):
+        return None
+    return path
+
+# Session workspace -> bytes cloned from the base when it was created
+_baselines: Dict[str, int] = {}
+# Session workspace -> bytes grown since the clone, kept current by file_tool writes.
+# Missing until measured, and dropped after sandboxed code or shell commands ran (their
+# writes can't be observed), so only the next quota check walks the tree.
+_usage: Dict[str, int] = {}
+
+def workspace_usage(root: str) -> int:
+    """Bytes held in regular files under root (reflinked clones count at their full size), spills excluded."""
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        if dirpath == root and SPILL_DIR in dirnames:
+            dirnames.remove(SPILL_DIR)
+        for name in filenames:
+            try:
+                st = os.lstat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                total += st.st_size
+    return total
+
+def session_usage(root: str) -> int:
+    """Bytes a session workspace has grown by since it was cloned from the base."""
+    return max(workspace_usage(root) - _baselines.get(root, 0), 0)
+
+def record_write(path: str, old_size: int, new_size: int):
+    """Accounts a file_tool write in the current session's usage, so quota checks needn't walk the tree."""
+    root = _current_workspace.get()
+    if root is None or root not in _usage or _is_within(path, os.path.realpath(os.path.join(root, SPILL_DIR))):
+        return
+    _usage[root] += new_size - old_size
+
+def invalidate_usage():
+    """Forces the next quota check of the current session to measure the tree again."""
+    root = _current_workspace.get()
+    if root is not None:
+        _usage.pop(root, None)
+
+def check_quota(extra_bytes: int = 0) -> Optional[str]:
+    """
+    Error message if writing extra_bytes would exceed the session quota, else None.
+    Writes made by sandboxed code and shell commands are counted as well, so tools
+    that run those check with extra_bytes=0 before starting and call invalidate_usage()
+    once they finish.
+    """
+    root = _current_workspace.get()
+    if root is None or not settings.WORKSPACE_QUOTA_BYTES:
+        return None
+    if root not in _usage:
+        _usage[root] = workspace_usage(root) - _baselines.get(root, 0)
+    used = max(_usage[root], 0)
+    if used + extra_bytes > settings.WORKSPACE_QUOTA_BYTES:
+        return f"Workspace quota exceeded ({used + extra_bytes} > {settings.WORKSPACE_QUOTA_BYTES} bytes)."
+    return None
+
+class WorkspaceManager:
+    """
+    Per-session workspaces cloned from a base snapshot. Files are reflinked (copy-on-write,
+    no data copied) where the filesystem supports it, otherwise copied. Sandboxed code and shell
+    commands write files in place, so a session never shares an inode with the base, and the
+    base tree is only ever read.
+    """
+    def __init__(self, base_dir: str = None, sessions_dir: str = None):
+        self.base_dir = os.path.abspath(base_dir or settings.WORKSPACE_BASE_DIR)
+        self.sessions_dir = os.path.abspath(sessions_dir or settings.WORKSPACE_SESSIONS_DIR)
+        self._methods: Dict[str, int] = {"reflink": 0, "copy": 0}
+        self._reflink_supported = FCNTL_AVAILABLE and self._probe_reflink()
+        if not self._reflink_supported:
+            logger.warning(
+                f"Filesystem of {self.sessions_dir} does not support reflinks; every session "
+                f"workspace will be a full copy of {self.base_dir}. Use btrfs or XFS for cheap clones."
+            )
+
+    def _probe_reflink(self) -> bool:
+        """Clones a scratch file once at startup, so a filesystem without reflinks is reported up front."""
+        try:
+            os.makedirs(self.sessions_dir, exist_ok=True)
+            src = os.path.join(self.sessions_dir, f".reflink-probe-{uuid.uuid4().hex[:8]}")
+            try:
+                with open(src, "wb") as f:
+                    f.write(b"probe")
+                with open(src, "rb") as fsrc, open(src + ".clone", "wb") as fdst:
+                    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return True
+            finally:
+                for path in (src, src + ".clone"):
+                    if os.path.exists(path):
+                        os.unlink(path)
+        except OSError:
+            return False
+
+    def path_for(self, session_id: str) -> str:
+        return os.path.join(self.sessions_dir, session_id)
+
+    async def create(self, session_id: str) -> str:
+        return await asyncio.to_thread(self._create, session_id)
+
+    def _create(self, session_id: str) -> str:
+        target = self.path_for(session_id)
+        os.makedirs(target, exist_ok=False)
+        _baselines[target] = 0
+        _usage[target] = 0
+        if not os.path.isdir(self.base_dir):
+            return target
+
+        for dirpath, dirnames, filenames in os.walk(self.base_dir):
+            if dirpath == self.base_dir and SPILL_DIR in dirnames:
+                # Spills of requests served in the shared workspace
+                dirnames.remove(SPILL_DIR)
+            rel = os.path.relpath(dirpath, self.base_dir)
+            dest_dir = target if rel == "." else os.path.join(target, rel)
+            for name in list(dirnames):
+                src = os.path.join(dirpath, name)
+                if os.path.islink(src):
+                    # os.walk doesn't descend into linked directories; the link itself is cloned
+                    dirnames.remove(name)
+                    self._clone_link(src, os.path.join(dest_dir, name), target)
+                else:
+                    os.makedirs(os.path.join(dest_dir, name), exist_ok=True)
+            for name in filenames:
+                src = os.path.join(dirpath, name)
+                dst = os.path.join(dest_dir, name)
+                if os.path.islink(src):
+                    self._clone_link(src, dst, target)
+                    continue
+                self._clone(src, dst)
+                _baselines[target] += os.path.getsize(dst)
+        logger.debug(f"Workspace {session_id} created ({self._methods})")
+        return target
+
+    def _clone_link(self, src: str, dst: str, target: str):
+        """
+        Recreates a symlink from the base as a relative link within the session. Links that
+        resolve outside the base are dropped: copied verbatim, `../x` would reach
+        WORKSPACE_SESSIONS_DIR/x, i.e. possibly another session's workspace.
+        """
+        base = os.path.realpath(self.base_dir)
+        resolved = os.path.realpath(src)
+        if not _is_within(resolved, base):
+            logger.warning(f"Skipping symlink {src}: it points outside the base workspace")
+            return
+        dest = os.path.join(target, os.path.relpath(resolved, base))
+        os.symlink(os.path.relpath(dest, os.path.dirname(dst)), dst)
+
+    def _clone(self, src: str, dst: str):
+        if self._reflink_supported:
+            try:
+                with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                self._methods["reflink"] += 1
+                return
+            except OSError:
+                # Filesystem without reflinks; don't retry for every file
+                self._reflink_supported = False
+                os.unlink(dst)
+        shutil.copy2(src, dst)
+        self._methods["copy"] += 1
+
+    async def teardown(self, session_id: str):
+        """Renames the workspace out of the way (instant), then deletes it in a worker thread."""
+        path = self.path_for(session_id)
+        _baselines.pop(path, None)
+        _usage.pop(path, None)
+        if not os.path.isdir(path):
+            return
+        trash = os.path.join(self.sessions_dir, f".trash-{session_id}-{uuid.uuid4().hex[:8]}")
+        os.rename(path, trash)
+        await asyncio.to_thread(shutil.rmtree, trash, True)
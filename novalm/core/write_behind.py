@@ -0,0 +1,132 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any, List, Optional, Set, Tuple
+from novalm.config.settings import settings
+from novalm.core.metrics import MEMORY_WRITE_QUEUE_DEPTH, MEMORY_WRITE_LAG_SECONDS, MEMORY_WRITES_TOTAL
+
+logger = logging.getLogger(__name__)
+
+class MemoryWriteQueue:
+    """
+    Write-behind buffer for memory writes issued from request paths.
+    submit() returns immediately; a background task flushes batches periodically
+    (semantic writes share one embedding call) and close() drains the rest on shutdown.
+    """
+    def __init__(self, memory, flush_interval: float = None, batch_size: int = None, max_size: int = None):
+        self.memory = memory
+        self.flush_interval = settings.MEMORY_WRITE_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.batch_size = batch_size or settings.MEMORY_WRITE_BATCH_SIZE
+        self.max_size = max_size or settings.MEMORY_WRITE_QUEUE_MAX
+
+        # (tier, kwargs, enqueued_at)
+        self._pending: "deque[Tuple[str, Dict[str, Any], float]]" = deque()
+        # Lazy: created inside the running loop
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        # Write-through tasks for writes submitted after close (referenced so they are not garbage collected)
+        self._late: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add_episodic(self, task: str, solution: str, outcome: str, feedback: str = ""):
+        self._submit("episodic", {"task": task, "solution": solution, "outcome": outcome, "feedback": feedback})
+
+    def add_semantic(self, content: str, source: str = "manual"):
+        self._submit("semantic", {"content": content, "source": source})
+
+    def add_procedural(self, trigger: str, routine: str):
+        self._submit("procedural", {"trigger": trigger, "routine": routine})
+
+    def _submit(self, tier: str, kwargs: Dict[str, Any]):
+        if self._closed:
+            # Shutting down: nothing will flush the queue any more, write through (off the event loop)
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._write(tier, [kwargs])
+                return
+            task = loop.create_task(asyncio.to_thread(self._write, tier, [kwargs]))
+            self._late.add(task)
+            task.add_done_callback(self._late.discard)
+            return
+        if len(self._pending) >= self.max_size:
+            dropped, _, _ = self._pending.popleft()
+            MEMORY_WRITES_TOTAL.labels(tier=dropped, result="dropped").inc()
+            logger.warning(f"Memory write queue full ({self.max_size}); dropped oldest {dropped} write")
+
+        self._pending.append((tier, kwargs, time.monotonic()))
+        MEMORY_WRITE_QUEUE_DEPTH.set(len(self._pending))
+        self._ensure_started()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Writes everything queued so far, in batches."""
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            MEMORY_WRITE_QUEUE_DEPTH.set(len(self._pending))
+            # Embedding and disk writes are blocking; keep them off the event loop
+            await asyncio.to_thread(self._write_batch, batch)
+
+    def _write_batch(self, batch: List[Tuple[str, Dict[str, Any], float]]):
+        by_tier: Dict[str, List[Dict[str, Any]]] = {}
+        for tier, kwargs, _ in batch:
+            by_tier.setdefault(tier, []).append(kwargs)
+        for tier, items in by_tier.items():
+            self._write(tier, items)
+
+        now = time.monotonic()
+        for _, _, enqueued_at in batch:
+            MEMORY_WRITE_LAG_SECONDS.observe(now - enqueued_at)
+
+    def _write(self, tier: str, items: List[Dict[str, Any]]):
+        try:
+            if tier == "semantic":
+                by_source: Dict[str, List[str]] = {}
+                for item in items:
+                    by_source.setdefault(item["source"], []).append(item["content"])
+                for source, contents in by_source.items():
+                    # Same semantics as add_semantic(): re-adding a fact refreshes it
+                    self.memory.add_semantic_batch(contents, source=source, upsert=True)
+            elif tier == "episodic":
+                for item in items:
+                    self.memory.add_episodic(**item)
+            else:
+                for item in items:
+                    self.memory.add_procedural(**item)
+            MEMORY_WRITES_TOTAL.labels(tier=tier, result="written").inc(len(items))
+        except Exception as e:
+            MEMORY_WRITES_TOTAL.labels(tier=tier, result="failed").inc(len(items))
+            logger.error(f"Memory write-behind flush failed for {len(items)} {tier} writes: {e}")
+
+    async def close(self):
+        """
+        Stops the background flusher and drains pending writes. The flusher is woken rather than
+        cancelled: cancelling would abandon a batch still running in its worker thread, which
+        then races whatever shuts down next (the embedder).
+        """
+        self._closed = True
+        if self._task:
+            self._wakeup.set()
+            await self._task
+        await self.flush()
+        if self._late:
+            await asyncio.gather(*self._late, return_exceptions=True)
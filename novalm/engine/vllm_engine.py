@@ -4,7 +4,7 @@ import logging
 import time
 import uuid
 from typing import AsyncIterator, Optional
-from novalm.core.inference import InferenceEngine
+from novalm.core.inference import InferenceEngine, record_generated_tokens
 from novalm.core.types import SamplingParams
 from novalm.config.settings import settings
 from novalm.core.metrics import (
@@ -145,11 +145,19 @@ class VLLMInferenceEngine(InferenceEngine):
                 )
 
                 last_text = ""
+                last_tokens = 0
                 async for request_output in results_generator:
                     if not request_output.outputs:
                         continue
 
                     current_text = request_output.outputs[0].text
+                    current_tokens = len(request_output.outputs[0].token_ids)
+                    new_tokens = current_tokens - last_tokens
+                    last_tokens = current_tokens
+                    if new_tokens > 0:
+                        # Observability and rate limits both count what the GPU actually generated
+                        GENERATED_TOKENS_TOTAL.labels(model=settings.MODEL_PATH).inc(new_tokens)
+                        record_generated_tokens(new_tokens)
                     
                     # TTFT Logging
                     if not ttft_logged and current_text:
@@ -161,11 +169,6 @@ class VLLMInferenceEngine(InferenceEngine):
                     last_text = current_text
                     
                     if delta:
-                        # Observability: Count Tokens
-                        # (Approximate by chars or rely on vllm internal counts if accessible)
-                        # Here we rely on delta len for simplicity in streaming context
-                        # ideally we'd use output.token_ids change.
-                        GENERATED_TOKENS_TOTAL.labels(model=settings.MODEL_PATH).inc(len(delta) // 4 + 1)
                         yield delta
                     
         except asyncio.CancelledError:
@@ -198,6 +201,7 @@ class MockInferenceEngine(InferenceEngine):
         mock_response = " This is a mock response from NovaLM running on CPU. "
         for ch in mock_response:
              await asyncio.sleep(0.02) 
+             record_generated_tokens(1)
              yield ch
             
 _engine_instance = None
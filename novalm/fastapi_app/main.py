@@ -35,12 +35,47 @@ async def lifespan(app: FastAPI):
     # Inject into app state
     app.state.orchestrator = orchestrator
     
+    # 4. Background memory compaction (bounded retrieval latency)
+    compaction_task = None
+    if settings.MEMORY_COMPACTION_INTERVAL > 0:
+        import asyncio
+        from novalm.core.memory import compaction_loop
+        compaction_task = asyncio.create_task(
+            compaction_loop(orchestrator.memory, settings.MEMORY_COMPACTION_INTERVAL)
+        )
+    
+    # 5. Pre-start code execution sandbox workers
+    from novalm.core.sandbox import get_sandbox_pool, shutdown_sandbox_pool
+    get_sandbox_pool().start()
+    
+    # 6. Sweep abandoned WebSocket agent sessions
+    import asyncio
+    from novalm.core.sessions import get_session_registry, reap_loop
+    reaper_task = asyncio.create_task(reap_loop(get_session_registry(), settings.WS_SESSION_REAP_INTERVAL))
+    
     yield
     
     # Shutdown
     print("Shutting down NovaLM...")
+    reaper_task.cancel()
+    await get_session_registry().shutdown()
+    if compaction_task:
+        compaction_task.cancel()
+    # Persist buffered memory writes before the process exits
+    await orchestrator.memory_writer.close()
+    embedder = getattr(orchestrator.memory, "ef", None)
+    if embedder is not None:
+        embedder.shutdown()
     if hasattr(inference_engine, "shutdown"):
         await inference_engine.shutdown()
+    
+    from novalm.core.tools.pdf_reader import shutdown_pdf_pool
+    shutdown_pdf_pool()
+    # Joins worker processes; keep the loop serving the remaining shutdown steps
+    await asyncio.to_thread(shutdown_sandbox_pool)
+    
+    from novalm.fastapi_app.middleware.rate_limit import get_rate_limiter
+    await get_rate_limiter().close()
 
 app = FastAPI(
     title=settings.APP_NAME,
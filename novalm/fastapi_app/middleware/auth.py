@@ -1,29 +1,70 @@
-from fastapi import Request, HTTPException
-from fastapi.security import APIKeyHeader, HTTPBearer
-from starlette.middleware.base import BaseHTTPMiddleware
+import hmac
+from typing import Iterable, Optional, Tuple
+from starlette.types import ASGIApp, Scope, Receive, Send
+from fastapi.responses import JSONResponse
 from novalm.config.settings import settings
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Skip auth for health checks or docs if needed
-        if request.url.path in ["/health", "/docs", "/openapi.json"]:
-            return await call_next(request)
-            
-        api_key = request.headers.get("X-API-Key")
-        auth_header = request.headers.get("Authorization")
-        
-        token = None
-        if api_key:
-            token = api_key
-        elif auth_header and auth_header.startswith("Bearer "):
-            token = auth_header.split(" ")[1]
-            
-        if not token or token != settings.API_KEY:
-            # We return JSON response for 401
-            from fastapi.responses import JSONResponse
-            return JSONResponse(
-                status_code=401, 
-                content={"detail": "Invalid or missing API Key"}
-            )
-            
-        return await call_next(request)
+PUBLIC_PATHS = frozenset(["/health", "/docs", "/openapi.json"])
+
+# Browsers cannot set headers on WebSocket handshakes, so they send the key as a subprotocol:
+#   new WebSocket(url, ["novalm", "bearer." + apiKey])
+# Unlike a query parameter it never shows up in access logs. The server selects "novalm".
+WS_SUBPROTOCOL = "novalm"
+WS_BEARER_PREFIX = "bearer."
+
+class AuthMiddleware:
+    """
+    API key check as plain ASGI middleware (no BaseHTTPMiddleware task/queue wrapping of
+    streamed responses). Rejects before the body is read; accepted requests carry the key
+    in scope["state"]["api_key"] (request.state.api_key) for rate limiting downstream.
+    """
+    def __init__(self, app: ASGIApp, api_keys: Optional[Iterable[str]] = None):
+        self.app = app
+        keys = api_keys if api_keys is not None else [settings.API_KEY, *settings.EXTRA_API_KEYS]
+        # Encoded once; compared in constant time per request
+        self._keys: Tuple[bytes, ...] = tuple(k.encode("utf-8") for k in keys if k)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket") or scope["path"] in PUBLIC_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        token = _extract_token(scope)
+        if token is None or not self._is_valid(token):
+            if scope["type"] == "websocket":
+                # Closing before accept makes the server answer the handshake with 403
+                await send({"type": "websocket.close", "code": 1008})
+                return
+            response = JSONResponse(status_code=401, content={"detail": "Invalid or missing API Key"})
+            await response(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})["api_key"] = token.decode("utf-8", errors="replace")
+        if scope["type"] == "websocket":
+            # Keep the key out of anything downstream that echoes or logs subprotocols
+            scope["subprotocols"] = [p for p in scope.get("subprotocols", []) if not p.startswith(WS_BEARER_PREFIX)]
+        await self.app(scope, receive, send)
+
+    def _is_valid(self, token: bytes) -> bool:
+        # Compare against every key so timing does not reveal which one (or whether any) matched
+        matched = False
+        for key in self._keys:
+            matched |= hmac.compare_digest(token, key)
+        return matched
+
+def _extract_token(scope: Scope) -> Optional[bytes]:
+    api_key = authorization = None
+    for name, value in scope["headers"]:
+        if name == b"x-api-key":
+            api_key = value
+        elif name == b"authorization":
+            authorization = value
+    if api_key:
+        return api_key
+    if authorization and authorization.startswith(b"Bearer "):
+        return authorization[7:].strip()
+    if scope["type"] == "websocket":
+        for protocol in scope.get("subprotocols", []):
+            if protocol.startswith(WS_BEARER_PREFIX):
+                return protocol[len(WS_BEARER_PREFIX):].encode("utf-8")
+    return None
@@ -1,55 +1,210 @@
 import time
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+import asyncio
+import hashlib
+import logging
+from typing import Dict, Optional, Set, Tuple
+from starlette.types import ASGIApp, Scope, Receive, Send
 from fastapi.responses import JSONResponse
 from novalm.config.settings import settings
+from novalm.core.metrics import RATE_LIMIT_DECISIONS_TOTAL
 import redis.asyncio as redis
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
+logger = logging.getLogger(__name__)
+
+EXEMPT_PATHS = frozenset(["/health", "/docs", "/openapi.json", "/metrics"])
+
+# Two token buckets per client, refilled continuously from Redis server time:
+#   KEYS[1] requests bucket, KEYS[2] generated-tokens bucket (post-paid, may go negative)
+#   ARGV: requests capacity, tokens capacity, requested request count (0 = charge only),
+#         lease size, generated tokens to charge
+# Returns {granted requests, requests left, token budget left, retry after ms}
+TOKEN_BUCKET_LUA = """
+if redis.replicate_commands then redis.replicate_commands() end
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+local function refill(key, capacity)
+    if capacity <= 0 then return -1 end
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    return math.min(capacity, tokens + (now - ts) * capacity / 60000)
+end
+local function store(key, tokens)
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', key, 120000)
+end
+
+local req_cap = tonumber(ARGV[1])
+local tok_cap = tonumber(ARGV[2])
+local want = tonumber(ARGV[3])
+local lease = tonumber(ARGV[4])
+local charge = tonumber(ARGV[5])
+
+local budget = refill(KEYS[2], tok_cap)
+if tok_cap > 0 and charge > 0 then
+    budget = math.max(budget - charge, -tok_cap)
+    store(KEYS[2], budget)
+end
+if want == 0 then
+    return {0, -1, math.floor(budget), 0}
+end
+if tok_cap > 0 and budget <= 0 then
+    return {0, -1, math.floor(budget), math.ceil(-budget * 60000 / tok_cap) + 1}
+end
+
+local available = refill(KEYS[1], req_cap)
+if req_cap <= 0 then
+    return {lease, -1, math.floor(budget), 0}
+end
+local granted = 0
+if available >= 2 * lease then
+    granted = lease
+elseif available >= want then
+    granted = want
+end
+if granted == 0 then
+    return {0, math.floor(available), math.floor(budget), math.ceil((want - available) * 60000 / req_cap)}
+end
+store(KEYS[1], available - granted)
+return {granted, math.floor(available - granted), math.floor(budget), 0}
+"""
+
+def client_id_for(scope: Scope) -> str:
+    """Rate-limit identity: the API key (hashed, never stored in Redis) set by AuthMiddleware, else the client address."""
+    api_key = scope.get("state", {}).get("api_key")
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return "ip:" + (scope.get("client") or ("unknown",))[0]
+
+class RateLimiter:
     """
-    Redis-based Rate Limits.
-    Uses a simple fixed window counter with automated expiry.
+    Per-client token buckets for requests per minute and generated tokens per minute, kept in
+    Redis and updated by one atomic script call (EVALSHA) over a pooled connection.
+
+    Clients far below their request limit are granted a small lease of requests per round trip;
+    further requests within RATE_LIMIT_LEASE_TTL are admitted from the local lease without Redis.
+    Generated tokens are charged after completion, so the budget tracks actual GPU cost.
     """
-    def __init__(self, app, requests_per_minute: int = 60):
-        super().__init__(app)
-        self.rpm = requests_per_minute
+    def __init__(self, requests_per_minute: int = None, tokens_per_minute: int = None, lease: int = None):
+        self.rpm = settings.RATE_LIMIT_REQUESTS_PER_MINUTE if requests_per_minute is None else requests_per_minute
+        self.tpm = settings.RATE_LIMIT_TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute
+        self.lease = max(1, settings.RATE_LIMIT_LOCAL_LEASE if lease is None else lease)
+        # client_id -> (leased requests left, lease expiry)
+        self._leases: Dict[str, Tuple[int, float]] = {}
         self.redis = None
+        self._script = None
+        # Detached charges still in flight (referenced so they are not garbage collected)
+        self._charges: Set[asyncio.Task] = set()
+
+    def _connect(self):
+        if self.redis is None:
+            pool = redis.ConnectionPool.from_url(
+                settings.REDIS_URL, max_connections=settings.REDIS_MAX_CONNECTIONS, decode_responses=True
+            )
+            self.redis = redis.Redis(connection_pool=pool)
+            # register_script runs EVALSHA and loads the script once if Redis does not have it
+            self._script = self.redis.register_script(TOKEN_BUCKET_LUA)
+
+    async def _call(self, client_id: str, want: int, charge: int):
+        self._connect()
+        return await self._script(
+            keys=[f"rate_limit:{client_id}:req", f"rate_limit:{client_id}:tok"],
+            args=[self.rpm, self.tpm, want, self.lease, charge]
+        )
 
-    async def dispatch(self, request: Request, call_next):
-        if request.url.path in ["/health", "/docs", "/openapi.json", "/metrics"]:
-            return await call_next(request)
-
-        # Lazy init redis
-        if not self.redis:
-            self.redis = redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
-
-        client_id = request.client.host
-        # Use API key if available for more specific limits? 
-        # For now, IP-based.
-        
-        # Key: rate_limit:{ip}:{current_minute}
-        current_minute = int(time.time() // 60)
-        key = f"rate_limit:{client_id}:{current_minute}"
-        
+    async def acquire(self, client_id: str) -> Tuple[bool, float]:
+        """Returns (allowed, retry_after_seconds)."""
+        now = time.monotonic()
+        left, expires = self._leases.get(client_id, (0, 0.0))
+        if left > 0 and now < expires:
+            self._leases[client_id] = (left - 1, expires)
+            RATE_LIMIT_DECISIONS_TOTAL.labels(result="local").inc()
+            return True, 0.0
+
+        granted, _, _, retry_ms = await self._call(client_id, 1, 0)
+        if not granted:
+            self._leases.pop(client_id, None)
+            RATE_LIMIT_DECISIONS_TOTAL.labels(result="limited").inc()
+            return False, retry_ms / 1000
+        if granted > 1:
+            self._leases[client_id] = (granted - 1, now + settings.RATE_LIMIT_LEASE_TTL)
+        if len(self._leases) > 10000:
+            self._leases = {k: v for k, v in self._leases.items() if v[1] > now}
+        RATE_LIMIT_DECISIONS_TOTAL.labels(result="allowed").inc()
+        return True, 0.0
+
+    async def charge_tokens(self, client_id: str, tokens: int):
+        """Debits generated tokens after a completion; once the budget is spent, new requests are refused until it refills."""
+        if self.tpm <= 0 or tokens <= 0:
+            return
         try:
-            # Atomic increment
-            # async pipeline to optimize? 
-            # Simple INCR is fast enough.
-            current_count = await self.redis.incr(key)
-            
-            if current_count == 1:
-                # Set expiry if new key
-                await self.redis.expire(key, 60)
-                
-            if current_count > self.rpm:
-                return JSONResponse(
-                    status_code=429,
-                    content={"detail": "Rate limit exceeded"}
-                )
+            _, _, budget, _ = await self._call(client_id, 0, tokens)
         except Exception as e:
-            # If Redis fails, fail open or closed?
-            # Fail open for resilience usually preferable in MVP unless strict
-            print(f"Redis rate limit error: {e}")
-            pass
-            
-        return await call_next(request)
+            logger.warning(f"Redis token charge error: {e}")
+            return
+        if budget <= 0:
+            # Stop admitting from a local lease as well
+            self._leases.pop(client_id, None)
+
+    def charge_tokens_later(self, client_id: str, tokens: int) -> Optional[asyncio.Task]:
+        """
+        charge_tokens() in its own task, so it completes even when the caller is being cancelled
+        (a client disconnecting mid-stream cancels the response that would charge it).
+        """
+        if self.tpm <= 0 or tokens <= 0:
+            return None
+        task = asyncio.create_task(self.charge_tokens(client_id, tokens))
+        self._charges.add(task)
+        task.add_done_callback(self._charges.discard)
+        return task
+
+    async def close(self):
+        if self._charges:
+            await asyncio.gather(*self._charges, return_exceptions=True)
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = None
+
+_limiter: Optional[RateLimiter] = None
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter
+
+class RateLimitMiddleware:
+    """
+    Request admission against the per-client buckets of RateLimiter, as plain ASGI middleware
+    (streamed responses pass through untouched). Must run after AuthMiddleware to limit per key.
+    """
+    def __init__(self, app: ASGIApp, limiter: RateLimiter = None):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket") or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter or get_rate_limiter()
+        try:
+            allowed, retry_after = await limiter.acquire(client_id_for(scope))
+        except Exception as e:
+            # Fail open for resilience
+            logger.warning(f"Redis rate limit error: {e}")
+            allowed, retry_after = True, 0.0
+
+        if not allowed:
+            if scope["type"] == "websocket":
+                await send({"type": "websocket.close", "code": 1013})
+                return
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded"},
+                headers={"Retry-After": str(max(1, int(retry_after + 0.999)))}
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
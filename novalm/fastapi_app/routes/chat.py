@@ -1,8 +1,21 @@
 import json
-from fastapi import APIRouter, Depends
+import time
+import struct
+import asyncio
+import logging
+from typing import Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
 from fastapi.responses import StreamingResponse
 from novalm.fastapi_app.schemas.chat import ChatCompletionRequest
 from novalm.core.orchestrator import Orchestrator
+from novalm.fastapi_app.middleware.rate_limit import get_rate_limiter, client_id_for
+from novalm.fastapi_app.middleware.auth import WS_SUBPROTOCOL
+from novalm.core.types import ChatMessage
+from novalm.core.inference import TokenUsage
+from novalm.core.sessions import AgentSession, OffsetExpired, get_session_registry
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -18,20 +31,41 @@ def get_orchestrator(request: Request) -> Orchestrator:
 
 from novalm.fastapi_app.schemas.ingest import IngestRequest
 
-@router.post("/ingest")
+@router.post("/ingest", status_code=202)
 async def ingest_documents(
     request: IngestRequest,
     orchestrator: Orchestrator = Depends(get_orchestrator)
 ):
     """
     Ingests documents into the RAG memory.
+    Returns immediately with a job ID; chunking, embedding and upserts run in the background.
     """
-    orchestrator.memory.add_documents(request.documents, request.metadatas)
-    return {"status": "success", "count": len(request.documents)}
+    try:
+        job = orchestrator.ingestion.submit(
+            request.documents, request.metadatas,
+            chunk_size=request.chunk_size, chunk_overlap=request.chunk_overlap
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "accepted", "job_id": job.id, "count": len(request.documents)}
+
+@router.get("/ingest/{job_id}")
+async def ingest_status(
+    job_id: str,
+    orchestrator: Orchestrator = Depends(get_orchestrator)
+):
+    """
+    Returns progress of a background ingestion job.
+    """
+    job = orchestrator.ingestion.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job.to_dict()
 
 @router.post("/completions")
 async def chat_completions(
     request: ChatCompletionRequest,
+    raw_request: Request,
     orchestrator: Orchestrator = Depends(get_orchestrator)
 ):
     """
@@ -42,10 +76,13 @@ async def chat_completions(
     # Enforce streaming for now if strictly required, or handle both.
     # User said "Required SSE Format", "Responses will be streamed".
     
+    client_id = client_id_for(raw_request.scope)
+
     async def event_generator():
         # Orchestrator yields ChatCompletionResponseChunk objects
+        usage = TokenUsage()
         try:
-            async for chunk in orchestrator.handle_chat(request):
+            async for chunk in orchestrator.handle_chat(request, client_id, usage):
                 # Serialize to JSON
                 data = chunk.model_dump_json()
                 yield f"data: {data}\n\n"
@@ -59,9 +96,165 @@ async def chat_completions(
             # For now, minimal handling.
             error_data = json.dumps({"error": str(e)})
             yield f"data: {error_data}\n\n"
+        finally:
+            # Charged after the fact: the token budget tracks actual generation. Detached, because
+            # on disconnect this generator is being cancelled and an awaited charge would be too
+            get_rate_limiter().charge_tokens_later(client_id, usage.generated_tokens)
 
     return StreamingResponse(
         event_generator(),
         media_type="text/event-stream",
         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} # Disable buffering
     )
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket):
+    """
+    Long-running sessions over a WebSocket; same chunk stream as /completions.
+
+    First client message (JSON text):
+      {"type": "start", "request": {...ChatCompletionRequest...}, "encoding": "json" | "binary"}
+      {"type": "attach", "session_id": "...", "offset": N, "encoding": ...}  (resume after reconnect)
+    Then, at any time: {"type": "cancel"}, {"type": "pause"}, {"type": "resume"},
+      {"type": "inject", "content": "..."} (added as a user message at the next step; each one
+      is admitted against the rate limit like a new request).
+
+    Server frames: {"type": "session", "session_id", "offset"} once, then chunks, then
+    {"type": "done", "offset", "error"}. Chunks are text {"type": "chunk", "offset", "data"} or,
+    with "encoding": "binary", a binary frame: 8-byte big-endian offset + chunk JSON (UTF-8).
+    The session keeps running if the connection drops; re-attach with the last offset + 1.
+
+    Browser clients authenticate with subprotocols ["novalm", "bearer.<api key>"] (see AuthMiddleware).
+    """
+    offered = websocket.scope.get("subprotocols", [])
+    await websocket.accept(subprotocol=WS_SUBPROTOCOL if WS_SUBPROTOCOL in offered else None)
+    client_id = client_id_for(websocket.scope)
+    registry = get_session_registry()
+    try:
+        first = await websocket.receive_json()
+    except (WebSocketDisconnect, ValueError, KeyError):
+        return
+
+    binary = first.get("encoding") == "binary"
+    if first.get("type") == "start":
+        try:
+            request = ChatCompletionRequest(**(first.get("request") or {}))
+        except ValidationError as e:
+            await websocket.send_json({"type": "error", "detail": e.errors()})
+            await websocket.close(code=1003)
+            return
+        orchestrator: Orchestrator = websocket.app.state.orchestrator
+        limiter = get_rate_limiter()
+
+        usage = TokenUsage()
+
+        async def charge(session: AgentSession):
+            # Detached: registry shutdown may cancel the session task while this runs
+            _charge_session(limiter, session)
+
+        session = registry.start(orchestrator.handle_chat(request, client_id, usage), client_id, on_finish=charge)
+        session.usage = usage
+        offset = 0
+    elif first.get("type") == "attach":
+        session = registry.get(str(first.get("session_id")))
+        if session is None or session.client_id != client_id:
+            await websocket.send_json({"type": "error", "detail": "Unknown session"})
+            await websocket.close(code=1008)
+            return
+        offset = max(int(first.get("offset") or 0), 0)
+    else:
+        await websocket.send_json({"type": "error", "detail": "First message must be 'start' or 'attach'"})
+        await websocket.close(code=1003)
+        return
+
+    session.attached += 1
+    tasks = []
+    try:
+        await websocket.send_json({"type": "session", "session_id": session.id, "offset": offset})
+        sender = asyncio.create_task(_send_chunks(websocket, session, offset, binary))
+        receiver = asyncio.create_task(_receive_controls(websocket, session))
+        tasks = [sender, receiver]
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        if sender in done and not sender.exception():
+            await websocket.close(code=1000)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        # Also when this handler is cancelled; gathering retrieves the loser's exception
+        # (typically WebSocketDisconnect from the receiver) so it is never logged as unretrieved
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        session.attached -= 1
+        session.last_seen = time.monotonic()
+
+def _charge_session(limiter, session: AgentSession) -> Optional[asyncio.Task]:
+    """Charges the tokens the session generated since its last charge (detached, see charge_tokens_later)."""
+    if session.usage is None:
+        return None
+    tokens = session.usage.generated_tokens - session.charged_tokens
+    session.charged_tokens = session.usage.generated_tokens
+    return limiter.charge_tokens_later(session.client_id, tokens)
+
+async def _admit_turn(session: AgentSession) -> Tuple[bool, float]:
+    """
+    Rate limits a turn added to a running session. The handshake is only admitted once, so
+    without this one socket could inject unlimited turns: each is admitted like a request,
+    after the tokens of the previous turns are charged.
+    """
+    limiter = get_rate_limiter()
+    try:
+        charge = _charge_session(limiter, session)
+        if charge is not None:
+            # Shielded: the budget must reflect this charge even if the receiver is cancelled
+            await asyncio.shield(charge)
+        return await limiter.acquire(session.client_id)
+    except Exception as e:
+        # Fail open, like RateLimitMiddleware
+        logger.warning(f"Redis rate limit error: {e}")
+        return True, 0.0
+
+async def _send_chunks(websocket: WebSocket, session: AgentSession, offset: int, binary: bool):
+    while True:
+        try:
+            chunks, finished = await session.read_from(offset)
+        except OffsetExpired as e:
+            await websocket.send_json({"type": "error", "detail": str(e), "offset": session.first_offset})
+            return
+        for chunk_offset, payload in chunks:
+            if binary:
+                await websocket.send_bytes(struct.pack(">Q", chunk_offset) + payload.encode("utf-8"))
+            else:
+                # Payload is already JSON; splice it in rather than re-serializing
+                await websocket.send_text(f'{{"type": "chunk", "offset": {chunk_offset}, "data": {payload}}}')
+            offset = chunk_offset + 1
+        if finished:
+            await websocket.send_json({"type": "done", "offset": offset, "error": session.error})
+            return
+
+async def _receive_controls(websocket: WebSocket, session: AgentSession):
+    while True:
+        try:
+            message = await websocket.receive_json()
+        except (ValueError, KeyError):
+            # KeyError: a binary frame (receive_json reads the "text" field)
+            await websocket.send_json({"type": "error", "detail": "Control messages must be JSON"})
+            continue
+        kind = message.get("type") if isinstance(message, dict) else None
+        if kind == "cancel":
+            session.cancel()
+        elif kind == "pause":
+            session.control.pause()
+        elif kind == "resume":
+            session.control.resume()
+        elif kind == "inject" and message.get("content"):
+            allowed, retry_after = await _admit_turn(session)
+            if not allowed:
+                await websocket.send_json({"type": "error", "detail": "Rate limit exceeded", "retry_after": retry_after})
+                continue
+            # Always a user turn: clients cannot inject system instructions
+            session.control.inject(ChatMessage(role="user", content=str(message["content"])))
+        else:
+            await websocket.send_json({"type": "error", "detail": f"Unknown control message: {kind}"})
+            continue
+        await websocket.send_json({"type": "ack", "control": kind})
@@ -1,6 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
 
 class IngestRequest(BaseModel):
     documents: List[str]
     metadatas: Optional[List[Dict[str, str]]] = None
+    # Chunking overrides (defaults from settings)
+    chunk_size: Optional[int] = Field(default=None, gt=0)
+    chunk_overlap: Optional[int] = Field(default=None, ge=0)
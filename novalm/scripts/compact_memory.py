@@ -0,0 +1,20 @@
+import sys
+import os
+
+# Add parent dir to path to import novalm
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from novalm.core.memory import AdvancedMemory
+
+def compact():
+    print("Compacting Memory...")
+    mem = AdvancedMemory()
+    
+    stats = mem.compact()
+    for tier, counts in stats.items():
+        print(f"- {tier}: merged {counts['merged']}, evicted {counts['evicted']}, moved to cold storage {counts['cold']}")
+        
+    print("Done! Memory compacted.")
+
+if __name__ == "__main__":
+    compact()
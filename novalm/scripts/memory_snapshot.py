@@ -0,0 +1,29 @@
+import sys
+import os
+import argparse
+
+# Add parent dir to path to import novalm
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from novalm.core.memory import AdvancedMemory
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import NovaLM memory snapshots.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="Snapshot file")
+    args = parser.parse_args()
+    
+    mem = AdvancedMemory()
+    if args.command == "export":
+        print(f"Exporting Memory to {args.path}...")
+        counts = mem.export_snapshot(args.path)
+    else:
+        print(f"Importing Memory from {args.path}...")
+        counts = mem.import_snapshot(args.path)
+    
+    for tier, count in counts.items():
+        print(f"- {tier}: {count}")
+    print("Done!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import os
+import sys
+import types
+
+import pytest
+
+# Settings require these at import time
+os.environ.setdefault("API_KEY", "test-key")
+os.environ.setdefault("MODEL_PATH", "dummy/path")
+
+PROMPT_NAMES = [
+    "PLANNER_PROMPT", "ARCHITECT_PROMPT", "ENGINEER_PROMPT", "EVALUATOR_PROMPT", "CRITIC_PROMPT",
+    "JSON_ENFORCEMENT", "EVALUATOR_EXPLAIN_PROMPT", "ENGINEER_TEST_CODE_HINT",
+    "RESEARCH_PROBLEM_PROMPT", "RESEARCH_HYPOTHESIS_PROMPT", "RESEARCH_DESIGN_PROMPT",
+    "RESEARCH_EXECUTION_PROMPT", "RESEARCH_ANALYSIS_PROMPT", "AGENT_INSTRUCTIONS",
+]
+
+
+@pytest.fixture
+def orchestrator_module(monkeypatch):
+    """
+    The orchestrator module with placeholder prompts and safety layer: each prompt is its own
+    name, so tests can see which one a step was given. (core/prompts.py and core/safety.py do
+    not import cleanly in this tree.)
+    """
+    prompts = types.ModuleType("novalm.core.prompts")
+    for name in PROMPT_NAMES:
+        setattr(prompts, name, name)
+    safety = types.ModuleType("novalm.core.safety")
+    safety.SafetyLayer = type("SafetyLayer", (), {})
+    monkeypatch.setitem(sys.modules, "novalm.core.prompts", prompts)
+    monkeypatch.setitem(sys.modules, "novalm.core.safety", safety)
+    monkeypatch.delitem(sys.modules, "novalm.core.orchestrator", raising=False)
+    import novalm.core.orchestrator as module
+    yield module
+    sys.modules.pop("novalm.core.orchestrator", None)
@@ -0,0 +1,58 @@
+import pytest
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from novalm.fastapi_app.middleware.auth import AuthMiddleware, WS_SUBPROTOCOL
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/whoami")
+    async def whoami(request: Request):
+        return {"api_key": request.state.api_key}
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse(iter([b"a", b"b", b"c"]), media_type="text/plain")
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await websocket.accept(subprotocol=WS_SUBPROTOCOL)
+        await websocket.send_json({"api_key": websocket.state.api_key, "subprotocols": websocket.scope["subprotocols"]})
+        await websocket.close()
+
+    app.add_middleware(AuthMiddleware, api_keys=["primary", "secondary"])
+    return app
+
+
+def test_http_keys_are_checked_and_exposed_on_request_state():
+    client = TestClient(make_app())
+    assert client.get("/health").status_code == 200
+    assert client.get("/whoami").status_code == 401
+    assert client.get("/whoami", headers={"X-API-Key": "wrong"}).status_code == 401
+    assert client.get("/whoami", headers={"X-API-Key": "primary"}).json() == {"api_key": "primary"}
+    assert client.get("/whoami", headers={"Authorization": "Bearer secondary"}).json() == {"api_key": "secondary"}
+    assert client.get("/stream", headers={"X-API-Key": "primary"}).text == "abc"
+
+
+def test_websocket_handshake_requires_a_key():
+    client = TestClient(make_app())
+    with client.websocket_connect("/ws", subprotocols=["novalm", "bearer.secondary"]) as ws:
+        assert ws.accepted_subprotocol == "novalm"
+        # The key is not passed on to the app (or anything echoing subprotocols)
+        assert ws.receive_json() == {"api_key": "secondary", "subprotocols": ["novalm"]}
+    with client.websocket_connect("/ws", headers={"X-API-Key": "primary"}) as ws:
+        assert ws.receive_json()["api_key"] == "primary"
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/ws", headers={"X-API-Key": "wrong"}):
+            pass
+    # Keys in the URL end up in access logs and are not accepted
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/ws?api_key=secondary"):
+            pass
@@ -0,0 +1,181 @@
+import sys
+import json
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+
+from novalm.core.types import ChatCompletionResponseChunk
+from novalm.fastapi_app.middleware.rate_limit import RateLimiter
+
+
+class RecordingLimiter(RateLimiter):
+    """Admits everything; records token charges after a simulated Redis round trip."""
+    def __init__(self):
+        super().__init__(requests_per_minute=0, tokens_per_minute=1000, lease=1)
+        self.charged = []
+
+    async def _call(self, client_id, want, charge):
+        await asyncio.sleep(0.01)
+        if charge:
+            self.charged.append((client_id, charge))
+        return [1, -1, 1000, 0]
+
+
+class StreamingOrchestrator:
+    """Streams chunks until cancelled, generating 5 tokens per chunk."""
+    def __init__(self):
+        self.chunks = 0
+
+    async def handle_chat(self, request, client_id="anonymous", usage=None):
+        while True:
+            usage.generated_tokens += 5
+            self.chunks += 1
+            yield ChatCompletionResponseChunk(id="c", created=0, model="m", choices=[{"index": 0, "delta": {"content": "x"}}])
+            await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def chat_routes(orchestrator_module, monkeypatch):
+    monkeypatch.delitem(sys.modules, "novalm.fastapi_app.routes.chat", raising=False)
+    import novalm.fastapi_app.routes.chat as module
+    limiter = RecordingLimiter()
+    monkeypatch.setattr(module, "get_rate_limiter", lambda: limiter)
+    module.limiter = limiter
+    yield module
+    sys.modules.pop("novalm.fastapi_app.routes.chat", None)
+
+
+def _app(chat_routes, orchestrator):
+    app = FastAPI()
+    app.include_router(chat_routes.router)
+    app.state.orchestrator = orchestrator
+    return app
+
+
+def test_client_disconnect_mid_stream_is_still_charged(chat_routes):
+    orchestrator = StreamingOrchestrator()
+    app = _app(chat_routes, orchestrator)
+    body = json.dumps({"model": "m", "messages": [{"role": "user", "content": "hi"}], "stream": True}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/completions", "raw_path": b"/completions", "root_path": "",
+        "query_string": b"", "headers": [(b"content-type", b"application/json")],
+        "client": ("1.2.3.4", 1000), "server": ("testserver", 80),
+    }
+
+    async def scenario():
+        events = []
+        streamed = asyncio.Event()
+        request_sent = False
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # The client goes away after a few chunks
+            await streamed.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            events.append(message)
+            if sum(m["type"] == "http.response.body" for m in events) >= 3:
+                streamed.set()
+
+        await app(scope, receive, send)
+        await asyncio.sleep(0.1)
+        return events
+
+    events = asyncio.run(scenario())
+    assert not any(b"[DONE]" in m.get("body", b"") for m in events)
+    assert orchestrator.chunks >= 3
+    assert chat_routes.limiter.charged == [("ip:1.2.3.4", 5 * orchestrator.chunks)]
+
+
+class TurnLimiter(RecordingLimiter):
+    """Records charges and admissions in order; refuses admission once `deny` is set."""
+    def __init__(self):
+        super().__init__()
+        self.events = []
+        self.deny = False
+
+    async def charge_tokens(self, client_id, tokens):
+        self.events.append(("charge", tokens))
+        await super().charge_tokens(client_id, tokens)
+
+    async def acquire(self, client_id):
+        self.events.append(("acquire", client_id))
+        return (False, 2.0) if self.deny else (True, 0.0)
+
+
+def test_websocket_turns_are_rate_limited_and_tasks_reaped(chat_routes, monkeypatch):
+    import gc
+
+    limiter = TurnLimiter()
+    monkeypatch.setattr(chat_routes, "get_rate_limiter", lambda: limiter)
+    app = _app(chat_routes, StreamingOrchestrator())
+    scope = {
+        "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "path": "/ws",
+        "raw_path": b"/ws", "root_path": "", "query_string": b"", "headers": [],
+        "client": ("1.2.3.4", 1000), "server": ("testserver", 80), "subprotocols": [],
+    }
+    start = {"type": "start", "request": {"model": "m", "messages": [{"role": "user", "content": "hi"}]}}
+
+    async def scenario():
+        unretrieved = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unretrieved.append(context))
+        frames = []
+        changed = asyncio.Event()
+
+        def sent(predicate):
+            return any(predicate(json.loads(m["text"])) for m in frames if m.get("text"))
+
+        async def wait_for(predicate):
+            while not sent(predicate):
+                changed.clear()
+                await changed.wait()
+
+        inbox = asyncio.Queue()
+        for message in (
+            {"type": "websocket.connect"},
+            {"type": "websocket.receive", "text": json.dumps(start)},
+        ):
+            inbox.put_nowait(message)
+
+        async def receive():
+            return await inbox.get()
+
+        async def send(message):
+            if message["type"] == "websocket.send":
+                frames.append(message)
+                changed.set()
+
+        async def client():
+            await wait_for(lambda f: f.get("type") == "chunk" and f["offset"] >= 2)
+            inbox.put_nowait({"type": "websocket.receive", "text": json.dumps({"type": "inject", "content": "more"})})
+            await wait_for(lambda f: f.get("type") == "ack")
+            limiter.deny = True
+            inbox.put_nowait({"type": "websocket.receive", "text": json.dumps({"type": "inject", "content": "again"})})
+            await wait_for(lambda f: f.get("detail") == "Rate limit exceeded")
+            # Drops mid-stream: the receiver fails with WebSocketDisconnect while the sender is pending
+            inbox.put_nowait({"type": "websocket.disconnect", "code": 1001})
+
+        await asyncio.wait_for(asyncio.gather(app(scope, receive, send), client()), timeout=10)
+        session_id = next(json.loads(m["text"])["session_id"] for m in frames if '"session"' in m["text"])
+        session = chat_routes.get_session_registry().get(session_id)
+        session.cancel()
+        await asyncio.gather(session.task, return_exceptions=True)
+        await asyncio.sleep(0.1)
+        gc.collect()
+        return frames, unretrieved
+
+    frames, unretrieved = asyncio.run(scenario())
+    kinds = [event[0] for event in limiter.events]
+    # Tokens of the first turn are charged before the next one is admitted
+    assert kinds[:2] == ["charge", "acquire"] and limiter.events[0][1] > 0
+    assert kinds.count("acquire") == 2
+    assert sum(tokens for _, tokens in limiter.charged) == sum(
+        tokens for kind, tokens in limiter.events if kind == "charge"
+    )
+    assert unretrieved == []
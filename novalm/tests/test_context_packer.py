@@ -0,0 +1,30 @@
+from novalm.core.context_packer import ContextPacker
+
+
+def _candidate(tier, uid, document, distance):
+    return {"tier": tier, "id": uid, "document": document, "distance": distance}
+
+def test_packer_drops_distant_and_overlapping_memories():
+    packer = ContextPacker(max_distance=0.5, overlap_threshold=0.8)
+    candidates = [
+        _candidate("episodic", "e1", "Task: fix recursion error in parser", 0.1),
+        _candidate("semantic", "s1", "Task: fix recursion error in the parser", 0.2),
+        _candidate("procedural", "p1", "Context: Debugging Python Recursion Errors", 0.3),
+        _candidate("semantic", "s2", "Matrix multiplication is associative", 0.9),
+    ]
+
+    selected = [c["id"] for c in packer.select(candidates, budget_tokens=1000)]
+    assert selected == ["e1", "p1"]
+
+def test_packer_respects_token_budget_and_groups_by_tier():
+    packer = ContextPacker(max_distance=1.0, overlap_threshold=0.8)
+    candidates = [
+        _candidate("semantic", "s1", "short fact", 0.1),
+        _candidate("episodic", "e1", "x" * 400, 0.2),
+        _candidate("procedural", "p1", "another short workflow", 0.3),
+    ]
+
+    block = packer.pack(candidates, budget_tokens=20)
+    assert "x" * 400 not in block
+    assert block.index("[MEMORY: KNOWLEDGE BASE]") < block.index("[MEMORY: RECOMMENDED WORKFLOWS]")
+    assert packer.pack(candidates, budget_tokens=0) == ""
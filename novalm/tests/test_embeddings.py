@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import pytest
+
+from novalm.core.embeddings import EmbeddingService
+
+
+class RecordingEmbedder:
+    """Embeds text as [len(text)] and records every batch it is called with."""
+    def __init__(self, gate: threading.Event = None, error: Exception = None):
+        self.batches = []
+        self.gate = gate
+        self.error = error
+
+    def __call__(self, input):
+        self.batches.append(list(input))
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return [[float(len(text))] for text in input]
+
+
+@pytest.fixture
+def make_service():
+    services = []
+
+    def make(embedder, **kwargs):
+        kwargs.setdefault("max_wait_ms", 50)
+        kwargs.setdefault("workers", 2)
+        service = EmbeddingService(embedder, **kwargs)
+        services.append(service)
+        return service
+
+    yield make
+    for service in services:
+        service.shutdown()
+
+
+def test_concurrent_requests_are_coalesced_into_batches(make_service):
+    embedder = RecordingEmbedder()
+    service = make_service(embedder, max_batch_size=3)
+
+    async def scenario():
+        return await asyncio.gather(*(service.embed([text]) for text in ["a", "bb", "ccc", "dddd", "eeeee"]))
+
+    results = asyncio.run(scenario())
+    assert results == [[[1.0]], [[2.0]], [[3.0]], [[4.0]], [[5.0]]]
+    # Five callers, two model calls, none above max_batch_size
+    assert sorted(len(b) for b in embedder.batches) == [2, 3]
+
+
+def test_lru_cache_serves_repeats_and_evicts_oldest(make_service):
+    embedder = RecordingEmbedder()
+    service = make_service(embedder, cache_size=2)
+
+    assert service(["a", "bb"]) == [[1.0], [2.0]]
+    assert service(["a"]) == [[1.0]]
+    assert len(embedder.batches) == 1
+    # "a" was used last, so "bb" is evicted to make room for "ccc"
+    service(["ccc"])
+    service(["a"])
+    assert len(embedder.batches) == 2
+    service(["bb"])
+    assert embedder.batches[-1] == ["bb"]
+
+
+def test_in_flight_text_is_embedded_once(make_service):
+    gate = threading.Event()
+    embedder = RecordingEmbedder(gate=gate)
+    service = make_service(embedder, max_wait_ms=0)
+
+    first = service.submit(["same"])[0]
+    second = service.submit(["same", "same"])
+    assert second[0] is first and second[1] is first
+    gate.set()
+    assert first.result(5) == [4.0]
+    assert embedder.batches == [["same"]]
+
+
+def test_batch_failure_reaches_every_waiter_and_is_not_cached(make_service):
+    embedder = RecordingEmbedder(error=RuntimeError("model down"))
+    service = make_service(embedder)
+
+    futures = service.submit(["a", "b"]) + service.submit(["a"])
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model down"):
+            future.result(5)
+
+    embedder.error = None
+    assert service(["a"]) == [[1.0]]
+    assert embedder.batches[-1] == ["a"]
+
+
+def test_shutdown_fails_waiters_and_refuses_new_work(make_service):
+    gate = threading.Event()
+    service = make_service(RecordingEmbedder(gate=gate), max_wait_ms=0)
+
+    waiting = service.submit(["slow"])[0]
+    service.shutdown()
+    with pytest.raises(RuntimeError, match="shut down"):
+        waiting.result(5)
+    with pytest.raises(RuntimeError, match="shut down"):
+        service.submit(["new"])
+    gate.set()
@@ -0,0 +1,101 @@
+import asyncio
+
+from novalm.core.evaluator import Evaluator, split_tests
+from novalm.core.sandbox import SandboxPool
+
+TESTS = '''
+import math
+
+def helper(x):
+    return x * 2
+
+def test_add():
+    assert add(1, 2) == 3
+
+def test_negative():
+    assert add(-1, -1) == -2
+
+class TestHelper:
+    def test_double(self):
+        assert helper(add(1, 1)) == 4
+
+if __name__ == "__main__":
+    test_add()
+'''
+
+
+def test_split_tests_separates_prelude_and_cases():
+    prelude, cases = split_tests(TESTS)
+    assert [name for name, _ in cases] == ["test_add", "test_negative", "TestHelper.test_double"]
+    assert "def helper" in prelude and "import math" in prelude
+    assert "__main__" not in prelude and "def test_add" not in prelude
+
+    # No discoverable cases: the caller runs the script whole
+    assert split_tests("assert add(1, 2) == 3\n")[1] == []
+
+
+def test_evaluate_reports_per_test_results_and_caches_them():
+    async def scenario():
+        pool = SandboxPool(size=2, max_runs=50, timeout=10)
+        try:
+            evaluator = Evaluator(pool=pool)
+            buggy = await evaluator.evaluate("def add(a, b):\n    return abs(a) + b\n", TESTS)
+            fixed = await evaluator.evaluate("def add(a, b):\n    return a + b\n", TESTS)
+            again = await evaluator.evaluate("def add(a, b):\n    return a + b\n", TESTS)
+            return buggy, fixed, again
+        finally:
+            pool.shutdown()
+
+    buggy, fixed, again = asyncio.run(scenario())
+    assert buggy["status"] == "FAIL" and buggy["passed"] == 2 and buggy["failed"] == 1
+    failing = [t for t in buggy["tests"] if t["status"] == "FAIL"]
+    assert [t["name"] for t in failing] == ["test_negative"]
+    assert "AssertionError" in failing[0]["error"]
+
+    assert fixed["status"] == "PASS" and fixed["passed"] == 3
+    assert not any(t["cached"] for t in fixed["tests"])
+    assert all(t["cached"] for t in again["tests"])
+
+
+class CountingPool:
+    """Records how many cases run at once; every case passes."""
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+
+    async def run(self, code, timeout=None, cwd=None):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return {"status": "success", "stdout": "", "stderr": "", "result_summary": "Executed successfully."}
+
+
+def test_fan_out_is_bounded_and_pytest_only_cases_are_not_called():
+    tests = "\n".join(f"def test_{i}():\n    assert add(1, 1) == 2\n" for i in range(8))
+    tests += """
+import pytest
+
+@pytest.mark.parametrize("a", [1, 2])
+def test_param(a):
+    assert add(a, 0) == a
+
+def test_fixture(tmp_path):
+    pass
+
+class TestMethods:
+    def test_plain(self):
+        pass
+
+    def test_with_fixture(self, tmp_path):
+        pass
+"""
+    pool = CountingPool()
+    evaluator = Evaluator(pool=pool, max_parallel=3)
+    result = asyncio.run(evaluator.evaluate("def add(a, b):\n    return a + b\n", tests))
+
+    assert pool.peak == 3
+    assert result["status"] == "PASS" and result["passed"] == 9 and result["failed"] == 0
+    unsupported = sorted(t["name"] for t in result["tests"] if t["status"] == "UNSUPPORTED")
+    assert unsupported == ["TestMethods.test_with_fixture", "test_fixture", "test_param"]
+    assert "Not run (need pytest)" in result["feedback"]
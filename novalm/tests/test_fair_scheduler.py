@@ -0,0 +1,78 @@
+import asyncio
+
+from novalm.core.scheduler import FairScheduler, QOS_INTERACTIVE, QOS_AGENT, QOS_BATCH
+
+
+async def generation(scheduler, order, tag, qos, client_id, prompt_tokens=0, max_tokens=1, min_tokens=None, hold=0.01):
+    async with scheduler.slot(prompt_tokens, max_tokens, min_tokens, qos=qos, client_id=client_id) as granted:
+        order.append((tag, granted) if min_tokens else tag)
+        await asyncio.sleep(hold)
+
+
+def test_reserved_slots_are_kept_for_interactive_requests():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=2, reserved_interactive=1, weights={"interactive": 8, "agent": 2, "batch": 1})
+        order = []
+        agents = [asyncio.create_task(generation(scheduler, order, f"agent{i}", QOS_AGENT, "a", hold=0.05)) for i in range(2)]
+        await asyncio.sleep(0)
+        # One agent runs, the other waits even though a slot is free
+        running_agents = scheduler.running
+        interactive = asyncio.create_task(generation(scheduler, order, "chat", QOS_INTERACTIVE, "b"))
+        await asyncio.gather(interactive, *agents)
+        return running_agents, order
+
+    running_agents, order = asyncio.run(scenario())
+    assert running_agents == 1
+    assert order == ["agent0", "chat", "agent1"]
+
+
+def test_clients_share_a_class_fairly():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, reserved_interactive=0, weights={"interactive": 1, "agent": 1, "batch": 1})
+        order = []
+        tasks = [asyncio.create_task(generation(scheduler, order, f"a{i}", QOS_BATCH, "a")) for i in range(4)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(generation(scheduler, order, f"b{i}", QOS_BATCH, "b")) for i in range(2)]
+        await asyncio.gather(*tasks)
+        return order
+
+    # The second client does not wait behind the first client's whole backlog
+    assert asyncio.run(scenario()) == ["a0", "b0", "a1", "b1", "a2", "a3"]
+
+
+def test_class_weights_split_slots_between_lanes():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, reserved_interactive=0, weights={"interactive": 3, "agent": 1, "batch": 1})
+        order = []
+        blocker = asyncio.create_task(generation(scheduler, order, "start", QOS_BATCH, "x"))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(generation(scheduler, order, "agent", QOS_AGENT, "a")) for _ in range(3)]
+        tasks += [asyncio.create_task(generation(scheduler, order, "chat", QOS_INTERACTIVE, "b")) for _ in range(6)]
+        await asyncio.gather(blocker, *tasks)
+        return order[1:]
+
+    order = asyncio.run(scenario())
+    # Roughly three interactive generations per agent generation while both lanes are busy
+    assert order[:4].count("chat") == 3
+    assert order.count("agent") == 3
+
+
+def test_admission_by_kv_footprint_scales_down_agent_steps():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=8, reserved_interactive=0, kv_capacity=9000)
+        order = []
+        first = asyncio.create_task(generation(scheduler, order, "first", QOS_AGENT, "a", 1000, 4000, 1000, hold=0.05))
+        await asyncio.sleep(0)
+        # Fits only with a smaller max_tokens: admitted now, scaled down
+        scaled = asyncio.create_task(generation(scheduler, order, "scaled", QOS_AGENT, "b", 1000, 4000, 1000, hold=0.05))
+        await asyncio.sleep(0)
+        # Not scalable and does not fit: waits although concurrency slots are free
+        fixed = asyncio.create_task(generation(scheduler, order, "fixed", QOS_INTERACTIVE, "c", 1000, 2000))
+        await asyncio.sleep(0)
+        waiting = scheduler.waiting()
+        await asyncio.gather(first, scaled, fixed)
+        return order, waiting
+
+    order, waiting = asyncio.run(scenario())
+    assert order[:2] == [("first", 4000), ("scaled", 3000)]
+    assert waiting == 1 and order[2] == "fixed"
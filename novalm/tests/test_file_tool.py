@@ -0,0 +1,112 @@
+import os
+import asyncio
+import difflib
+import threading
+
+import pytest
+
+from novalm.config.settings import settings
+from novalm.core.tools import file_system
+from novalm.core.tools.file_system import FileTool, apply_unified_diff
+from novalm.core.workspace import set_workspace, reset_workspace
+
+
+def _diff(before: str, after: str) -> str:
+    return "".join(difflib.unified_diff(
+        before.splitlines(keepends=True), after.splitlines(keepends=True), "a/f.py", "b/f.py"
+    ))
+
+def test_apply_unified_diff_with_drifted_hunks():
+    before = "".join(f"line {i}\n" for i in range(1, 51))
+    after = before.replace("line 10\n", "line ten\n").replace("line 40\n", "")
+    diff = _diff(before, after)
+
+    # Three lines inserted above the hunks since the diff was made
+    drifted = "new a\nnew b\nnew c\n" + before
+    patched, added, removed = apply_unified_diff(drifted, diff)
+
+    assert patched == "new a\nnew b\nnew c\n" + after
+    assert (added, removed) == (1, 2)
+
+def test_apply_unified_diff_insertion_only_hunk():
+    # "-3,0": insert after old line 3, not before it
+    patched, added, removed = apply_unified_diff("a\nb\nc\n", "@@ -3,0 +4 @@\n+d\n")
+    assert (patched, added, removed) == ("a\nb\nc\nd\n", 1, 0)
+    patched, _, _ = apply_unified_diff("a\nb\nc\n", "@@ -1,0 +2 @@\n+x\n")
+    assert patched == "a\nx\nb\nc\n"
+    patched, _, _ = apply_unified_diff("a\n", "@@ -0,0 +1 @@\n+top\n")
+    assert patched == "top\na\n"
+
+
+def test_apply_unified_diff_rejects_mismatch():
+    with pytest.raises(ValueError):
+        apply_unified_diff("a\nb\nc\n", _diff("x\ny\nz\n", "x\nY\nz\n"))
+
+@pytest.mark.parametrize("mmap_threshold", [10 ** 9, 0])
+def test_file_tool_ranged_read_and_patch(tmp_path, monkeypatch, mmap_threshold):
+    monkeypatch.setattr(settings, "FILE_MMAP_THRESHOLD_BYTES", mmap_threshold)
+    text = "".join(f"row {i}\n" for i in range(1, 101)) + "last"
+    (tmp_path / "data.txt").write_text(text)
+    tool = FileTool()
+
+    async def scenario():
+        set_workspace(str(tmp_path))
+        window = await tool.run({"operation": "read", "filename": "data.txt", "start_line": 99, "end_line": 200})
+        patched = await tool.run({
+            "operation": "patch", "filename": "data.txt",
+            "content": _diff(text, text.replace("row 50\n", "row fifty\n"))
+        })
+        listing = await tool.run({"operation": "list"})
+        return window, patched, listing
+
+    window, patched, listing = asyncio.run(scenario())
+    assert window["content"] == "row 99\nrow 100\nlast"
+    assert window["total_lines"] == 101 and window["end_line"] == 101
+    assert patched["status"] == "success"
+    assert "row fifty\n" in (tmp_path / "data.txt").read_text()
+    assert listing["files"][0]["path"] == "data.txt" and len(listing["files"][0]["sha256"]) == 16
+
+
+@pytest.mark.parametrize("mmap_threshold", [10 ** 9, 0])
+def test_only_newline_ends_a_line(tmp_path, monkeypatch, mmap_threshold):
+    monkeypatch.setattr(settings, "FILE_MMAP_THRESHOLD_BYTES", mmap_threshold)
+    # Scan the mmap in windows smaller than the file
+    monkeypatch.setattr(file_system, "_SCAN_CHUNK_BYTES", 7)
+    text = "a\x0cb\r\nc\u2028d\x85e\ntarget\r\nz\x1c\n"
+    (tmp_path / "f.txt").write_bytes(text.encode("utf-8"))
+    tool = FileTool()
+
+    async def scenario():
+        set_workspace(str(tmp_path))
+        window = await tool.run({"operation": "read", "filename": "f.txt", "start_line": 3, "end_line": 3})
+        patched = await tool.run({
+            "operation": "patch", "filename": "f.txt",
+            "content": "@@ -3 +3 @@\n-target\r\n+done\r\n"
+        })
+        return window, patched
+
+    window, patched = asyncio.run(scenario())
+    assert window["content"] == "target\r\n" and window["total_lines"] == 4
+    assert patched["status"] == "success"
+    assert (tmp_path / "f.txt").read_bytes().decode("utf-8") == text.replace("target", "done")
+
+
+def test_concurrent_writes_of_one_path_use_separate_temp_files(tmp_path):
+    path = str(tmp_path / "f.txt")
+    errors = []
+
+    def writer(char):
+        try:
+            for _ in range(50):
+                file_system._atomic_write(path, char * 4096)
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(c,)) for c in "ab"]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert open(path).read() in ("a" * 4096, "b" * 4096)
+    assert os.listdir(tmp_path) == ["f.txt"]
@@ -0,0 +1,38 @@
+import pytest
+from pydantic import ValidationError
+
+from novalm.core.ingest import chunk_text, IngestionPipeline
+from novalm.fastapi_app.schemas.ingest import IngestRequest
+
+
+def test_chunk_text_short_document_is_single_chunk():
+    assert chunk_text("  hello world  ", 100) == ["hello world"]
+    assert chunk_text("", 100) == []
+
+def test_chunk_text_respects_size_and_prefers_boundaries():
+    text = "Sentence number one. " * 50
+    chunks = chunk_text(text, 200, 20)
+
+    assert len(chunks) > 1
+    assert all(len(c) <= 200 for c in chunks)
+    # Breaks land on sentence boundaries
+    assert all(c.endswith(".") for c in chunks)
+
+def test_chunk_text_overlap_repeats_tail():
+    text = " ".join(f"w{i}" for i in range(200))
+    chunks = chunk_text(text, 100, 30)
+
+    assert chunks[0].split()[-1] in chunks[1]
+
+
+def test_chunking_parameters_are_validated():
+    with pytest.raises(ValidationError):
+        IngestRequest(documents=["x"], chunk_size=0)
+    with pytest.raises(ValidationError):
+        IngestRequest(documents=["x"], chunk_overlap=-1)
+
+    # Checked against the effective values (defaults included); the route maps this to 400
+    pipeline = IngestionPipeline(memory=None)
+    with pytest.raises(ValueError, match="chunk_overlap"):
+        pipeline.submit(["x"], chunk_size=100, chunk_overlap=100)
+    assert pipeline.jobs == {}
@@ -0,0 +1,29 @@
+from novalm.core.lexical_index import BM25Index, tokenize, reciprocal_rank_fusion
+
+
+def test_tokenize_splits_identifiers_and_drops_stopwords():
+    tokens = tokenize("How do I fix a RecursionError in max_tokens?")
+
+    assert "recursionerror" in tokens
+    assert "recursion" in tokens and "error" in tokens
+    assert "max_token" in tokens
+    assert "max" in tokens and "token" in tokens
+    assert tokenize("__init__") == ["init"]
+    assert "how" not in tokens and "a" not in tokens
+
+def test_bm25_ranks_keyword_match_first_and_reports_coverage():
+    index = BM25Index()
+    index.add("proc_1", "Context: Debugging Python Recursion Errors")
+    index.add("proc_2", "Context: Optimizing Matrix Multiplication")
+    index.add("proc_3", "Context: Writing Unit Tests")
+
+    results = index.search("python recursion errors", 3)
+    assert results[0][0] == "proc_1"
+    assert results[0][2] == 1.0
+
+    index.remove("proc_1")
+    assert all(doc_id != "proc_1" for doc_id, _, _ in index.search("python recursion", 3))
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]])
+    assert fused[0] == "b"
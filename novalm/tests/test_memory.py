@@ -0,0 +1,217 @@
+import time
+import hashlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from novalm.config.settings import settings
+from novalm.core import memory as memory_module
+from novalm.core.memory import AdvancedMemory
+from novalm.core.memory_snapshot import read_snapshot, write_snapshot
+
+
+def _hashing_embedder():
+    """Bag-of-words hashed into 64 dims: deterministic, no model download."""
+    def embed(input):
+        vectors = []
+        for text in input:
+            v = np.zeros(64, dtype=np.float32)
+            for word in text.lower().split():
+                v[int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+            vectors.append((v / (np.linalg.norm(v) or 1.0)).tolist())
+        return vectors
+    return embed
+
+
+@pytest.fixture
+def memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_BACKEND", "numpy")
+    monkeypatch.setattr(settings, "MEMORY_READ_ONLY", False)
+    monkeypatch.setattr(settings, "MEMORY_SNAPSHOT_PATH", None)
+    monkeypatch.setattr(settings, "VECTOR_STORE_PATH", str(tmp_path / "vectors"))
+    monkeypatch.setattr(settings, "MEMORY_COLD_DIR", str(tmp_path / "cold"))
+    monkeypatch.setattr(memory_module, "_default_embedding_function", _hashing_embedder)
+    monkeypatch.setattr(memory_module, "EMBEDDING_MODEL", "md5-hashing-64")
+    mem = AdvancedMemory()
+    assert mem.semantic is not None
+    return mem
+
+
+def test_semantic_batch_skips_or_refreshes_existing_documents(memory):
+    assert memory.add_semantic_batch(["fact one", "fact two"], source="ingest") == 2
+    stamped = memory.semantic.get(include=["metadatas"])["metadatas"][0]["timestamp"]
+    time.sleep(0.01)
+
+    # Ingest is idempotent: nothing rewritten
+    assert memory.add_semantic_batch(["fact one", "fact two"], source="ingest") == 0
+    # Upsert refreshes metadata and timestamp, as add_semantic() does
+    assert memory.add_semantic_batch(["fact one"], source="research_agent", upsert=True) == 1
+    uid = f"sem_{memory._generate_id('fact one')}"
+    meta = memory.semantic.get(ids=[uid], include=["metadatas"])["metadatas"][0]
+    assert meta["source"] == "research_agent" and meta["timestamp"] > stamped
+    assert memory.semantic.count() == 2
+
+
+def test_lexical_fast_path_needs_multi_term_queries_and_clear_separation(memory):
+    memory.add_semantic_batch([
+        "python decorators wrap functions",
+        "python list sorting with key functions",
+        "python packaging with pyproject files",
+        "numpy matrix multiplication performance on large arrays",
+    ])
+    vector_queries = []
+    query = memory.semantic.query
+
+    def counting_query(**kwargs):
+        vector_queries.append(kwargs["query_texts"][0])
+        return query(**kwargs)
+
+    memory.semantic.query = counting_query
+
+    # One term: every python document has full coverage, so ranking needs the vectors
+    assert len(memory.retrieve_semantic("python", n=2)) == 2
+    assert vector_queries == ["python"]
+
+    # Several terms, one document far ahead on BM25: served without embedding the query
+    docs = memory.retrieve_semantic("numpy matrix multiplication performance", n=1)
+    assert docs == ["numpy matrix multiplication performance on large arrays"]
+    assert vector_queries == ["python"]
+
+
+def test_lexical_distances_share_the_packers_threshold(memory, monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_CONTEXT_MAX_DISTANCE", 0.4)
+    monkeypatch.setattr(settings, "MEMORY_LEXICAL_MIN_COVERAGE", 0.6)
+    memory.add_semantic_batch(["alpha beta gamma delta epsilon", "alpha zeta"])
+    monkeypatch.setattr(memory.semantic, "query", lambda **kwargs: {"ids": [[]], "documents": [[]], "distances": [[]]})
+
+    scored = {doc: distance for _, doc, distance in memory._query_scored("semantic", "alpha beta gamma delta", 2)}
+    assert scored["alpha beta gamma delta epsilon"] == pytest.approx(0.0)
+    # A quarter of the query terms: far below the coverage floor, so beyond the packer's cutoff
+    assert scored["alpha zeta"] > settings.MEMORY_CONTEXT_MAX_DISTANCE
+    assert memory._lexical_distance(0.6) == pytest.approx(settings.MEMORY_CONTEXT_MAX_DISTANCE)
+
+
+def _metadata(collection, uid):
+    return collection.get(ids=[uid], include=["metadatas"])["metadatas"][0]
+
+
+def test_compaction_merges_near_duplicates_into_the_most_used_copy(memory):
+    memory.add_semantic_batch(["alpha beta gamma", "gamma beta alpha", "delta epsilon zeta"])
+    first, second, other = (f"sem_{memory._generate_id(t)}" for t in ["alpha beta gamma", "gamma beta alpha", "delta epsilon zeta"])
+    memory._hits = {second: 3}
+
+    stats = memory.compact()
+    assert stats["semantic"] == {"merged": 1, "evicted": 0, "cold": 0}
+    assert sorted(memory.semantic.get(include=[])["ids"]) == sorted([second, other])
+    meta = _metadata(memory.semantic, second)
+    assert meta["hits"] == 3 and meta["occurrences"] == 2 and "last_used" in meta
+    # Hits are consumed by a compaction
+    assert memory._hits == {}
+    assert memory.compact()["semantic"]["merged"] == 0
+
+
+def test_compaction_caps_tiers_by_decayed_usefulness(memory, monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_MAX_ITEMS", {"episodic": 2, "semantic": 1, "procedural": 0})
+    monkeypatch.setattr(settings, "MEMORY_HALF_LIFE_DAYS", {"episodic": 30, "semantic": 0, "procedural": 0})
+    ninety_days_ago = time.time() - 90 * 86400
+
+    memory.add_episodic("parse csv headers", "use the csv module", "PASS")
+    memory.add_episodic("resize png thumbnails", "use pillow resize", "PASS")
+    memory.add_episodic("retry flaky http calls", "exponential backoff loop", "PASS")
+    old_episode = memory.episodic.get(include=[])["ids"][2]
+    memory.episodic.update(ids=[old_episode], metadatas=[{"outcome": "PASS", "timestamp": ninety_days_ago}])
+
+    memory.add_semantic_batch(["kubernetes pod scheduling", "postgres vacuum tuning"])
+    old_fact, new_fact = (f"sem_{memory._generate_id(t)}" for t in ["kubernetes pod scheduling", "postgres vacuum tuning"])
+    memory.semantic.update(ids=[old_fact], metadatas=[{"source": "ingest", "timestamp": ninety_days_ago}])
+
+    # Three hits are worth 4 fresh, but only 0.5 after three half-lives
+    memory._hits = {old_episode: 3, old_fact: 3}
+    stats = memory.compact()
+
+    assert stats["episodic"]["evicted"] == 1 and memory.episodic.count() == 2
+    assert old_episode not in memory.episodic.get(include=[])["ids"]
+    # Semantic memory does not decay: the old, used fact outranks the fresh one
+    assert stats["semantic"]["evicted"] == 1
+    assert memory.semantic.get(include=[])["ids"] == [old_fact]
+    assert stats["procedural"]["evicted"] == 0
+
+
+def test_compaction_moves_large_episodes_to_cold_storage(memory, monkeypatch):
+    body = "\n".join(f"step {i}: transform record batch {i}" for i in range(40))
+    memory.add_episodic("migrate billing records", body, "PASS")
+    uid = memory.episodic.get(include=[])["ids"][0]
+    assert "step 39" in memory.episodic.get(ids=[uid], include=["documents"])["documents"][0]
+
+    monkeypatch.setattr(settings, "MEMORY_COLD_THRESHOLD_CHARS", 200)
+    assert memory.compact()["episodic"]["cold"] == 1
+
+    document = memory.episodic.get(ids=[uid], include=["documents"])["documents"][0]
+    assert document.startswith("Task: migrate billing records\nResult: PASS")
+    assert f"[Full episode in cold storage: {uid}]" in document and "step 39" not in document
+    assert "step 39" in memory.load_cold(uid)
+    assert _metadata(memory.episodic, uid)["cold"] is True
+    # The summary is what lexical search sees now
+    assert uid not in [doc_id for doc_id, _, _ in memory._lexical_index("episodic").search("transform step", 5)]
+    assert memory.compact()["episodic"]["cold"] == 0
+
+    # Evicting a cold episode removes its body as well
+    monkeypatch.setattr(settings, "MEMORY_MAX_ITEMS", {"episodic": 1, "semantic": 0, "procedural": 0})
+    memory.add_episodic("rotate tls certificates", "renew with certbot", "PASS")
+    memory._hits = {memory.episodic.get(include=[])["ids"][1]: 2}
+    assert memory.compact()["episodic"]["evicted"] == 1
+    assert memory.load_cold(uid) is None
+
+
+def test_snapshot_import_requires_the_same_embedding_model(memory, tmp_path, monkeypatch):
+    memory.add_semantic_batch(["snapshot fact one", "snapshot fact two"])
+    path = str(tmp_path / "memory.nvms")
+    memory.export_snapshot(path)
+    meta = read_snapshot(path)["meta"]
+    assert meta["embedding_model"] == "md5-hashing-64" and meta["embedding_dim"] == 64
+
+    memory.semantic.delete(ids=memory.semantic.get(include=[])["ids"])
+    assert memory.import_snapshot(path)["semantic"] == 2
+
+    # Another model (or an older snapshot that did not record one) is refused before any write
+    memory.semantic.delete(ids=memory.semantic.get(include=[])["ids"])
+    monkeypatch.setattr(memory_module, "EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    with pytest.raises(ValueError, match="md5-hashing-64"):
+        memory.import_snapshot(path)
+    monkeypatch.setattr(memory_module, "EMBEDDING_MODEL", "md5-hashing-64")
+
+    snapshot = read_snapshot(path)
+    write_snapshot(path, snapshot["tiers"], meta={"embedding_model": "md5-hashing-64", "embedding_dim": 384})
+    with pytest.raises(ValueError, match="384 dims"):
+        memory.import_snapshot(path)
+    write_snapshot(path, snapshot["tiers"], meta={"backend": "numpy"})
+    with pytest.raises(ValueError, match="re-export"):
+        memory.import_snapshot(path)
+    assert memory.semantic.count() == 0
+
+
+def test_compaction_pages_reads_and_batches_writes(memory, monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_MAX_ITEMS", {"episodic": 0, "semantic": 3, "procedural": 0})
+    facts = [f"fact {word} number {i}" for i, word in enumerate(["red", "green", "blue", "cyan", "pink", "gray", "teal"])]
+    memory.add_semantic_batch(facts)
+    used = [f"sem_{memory._generate_id(t)}" for t in facts[4:]]
+    memory._hits = {uid: 1 for uid in used}
+
+    sizes = {"get": [], "update": [], "delete": []}
+    for name in sizes:
+        original = getattr(memory.semantic, name)
+
+        def recording(*args, _name=name, _original=original, **kwargs):
+            result = _original(*args, **kwargs)
+            sizes[_name].append(len(kwargs["ids"]) if "ids" in kwargs else len(result["ids"]))
+            return result
+        setattr(memory.semantic, name, recording)
+
+    stats = memory.compact(batch_size=2)
+    assert stats["semantic"] == {"merged": 0, "evicted": 4, "cold": 0}
+    assert sorted(memory.semantic.get(include=[])["ids"]) == sorted(used)
+    # 7 records read in pages of 2; 4 deletes and 3 updates in batches of 2
+    assert sizes["get"][:4] == [2, 2, 2, 1]
+    assert max(sizes["update"] + sizes["delete"]) == 2
+    assert sum(sizes["delete"]) == 4
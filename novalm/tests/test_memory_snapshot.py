@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from novalm.core.memory_snapshot import write_snapshot, read_snapshot
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "memory.nvms")
+    tiers = {
+        "semantic": {
+            "ids": ["sem_a", "sem_b"],
+            "documents": ["alpha", "beta"],
+            "metadatas": [{"source": "manual"}, {"source": "ingest", "chunk_index": 3}],
+            "embeddings": [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]],
+        },
+        "episodic": {"ids": [], "documents": [], "metadatas": [], "embeddings": [], "cold": {}},
+    }
+    write_snapshot(path, tiers, meta={"backend": "numpy"})
+
+    snapshot = read_snapshot(path)
+    assert snapshot["meta"]["backend"] == "numpy"
+    semantic = snapshot["tiers"]["semantic"]
+    assert semantic["ids"] == ["sem_a", "sem_b"]
+    assert semantic["metadatas"][1]["chunk_index"] == 3
+    np.testing.assert_allclose(semantic["embeddings"], tiers["semantic"]["embeddings"], rtol=1e-6)
+    assert snapshot["tiers"]["episodic"]["ids"] == []
+
+def test_snapshot_rejects_foreign_files(tmp_path):
+    path = tmp_path / "not_a_snapshot.bin"
+    path.write_bytes(b"PK\x03\x04" + b"\x00" * 32)
+
+    with pytest.raises(ValueError):
+        read_snapshot(str(path))
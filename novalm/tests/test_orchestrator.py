@@ -0,0 +1,191 @@
+import json
+import asyncio
+import traceback
+from contextlib import asynccontextmanager
+
+import pytest
+
+from novalm.config.settings import settings
+from novalm.core.types import ChatCompletionRequest, ChatMessage, SamplingParams
+from novalm.core.evaluator import Evaluator
+from novalm.core.scheduler import FairScheduler
+from novalm.core.tools.output_shaper import ToolOutputShaper
+from novalm.core.workspace import set_workspace, reset_workspace
+
+TESTS = '''
+def test_add():
+    assert add(1, 2) == 3
+
+def test_negative():
+    assert add(-1, -1) == -2
+'''
+
+
+class ScriptedEngine:
+    """Answers each generation with the next scripted JSON response and records the prompts."""
+    def __init__(self, responses):
+        self.responses = [json.dumps(r) for r in responses]
+        self.prompts = []
+
+    async def generate(self, prompt, params, generation_id):
+        self.prompts.append(prompt)
+        yield self.responses[len(self.prompts) - 1]
+
+
+class InProcessPool:
+    """Sandbox pool stand-in: runs the script with exec() and reports like SandboxPool.run."""
+    def __init__(self):
+        self.scripts = []
+
+    async def run(self, code, timeout=None, cwd=None):
+        self.scripts.append(code)
+        try:
+            exec(compile(code, "<sandbox>", "exec"), {"__name__": "__main__"})
+            return {"status": "success", "stdout": "", "stderr": "", "result_summary": "Executed successfully."}
+        except Exception as e:
+            return {"status": "error", "stdout": "", "stderr": traceback.format_exc(), "result_summary": f"Error: {e}"}
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.episodes = []
+
+    def add_episodic(self, **kwargs):
+        self.episodes.append(kwargs)
+
+
+def make_orchestrator(module, responses):
+    orchestrator = module.Orchestrator.__new__(module.Orchestrator)
+    orchestrator.inference_engine = ScriptedEngine(responses)
+    orchestrator.evaluator = Evaluator(pool=InProcessPool())
+    orchestrator.output_shaper = ToolOutputShaper()
+    orchestrator.scheduler = FairScheduler()
+    orchestrator.memory_writer = RecordingWriter()
+    orchestrator._step_tokens = {}
+    return orchestrator
+
+
+def run_loop(orchestrator, test_code=TESTS):
+    request = ChatCompletionRequest(
+        model="m",
+        messages=[ChatMessage(role="user", content="Write add(a, b)")],
+        sampling_params=SamplingParams(preset="autonomous"),
+        test_code=test_code
+    )
+
+    async def collect():
+        return [chunk.choices[0]["delta"]["content"] async for chunk in orchestrator._run_autonomous_loop(request)]
+
+    text = "".join(asyncio.run(collect()))
+    roles = [line.split("ROLE: ")[1].split(" ---")[0] for line in text.splitlines() if "--- ROLE: " in line]
+    return roles, text
+
+
+PLANNER = {"role": "planner", "analysis": "a", "milestones": ["m"], "next_step": "handoff_to_architect"}
+ARCHITECT = {"role": "architect", "design_rationale": "r", "file_structure": {"sol.py": "add"}, "next_step": "handoff_to_engineer"}
+CRITIC = {"role": "critic", "critique": "fine", "approved": True, "feedback": ""}
+
+
+def final_answer(**input_data):
+    return {"role": "engineer", "thought": "done", "action": "final_answer", "input": input_data}
+
+
+def test_passing_tests_go_straight_to_critic(orchestrator_module):
+    orchestrator = make_orchestrator(orchestrator_module, [
+        PLANNER, ARCHITECT, final_answer(code="def add(a, b):\n    return a + b\n"), CRITIC
+    ])
+    roles, text = run_loop(orchestrator)
+
+    assert roles == ["PLANNER", "ARCHITECT", "ENGINEER", "CRITIC"]
+    assert "[Tests: 2 passed, 0 failed]" in text
+    # The ENGINEER knew its answer would be run against the tests
+    assert "ENGINEER_TEST_CODE_HINT" in orchestrator.inference_engine.prompts[2]
+    assert len(orchestrator.memory_writer.episodes) == 1
+
+
+def test_failing_tests_are_explained_then_fixed(orchestrator_module):
+    explain = {"role": "evaluator", "test_plan": "p", "status": "fail", "issues": ["abs() breaks negatives"], "next_step": "retry_engineer"}
+    orchestrator = make_orchestrator(orchestrator_module, [
+        PLANNER, ARCHITECT,
+        final_answer(code="def add(a, b):\n    return abs(a) + b\n"),
+        explain,
+        final_answer(code="def add(a, b):\n    return a + b\n"),
+        CRITIC
+    ])
+    roles, text = run_loop(orchestrator)
+
+    assert roles == ["PLANNER", "ARCHITECT", "ENGINEER", "EVALUATOR", "ENGINEER", "CRITIC"]
+    assert "[Tests: 1 passed, 1 failed]" in text and "[Tests: 2 passed, 0 failed]" in text
+    evaluator_prompt = orchestrator.inference_engine.prompts[3]
+    assert "EVALUATOR_EXPLAIN_PROMPT" in evaluator_prompt and "test_negative" in evaluator_prompt
+    # The explanation is in the history the next ENGINEER step sees
+    assert "abs() breaks negatives" in orchestrator.inference_engine.prompts[4]
+
+
+def test_final_answer_without_code_falls_back_to_the_evaluator_role(orchestrator_module):
+    evaluate = {"role": "evaluator", "test_plan": "p", "status": "pass", "issues": [], "next_step": "hand_to_critic"}
+    orchestrator = make_orchestrator(orchestrator_module, [PLANNER, ARCHITECT, final_answer(), evaluate, CRITIC])
+    roles, text = run_loop(orchestrator)
+
+    assert roles == ["PLANNER", "ARCHITECT", "ENGINEER", "EVALUATOR", "CRITIC"]
+    assert "[Running Tests...]" not in text
+    assert "EVALUATOR_PROMPT" in orchestrator.inference_engine.prompts[3]
+    assert orchestrator.evaluator.pool.scripts == []
+
+
+def test_solution_code_resolves_workspace_files(orchestrator_module, tmp_path):
+    (tmp_path / "sol.py").write_text("def add(a, b):\n    return a + b\n")
+    (tmp_path / "util.py").write_text("X = 1\n")
+    orchestrator = make_orchestrator(orchestrator_module, [])
+
+    async def scenario():
+        token = set_workspace(str(tmp_path))
+        try:
+            return (
+                await orchestrator._solution_code({"files": ["sol.py", "util.py"]}),
+                await orchestrator._solution_code({"filename": "sol.py"}),
+                await orchestrator._solution_code({"code": "inline = True"}),
+                await orchestrator._solution_code({"files": ["../outside.py", "missing.py"]}),
+            )
+        finally:
+            reset_workspace(token)
+
+    both, single, inline, none = asyncio.run(scenario())
+    assert "def add" in both and "X = 1" in both
+    assert single.startswith("def add")
+    assert inline == "inline = True"
+    assert none is None
+
+
+class SqueezedScheduler:
+    """Admits every generation with the smallest max_tokens it allows, as under heavy KV pressure."""
+    def __init__(self):
+        self.requests = []
+
+    @asynccontextmanager
+    async def slot(self, prompt_tokens, max_tokens, min_tokens=None):
+        self.requests.append((max_tokens, min_tokens))
+        yield min_tokens or max_tokens
+
+
+def test_agent_steps_are_not_scaled_below_what_they_recently_needed(orchestrator_module):
+    long_answer = {"role": "engineer", "thought": "x" * 8000, "action": "final_answer", "input": {}}
+    orchestrator = make_orchestrator(orchestrator_module, [long_answer, long_answer, "short"])
+    orchestrator.scheduler = SqueezedScheduler()
+    params = SamplingParams(max_tokens=settings.AGENT_MAX_TOKENS)
+
+    async def step(name):
+        return "".join([c async for c in orchestrator._generate("prompt", params, "g", step=name)])
+
+    async def scenario():
+        first = await step("ENGINEER")
+        await step("ENGINEER")
+        await step("PLANNER")
+        return first
+
+    first = asyncio.run(scenario())
+    (_, cold), (_, warm), (_, other) = orchestrator.scheduler.requests
+    # Unknown step: the configured floor; after a ~2000-token answer the floor covers it with headroom
+    assert cold == settings.AGENT_MIN_TOKENS
+    assert warm >= len(first) / 4 * settings.AGENT_STEP_HEADROOM
+    assert other == settings.AGENT_MIN_TOKENS
@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import asyncio
+
+from novalm.core.tools.file_system import FileTool
+from novalm.core.tools.output_shaper import ToolOutputShaper
+from novalm.core.workspace import set_workspace, reset_workspace, session_usage, SPILL_DIR
+
+
+def test_small_output_passes_through_unchanged():
+    output = {"status": "success", "stdout": "42\n", "stderr": ""}
+    shaped = asyncio.run(ToolOutputShaper().shape("python_exec", output))
+    assert json.loads(shaped) == output
+
+
+def test_long_output_keeps_head_tail_and_errors_and_spills_full_text(tmp_path):
+    lines = [f"step {i}" for i in range(5000)]
+    lines[2500] = "ValueError: bad input at step 2500"
+    stdout = "\n".join(lines)
+    shaper = ToolOutputShaper()
+    token = set_workspace(str(tmp_path))
+    try:
+        shaped = json.loads(asyncio.run(shaper.shape("shell_tool", {"status": "success", "stdout": stdout, "stderr": ""})))
+        assert len(json.dumps(shaped)) < shaper.budget_chars("shell_tool") + 400
+        assert shaped["stdout"].startswith("step 0\n")
+        assert shaped["stdout"].endswith("step 4999")
+        assert "ValueError: bad input at step 2500" in shaped["stdout"]
+
+        # The handle pages through the full text with ranged reads
+        handle = shaped["full_output"]["stdout"]
+        window = asyncio.run(FileTool().run({"operation": "read", "filename": handle, "start_line": 2501, "end_line": 2501}))
+        assert window["content"] == "ValueError: bad input at step 2500\n"
+    finally:
+        reset_workspace(token)
+
+
+def test_file_reads_reference_the_file_instead_of_spilling(tmp_path):
+    shaper = ToolOutputShaper()
+    token = set_workspace(str(tmp_path))
+    try:
+        output = {"status": "success", "content": "x = 1\n" * 5000}
+        shaped = json.loads(asyncio.run(shaper.shape("file_tool", output, {"operation": "read", "filename": "big.py"})))
+        assert shaped["full_output"] == {"content": "big.py"}
+        assert not (tmp_path / ".tool_outputs").exists()
+    finally:
+        reset_workspace(token)
+
+
+def test_spills_are_outside_the_quota_and_expire(tmp_path):
+    stale = tmp_path / SPILL_DIR / "shell_tool-old-stdout.txt"
+    stale.parent.mkdir()
+    stale.write_text("old output")
+    an_hour_ago = time.time() - 3700
+    os.utime(stale, (an_hour_ago, an_hour_ago))
+
+    token = set_workspace(str(tmp_path))
+    try:
+        shaped = json.loads(asyncio.run(ToolOutputShaper().shape("shell_tool", {"stdout": "x" * 100000})))
+    finally:
+        reset_workspace(token)
+    assert (tmp_path / shaped["full_output"]["stdout"]).exists()
+    assert not stale.exists()
+    assert session_usage(str(tmp_path)) == 0
+
+
+def test_large_lists_are_cut_with_a_marker_and_spilled(tmp_path):
+    files = [{"path": f"src/module_{i}.py", "size": i * 10, "sha256": f"{i:016x}"} for i in range(500)]
+    shaper = ToolOutputShaper()
+    token = set_workspace(str(tmp_path))
+    try:
+        shaped = json.loads(asyncio.run(shaper.shape("file_tool", {"status": "success", "files": files}, {"operation": "list"})))
+    finally:
+        reset_workspace(token)
+
+    assert len(json.dumps(shaped, ensure_ascii=False)) < shaper.budget_chars("file_tool") + 400
+    kept, marker = shaped["files"][:-1], shaped["files"][-1]
+    assert kept == files[:len(kept)] and len(kept) > 10
+    assert marker.startswith(f"... [{500 - len(kept)} more items")
+    spilled = (tmp_path / shaped["full_output"]["files"]).read_text().splitlines()
+    assert [json.loads(line) for line in spilled] == files
+
+
+def test_nested_bulk_spills_the_whole_payload(tmp_path):
+    # Many small fields: nothing to cut individually
+    output = {"status": "FAIL", "tests": {f"test_{i}": {"status": "PASS", "error": ""} for i in range(400)}}
+    shaper = ToolOutputShaper()
+    token = set_workspace(str(tmp_path))
+    try:
+        shaped = json.loads(asyncio.run(shaper.shape("evaluator", output)))
+    finally:
+        reset_workspace(token)
+
+    assert shaped["status"] == "FAIL" and len(shaped["preview"]) == shaper.budget_chars("evaluator")
+    assert json.loads((tmp_path / shaped["full_output"]["output"]).read_text()) == output
+
+
+def test_non_ascii_text_is_measured_and_sent_unescaped():
+    shaper = ToolOutputShaper()
+    # Within budget as sent, though \\u escapes would make it six times longer
+    output = {"status": "success", "stdout": "数据" * (shaper.budget_chars("shell_tool") // 3)}
+    shaped = asyncio.run(shaper.shape("shell_tool", output))
+    assert json.loads(shaped) == output and "数据" in shaped
@@ -0,0 +1,139 @@
+import os
+import asyncio
+
+import pytest
+
+pytest.importorskip("pypdf")
+
+from novalm.config.settings import settings
+from novalm.core.tools import pdf_reader
+from novalm.core.tools.pdf_reader import PDFReaderTool
+from novalm.core.workspace import set_workspace
+
+
+def _write_pdf(path, pages):
+    """Minimal PDF with one line of Helvetica text per page."""
+    count = len(pages)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{4 + 2 * i} 0 R" for i in range(count)), count)).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {5 + 2 * i} 0 R /Resources << /Font << /F1 3 0 R >> >> >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PDF_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(settings, "PDF_PAGES_PER_TASK", 2)
+    root = tmp_path / "work"
+    root.mkdir()
+    _write_pdf(root / "report.pdf", [f"Report page {i}" for i in range(7)])
+    yield root
+    pdf_reader.shutdown_pdf_pool()
+
+
+def _run(root, *calls):
+    async def scenario():
+        set_workspace(str(root))
+        tool = PDFReaderTool()
+        return [await tool.run(call) for call in calls]
+    return asyncio.run(scenario())
+
+
+def test_page_windows_and_next_page_start(workspace):
+    first, rest, ranged, tail = _run(
+        workspace,
+        {"filename": "report.pdf", "max_pages": 3},
+        {"filename": "report.pdf", "page_start": 3, "max_pages": 10},
+        {"filename": "report.pdf", "page_start": 1, "page_end": 5, "max_pages": 2},
+        {"filename": "report.pdf", "page_start": 5, "page_end": 6},
+    )
+    assert (first["page_start"], first["page_end"], first["total_pages"]) == (0, 3, 7)
+    assert first["next_page_start"] == 3
+    assert "--- Page 1 ---\nReport page 0" in first["content"] and "Report page 3" not in first["content"]
+
+    # Reads to the end: nothing further to page through
+    assert (rest["page_start"], rest["page_end"]) == (3, 7) and "next_page_start" not in rest
+    assert "Report page 6" in rest["content"]
+
+    # An explicit page_end bounds pagination as well
+    assert (ranged["page_start"], ranged["page_end"], ranged["next_page_start"]) == (1, 3, 3)
+    assert "Report page 1" in ranged["content"] and "Report page 3" not in ranged["content"]
+    assert (tail["page_end"], "next_page_start" in tail) == (6, False)
+
+
+def _cached_documents():
+    """Cache entry name -> text of its first page."""
+    root = settings.PDF_CACHE_DIR
+    return {name: open(os.path.join(root, name, "0.txt")).read() for name in os.listdir(root)}
+
+
+def test_cache_is_keyed_by_content_and_shared_across_copies(workspace, monkeypatch):
+    _run(workspace, {"filename": "report.pdf"})
+    assert list(_cached_documents().values()) == ["Report page 0"]
+
+    def no_parsing(*args):
+        raise AssertionError("cached PDF was read again")
+
+    # Repeat reads of an unchanged file only stat it
+    with monkeypatch.context() as m:
+        m.setattr(pdf_reader, "_extract_page_range", no_parsing)
+        m.setattr(pdf_reader, "PdfReader", no_parsing)
+        m.setattr(pdf_reader, "_hash_file", no_parsing)
+        (again,) = _run(workspace, {"filename": "report.pdf", "page_start": 2, "max_pages": 2})
+    assert "Report page 2" in again["content"]
+
+    # Another session's copy (new path and mtime) hits the same entry
+    session = workspace.parent / "session"
+    session.mkdir()
+    (session / "report.pdf").write_bytes((workspace / "report.pdf").read_bytes())
+    with monkeypatch.context() as m:
+        m.setattr(pdf_reader, "_extract_page_range", no_parsing)
+        m.setattr(pdf_reader, "PdfReader", no_parsing)
+        (copy,) = _run(session, {"filename": "report.pdf", "max_pages": 2})
+    assert "Report page 1" in copy["content"]
+    assert len(_cached_documents()) == 1
+
+    # A changed file gets a fresh entry
+    _write_pdf(workspace / "report.pdf", ["Revised page 0", "Revised page 1"])
+    (revised,) = _run(workspace, {"filename": "report.pdf"})
+    assert revised["total_pages"] == 2 and "Revised page 1" in revised["content"]
+    assert sorted(_cached_documents().values()) == ["Report page 0", "Revised page 0"]
+
+
+def test_extraction_workers_are_not_forked_from_the_server():
+    try:
+        assert pdf_reader._get_process_pool()._mp_context.get_start_method() in ("forkserver", "spawn")
+    finally:
+        pdf_reader.shutdown_pdf_pool()
+
+
+def test_cache_evicts_least_recently_read_documents(workspace, monkeypatch):
+    for name in ("a", "b", "c"):
+        _write_pdf(workspace / f"{name}.pdf", [f"{name} page {i}" for i in range(3)])
+
+    _run(workspace, {"filename": "a.pdf"}, {"filename": "b.pdf"})
+    entries = {text: name for name, text in _cached_documents().items()}
+    for name in entries.values():
+        os.utime(os.path.join(settings.PDF_CACHE_DIR, name), (1, 1))
+    # Room for two documents; reading a.pdf again makes b.pdf the least recently read
+    size = sum(f.stat().st_size for f in os.scandir(os.path.join(settings.PDF_CACHE_DIR, entries["a page 0"])))
+    monkeypatch.setattr(settings, "PDF_CACHE_MAX_BYTES", 2 * size + 10)
+    _run(workspace, {"filename": "a.pdf"}, {"filename": "c.pdf"})
+
+    assert sorted(_cached_documents().values()) == ["a page 0", "c page 0"]
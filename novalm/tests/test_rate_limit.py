@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from novalm.fastapi_app.middleware.rate_limit import RateLimiter, RateLimitMiddleware, client_id_for
+
+
+class ScriptedLimiter(RateLimiter):
+    """Replays canned script results instead of calling Redis."""
+    def __init__(self, replies, **kwargs):
+        super().__init__(**kwargs)
+        self.replies = list(replies)
+        self.calls = []
+
+    async def _call(self, client_id, want, charge):
+        self.calls.append((client_id, want, charge))
+        return self.replies.pop(0)
+
+
+def test_lease_admits_locally_until_used_up():
+    limiter = ScriptedLimiter([[3, 50, 1000, 0], [0, 0, 1000, 2500]], requests_per_minute=60, lease=3)
+
+    async def scenario():
+        return [await limiter.acquire("key:a") for _ in range(4)]
+
+    decisions = asyncio.run(scenario())
+    assert decisions[:3] == [(True, 0.0)] * 3
+    assert decisions[3] == (False, 2.5)
+    # One Redis call for the lease, one once it ran out
+    assert len(limiter.calls) == 2
+
+
+def test_spent_token_budget_drops_the_local_lease():
+    limiter = ScriptedLimiter([[3, 50, 1000, 0], [0, -1, -20, 0], [0, -1, -20, 1200]], lease=3)
+
+    async def scenario():
+        first = await limiter.acquire("key:a")
+        await limiter.charge_tokens("key:a", 1020)
+        second = await limiter.acquire("key:a")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == (True, 0.0) and second == (False, 1.2)
+    assert limiter.calls[1] == ("key:a", 0, 1020)
+
+
+def test_middleware_returns_429_with_retry_after():
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    app.add_middleware(RateLimitMiddleware, limiter=ScriptedLimiter([[1, 0, 1000, 0], [0, 0, 1000, 1500]], lease=1))
+    client = TestClient(app)
+    assert client.get("/ping").status_code == 200
+    limited = client.get("/ping")
+    assert limited.status_code == 429 and limited.headers["Retry-After"] == "2"
+
+
+def test_client_id_hashes_api_keys():
+    assert client_id_for({"state": {"api_key": "secret"}, "client": ("1.2.3.4", 1)}).startswith("key:")
+    assert "secret" not in client_id_for({"state": {"api_key": "secret"}})
+    assert client_id_for({"client": ("1.2.3.4", 1)}) == "ip:1.2.3.4"
+
+
+def test_token_bucket_script_on_redis():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from novalm.fastapi_app.middleware.rate_limit import TOKEN_BUCKET_LUA
+
+    async def scenario():
+        server = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        limiter = RateLimiter(requests_per_minute=6, tokens_per_minute=600, lease=2)
+        # Already connected: _connect() keeps this client
+        limiter.redis = server
+        limiter._script = server.register_script(TOKEN_BUCKET_LUA)
+        results = {}
+
+        # Full bucket (6 >= 2 * lease): a whole lease per round trip
+        results["lease"] = await limiter._call("key:a", 1, 0)
+        results["lease_again"] = await limiter._call("key:a", 1, 0)
+        # 2 left: below twice the lease, so only the one request asked for
+        results["single"] = await limiter._call("key:a", 1, 0)
+        results["single_again"] = await limiter._call("key:a", 1, 0)
+        results["empty"] = await limiter._call("key:a", 1, 0)
+
+        # Half a minute ago refills half the bucket (3 requests)
+        ts = int(await server.hget("rate_limit:key:a:req", "ts"))
+        await server.hset("rate_limit:key:a:req", "ts", ts - 30000)
+        results["refilled"] = await limiter._call("key:a", 1, 0)
+
+        # Charge-only calls take no request and overdraw the token budget down to -capacity
+        results["charge"] = await limiter._call("key:b", 0, 900)
+        results["overdrawn"] = await limiter._call("key:b", 1, 0)
+        results["floor"] = await limiter._call("key:b", 0, 5000)
+        results["requests_b"] = await server.exists("rate_limit:key:b:req")
+        return results
+
+    r = asyncio.run(scenario())
+    assert r["lease"] == [2, 4, 600, 0]
+    assert r["lease_again"][:2] == [2, 2]
+    assert r["single"][:2] == [1, 1]
+    assert r["single_again"][:2] == [1, 0]
+    granted, left, _, retry_ms = r["empty"]
+    # One request at 6/minute refills in 10s
+    assert granted == 0 and left == 0 and 9000 < retry_ms <= 10000
+    assert r["refilled"][:2] == [1, 2]
+
+    assert r["charge"] == [0, -1, -300, 0]
+    granted, _, budget, retry_ms = r["overdrawn"]
+    # 300 tokens owed at 600/minute: 30s until requests are admitted again
+    assert granted == 0 and budget <= -299 and 29000 < retry_ms <= 30100
+    assert r["floor"][2] == -600
+    assert r["requests_b"] == 0
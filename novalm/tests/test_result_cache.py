@@ -0,0 +1,94 @@
+import os
+
+from novalm.core.tools.base import Tool, file_fingerprint
+from novalm.core.tools.result_cache import ToolResultCache
+
+
+class ReadTool(Tool):
+    """Cacheable while the file it reads exists; the mode "write" never is."""
+    name = "read_tool"
+    cacheable = True
+
+    async def run(self, input_data):
+        raise NotImplementedError
+
+    def cache_fingerprint(self, input_data):
+        if input_data.get("mode") == "write":
+            return None
+        return file_fingerprint(input_data["path"])
+
+
+class ClockTool(ReadTool):
+    name = "clock_tool"
+    cacheable = False
+
+
+def test_entries_are_invalidated_when_the_file_changes(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("v1")
+    cache, tool = ToolResultCache(max_entries=10, max_bytes=10_000), ReadTool()
+    call = {"path": str(path), "offset": None}
+
+    cache.set(tool, call, {"status": "success", "content": "v1"})
+    # Unset args and key order do not change the key
+    assert cache.get(tool, {"path": str(path)}) == {"status": "success", "content": "v1"}
+    # Callers get a copy
+    cache.get(tool, call)["content"] = "mutated"
+    assert cache.get(tool, call)["content"] == "v1"
+
+    path.write_text("v2 longer")
+    assert cache.get(tool, call) is None
+    cache.set(tool, call, {"status": "success", "content": "v2 longer"})
+    # Same size, new mtime
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert cache.get(tool, call) is None
+
+
+def test_uncacheable_calls_and_failures_are_not_stored(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("v1")
+    cache = ToolResultCache(max_entries=10, max_bytes=10_000)
+    ok = {"status": "success", "content": "v1"}
+
+    cache.set(ClockTool(), {"path": str(path)}, ok)
+    cache.set(ReadTool(), {"path": str(path), "mode": "write"}, ok)
+    cache.set(ReadTool(), {"path": str(tmp_path / "missing.txt")}, ok)
+    cache.set(ReadTool(), {"path": str(path)}, {"status": "error", "output": "boom"})
+    cache.set(ReadTool(), {"path": str(path), "n": 1}, {"error": "timeout"})
+    cache.set(ReadTool(), {"path": str(path), "n": {1, 2}}, ok)
+    assert len(cache._entries) == 0 and cache._bytes == 0
+    assert cache.get(ClockTool(), {"path": str(path)}) is None
+
+
+def test_lru_eviction_by_entries_and_bytes(tmp_path):
+    tool = ReadTool()
+    paths = []
+    for name in "abcd":
+        (tmp_path / name).write_text(name)
+        paths.append({"path": str(tmp_path / name)})
+    a, b, c, d = paths
+
+    cache = ToolResultCache(max_entries=2, max_bytes=10_000)
+    cache.set(tool, a, {"content": "a"})
+    cache.set(tool, b, {"content": "b"})
+    assert cache.get(tool, a) is not None
+    cache.set(tool, c, {"content": "c"})
+    # b was least recently used
+    assert cache.get(tool, b) is None
+    assert cache.get(tool, a) is not None and cache.get(tool, c) is not None
+
+    entry = {"content": "x" * 80}
+    size = len('{"content": ""}') + 80
+    cache = ToolResultCache(max_entries=10, max_bytes=2 * size + 10)
+    cache.set(tool, a, entry)
+    cache.set(tool, b, entry)
+    # Rewriting a key replaces its size instead of adding to it
+    cache.set(tool, b, entry)
+    assert cache._bytes == 2 * size
+    cache.set(tool, c, entry)
+    assert cache.get(tool, a) is None and cache._bytes == 2 * size
+    # A single result over the byte budget is not cached and evicts nothing
+    cache.set(tool, d, {"content": "x" * 1000})
+    assert cache.get(tool, d) is None
+    assert cache.get(tool, b) is not None and cache.get(tool, c) is not None
@@ -0,0 +1,141 @@
+import os
+import asyncio
+import time
+
+from prometheus_client import REGISTRY
+
+from novalm.config.settings import settings
+from novalm.core.sandbox import SandboxPool
+
+
+def test_sandbox_captures_output_and_errors():
+    async def scenario():
+        pool = SandboxPool(size=1, max_runs=10, timeout=10, max_output=50)
+        try:
+            ok = await pool.run("print('hello')")
+            err = await pool.run("raise ValueError('boom')")
+            big = await pool.run("print('x' * 500)")
+            net = await pool.run("import socket; socket.create_connection(('127.0.0.1', 9))")
+            return ok, err, big, net
+        finally:
+            pool.shutdown()
+
+    ok, err, big, net = asyncio.run(scenario())
+    assert ok["status"] == "success" and ok["stdout"] == "hello\n"
+    assert err["status"] == "error" and "ValueError: boom" in err["result_summary"]
+    assert big["truncated"] and len(big["stdout"]) == 50
+    assert net["status"] == "error" and "PermissionError" in net["result_summary"]
+
+def test_sandbox_timeout_replaces_worker():
+    async def scenario():
+        pool = SandboxPool(size=1, max_runs=10, timeout=1, cpu_seconds=0)
+        try:
+            timed_out = await pool.run("import time; time.sleep(30)")
+            after = await pool.run("print('still works')")
+            return timed_out, after
+        finally:
+            pool.shutdown()
+
+    timed_out, after = asyncio.run(scenario())
+    assert "timed out" in timed_out["result_summary"]
+    assert after["stdout"] == "still works\n"
+
+
+def _samples(name):
+    return REGISTRY.get_sample_value(f"{name}_count") or 0.0, REGISTRY.get_sample_value(f"{name}_sum") or 0.0
+
+
+def test_workers_fork_from_a_preloaded_template(monkeypatch):
+    monkeypatch.setattr(settings, "SANDBOX_START_METHOD", "forkserver")
+    monkeypatch.setattr(settings, "SANDBOX_PRELOAD_MODULES", ["colorsys", "no_such_module_for_sandbox_tests"])
+    code = "import os, sys; print(os.getppid(), 'colorsys' in sys.modules)"
+
+    async def scenario():
+        pool = SandboxPool(size=2, max_runs=1, timeout=10)
+        try:
+            return pool, [await pool.run(code) for _ in range(3)]
+        finally:
+            pool.shutdown()
+
+    pool, results = asyncio.run(scenario())
+    assert pool._ctx.get_start_method() == "forkserver"
+    parents = set()
+    for result in results:
+        assert result["status"] == "success"
+        ppid, preloaded = result["stdout"].split()
+        # A missing preload module is skipped, the others are imported
+        assert preloaded == "True"
+        parents.add(int(ppid))
+    # Every worker (recycled after each run here) is a child of the template, not of the server
+    assert len(parents) == 1 and os.getpid() not in parents
+
+
+def test_unavailable_start_method_falls_back_to_spawn(monkeypatch):
+    monkeypatch.setattr(settings, "SANDBOX_START_METHOD", "no-such-method")
+
+    async def scenario():
+        pool = SandboxPool(size=1, max_runs=10, timeout=30)
+        try:
+            return pool, await pool.run("import os; print(os.getppid())")
+        finally:
+            pool.shutdown()
+
+    pool, result = asyncio.run(scenario())
+    assert pool._ctx.get_start_method() == "spawn"
+    assert result["stdout"] == f"{os.getpid()}\n"
+
+
+def test_startup_is_measured_once_per_worker():
+    startup_before = _samples("novalm_sandbox_worker_startup_seconds")
+    runs_before = _samples("novalm_sandbox_run_seconds")
+
+    async def scenario():
+        pool = SandboxPool(size=2, max_runs=10, timeout=10)
+        try:
+            pool.start()
+            # Idle time before the first run is not startup time
+            await asyncio.sleep(0.5)
+            await asyncio.gather(*(pool.run("print(1)") for _ in range(2)))
+            await asyncio.gather(*(pool.run("print(2)") for _ in range(2)))
+        finally:
+            pool.shutdown()
+
+    asyncio.run(scenario())
+    count, total = _samples("novalm_sandbox_worker_startup_seconds")
+    assert count - startup_before[0] == 2
+    assert 0 < total - startup_before[1] < 1.0
+    assert _samples("novalm_sandbox_run_seconds")[0] - runs_before[0] == 4
+
+
+def test_replacing_a_worker_does_not_block_the_event_loop(monkeypatch):
+    from novalm.core import sandbox
+
+    real_kill = sandbox._Worker.kill
+
+    def slow_kill(self):
+        time.sleep(0.5)
+        real_kill(self)
+
+    monkeypatch.setattr(sandbox._Worker, "kill", slow_kill)
+
+    async def scenario():
+        pool = SandboxPool(size=1, max_runs=10, timeout=1, cpu_seconds=0)
+        ticks = []
+
+        async def heartbeat():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.05)
+
+        beat = asyncio.create_task(heartbeat())
+        try:
+            result = await pool.run("import time; time.sleep(30)")
+            await asyncio.sleep(0.1)
+        finally:
+            beat.cancel()
+            await asyncio.to_thread(pool.shutdown)
+        return result, max(b - a for a, b in zip(ticks, ticks[1:]))
+
+    result, longest_gap = asyncio.run(scenario())
+    assert "timed out" in result["result_summary"]
+    assert longest_gap < 0.3
@@ -0,0 +1,92 @@
+import time
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from novalm.config.settings import settings
+from novalm.core.semantic_cache import SemanticCache
+from novalm.core.types import SamplingParams
+from novalm.core.vector_store import NumpyVectorClient
+
+
+def embed(input):
+    """Bag-of-words hashed into 64 dims: same words, same vector."""
+    vectors = []
+    for text in input:
+        v = np.zeros(64, dtype=np.float32)
+        for word in text.lower().split():
+            v[int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+        vectors.append((v / (np.linalg.norm(v) or 1.0)).tolist())
+    return vectors
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_THRESHOLD", 0.95)
+    memory = SimpleNamespace(client=NumpyVectorClient(str(tmp_path / "vectors")), ef=embed)
+    cache = SemanticCache(memory)
+    assert cache.enabled
+    return cache
+
+
+def test_hit_miss_and_scope_isolation(cache):
+    cache.set("what is the capital of france", "Paris", "m", None, system_prompt="be brief")
+
+    # Word order differs, embedding does not
+    assert cache.get("the capital of france is what", "m", None, system_prompt="be brief") == "Paris"
+    assert cache.get("how do I sort a list in python", "m", None, system_prompt="be brief") is None
+    # Another model, preset or system prompt never sees the entry
+    assert cache.get("what is the capital of france", "other", None, system_prompt="be brief") is None
+    assert cache.get("what is the capital of france", "m", "coding", system_prompt="be brief") is None
+    assert cache.get("what is the capital of france", "m", None, system_prompt="be verbose") is None
+
+
+def test_sampling_params_are_part_of_the_scope(cache):
+    greedy = SamplingParams(temperature=0.0)
+    cache.set("write a haiku about rain", "Grey sky", "m", None, sampling_params=greedy)
+
+    assert cache.get("write a haiku about rain", "m", None, sampling_params=SamplingParams(temperature=0.0)) == "Grey sky"
+    assert cache.get("write a haiku about rain", "m", None, sampling_params=SamplingParams(temperature=1.2)) is None
+    assert cache.get("write a haiku about rain", "m", None, sampling_params=SamplingParams(temperature=0.0, max_tokens=16)) is None
+    # Self-correction budget doesn't change what is generated
+    assert cache.get(
+        "write a haiku about rain", "m", None, sampling_params=SamplingParams(temperature=0.0, max_debug_attempts=1)
+    ) == "Grey sky"
+
+
+def test_expired_entries_are_hidden_then_deleted(cache, monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_TTL", -1)
+    cache._last_purge = time.time()  # Within the purge interval: nothing swept yet
+    cache.set("stale question", "stale answer", "m", None)
+    assert cache.get("stale question", "m", None) is None
+    assert cache.collection.count() == 1
+
+    # The next write after the purge interval sweeps expired entries
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_TTL", 3600)
+    cache._last_purge = 0.0
+    cache.set("fresh question", "fresh answer", "m", None)
+    assert cache.collection.count() == 1
+    assert cache.get("fresh question", "m", None) == "fresh answer"
+
+
+def test_entry_cap_evicts_oldest(cache, monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_MAX_ENTRIES", 10)
+    for i in range(12):
+        cache.set(f"question number {i}", f"answer {i}", "m", None)
+    assert cache.collection.count() <= 10
+    assert cache.get("question number 11", "m", None) == "answer 11"
+    assert cache.get("question number 0", "m", None) is None
+
+
+def test_verification_sampling_and_false_hits(cache, monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_VERIFY_RATE", 1.0)
+    assert cache.should_verify()
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_VERIFY_RATE", 0.0)
+    assert not cache.should_verify()
+
+    assert cache.record_verification("paris is the capital", "the capital is paris", "m", None) is False
+    assert cache.record_verification("paris is the capital", "use sorted() on the list", "m", None) is True
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from novalm.core.types import ChatMessage, ChatCompletionResponseChunk
+from novalm.config.settings import settings
+from novalm.core.sessions import SessionRegistry, OffsetExpired, get_session_control, reap_loop
+
+
+def chunk(text):
+    return ChatCompletionResponseChunk(id="c", created=0, model="m", choices=[{"index": 0, "delta": {"content": text}}])
+
+
+async def fake_agent(steps, seen):
+    """Stands in for Orchestrator.handle_chat: checkpoints between steps like the real loops."""
+    messages = []
+    for step in range(steps):
+        await get_session_control().checkpoint(messages)
+        seen.append([m.content for m in messages])
+        yield chunk(f"step{step}")
+        await asyncio.sleep(0.01)
+
+
+def test_session_buffers_chunks_for_resume_and_applies_controls():
+    async def scenario():
+        registry = SessionRegistry()
+        seen = []
+        finished = []
+
+        async def on_finish(session):
+            finished.append(session.next_offset)
+
+        session = registry.start(fake_agent(3, seen), "key:a", on_finish=on_finish)
+        first, _ = await session.read_from(0)
+        session.control.pause()
+        session.control.inject(ChatMessage(role="user", content="use numpy"))
+        await asyncio.sleep(0.05)
+        paused_at = session.next_offset
+        session.control.resume()
+
+        # A client re-attaching from offset 1 gets everything from there on
+        resumed = []
+        offset = 1
+        while True:
+            chunks, done = await session.read_from(offset)
+            resumed += [payload for _, payload in chunks]
+            offset += len(chunks)
+            if done:
+                break
+        return first, paused_at, resumed, seen, finished, session
+
+    first, paused_at, resumed, seen, finished, session = asyncio.run(scenario())
+    assert len(first) == 1 and paused_at == 1
+    assert len(resumed) == 2 and "step2" in resumed[-1]
+    assert seen[1] == ["use numpy"]
+    assert finished == [3] and session.done and session.error is None
+
+
+def test_cancel_and_expired_offsets():
+    async def scenario():
+        registry = SessionRegistry()
+        session = registry.start(fake_agent(100, []), "key:a")
+        session._chunks = type(session._chunks)(maxlen=2)
+        await asyncio.sleep(0.05)
+        session.cancel()
+        await session.task
+        with pytest.raises(OffsetExpired):
+            await session.read_from(0)
+        return session
+
+    session = asyncio.run(scenario())
+    assert session.done and session.error == "cancelled"
+
+
+def test_reaper_cancels_abandoned_paused_sessions_and_closes_them(monkeypatch):
+    monkeypatch.setattr(settings, "WS_SESSION_DETACHED_TIMEOUT", 0.05)
+    monkeypatch.setattr(settings, "WS_SESSION_TTL", 0.05)
+    cleaned = []
+
+    async def agent():
+        try:
+            async for item in fake_agent(100, []):
+                yield item
+        finally:
+            cleaned.append(True)
+
+    async def scenario():
+        registry = SessionRegistry()
+        reaper = asyncio.create_task(reap_loop(registry, 0.02))
+        session = registry.start(agent(), "key:a")
+        await session.read_from(0)
+        # Client pauses, then disappears; nothing else touches the registry
+        session.control.pause()
+        await asyncio.wait_for(session.task, timeout=2)
+        await asyncio.sleep(0.15)
+        reaper.cancel()
+        return registry, session
+
+    registry, session = asyncio.run(scenario())
+    assert session.done and session.error == "cancelled"
+    assert cleaned == [True]
+    assert registry._sessions == {}
@@ -0,0 +1,87 @@
+import os
+import time
+import asyncio
+
+from novalm.config.settings import settings
+from novalm.core.tools.shell import ShellTool, _HeadTailBuffer
+from novalm.core.tools.scheduler import ToolScheduler
+from novalm.core.workspace import set_workspace
+
+
+def test_head_tail_buffer_keeps_both_ends():
+    buffer = _HeadTailBuffer(head_bytes=4, tail_bytes=3)
+    for chunk in (b"ab", b"cdef", b"ghij", b"k"):
+        buffer.write(chunk)
+    assert (bytes(buffer.head), bytes(buffer.tail), buffer.total) == (b"abcd", b"ijk", 11)
+    assert buffer.truncated
+    assert buffer.text() == "abcd\n... [4 bytes truncated] ...\nijk"
+
+    small = _HeadTailBuffer(head_bytes=4, tail_bytes=3)
+    small.write(b"abcdef")
+    assert not small.truncated and small.text() == "abcdef"
+
+    head_only = _HeadTailBuffer(head_bytes=2, tail_bytes=0)
+    head_only.write(b"xyz")
+    assert head_only.text() == "xy\n... [1 bytes truncated] ...\n"
+
+
+def test_large_output_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SHELL_OUTPUT_HEAD_BYTES", 10)
+    monkeypatch.setattr(settings, "SHELL_OUTPUT_TAIL_BYTES", 10)
+    (tmp_path / "big.txt").write_text("start" + "x" * 200_000 + "end")
+
+    async def scenario():
+        set_workspace(str(tmp_path))
+        return await ShellTool().run({"command": "cat big.txt"})
+
+    result = asyncio.run(scenario())
+    assert result["status"] == "success" and result["truncated"]
+    assert result["stdout"].startswith("startxxxxx") and result["stdout"].endswith("xxxxxxxend")
+
+
+def _gone(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Killed but not reaped yet (reparented outside our process)
+            return f.read().split(") ")[1].startswith("Z")
+    except FileNotFoundError:
+        return True
+
+
+def test_deadline_kills_the_whole_process_group(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SHELL_TIMEOUT", 0.5)
+    # The whitelist only checks the first word; the background child would outlive a plain kill
+    command = "echo started; sh -c 'echo $$ > child.pid; exec sleep 30' & sleep 30"
+
+    async def scenario():
+        set_workspace(str(tmp_path))
+        began = time.monotonic()
+        result = await ShellTool().run({"command": command})
+        return result, time.monotonic() - began
+
+    result, elapsed = asyncio.run(scenario())
+    assert elapsed < 5
+    assert result["status"] == "error" and result["stdout"] == "started\n"
+    assert "killed after 0.5s timeout" in result["stderr"]
+
+    child = int((tmp_path / "child.pid").read_text())
+    deadline = time.monotonic() + 5
+    while not _gone(child) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert _gone(child)
+
+
+def test_concurrency_is_limited_by_the_tool_scheduler(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SHELL_MAX_CONCURRENCY", 1)
+    assert ShellTool().max_concurrency == 1
+
+    async def scenario():
+        set_workspace(str(tmp_path))
+        scheduler, tool = ToolScheduler(), ShellTool()
+        began = time.monotonic()
+        results = await asyncio.gather(*(scheduler.run(tool, {"command": "echo hi; sleep 0.3"}) for _ in range(2)))
+        return results, time.monotonic() - began
+
+    results, elapsed = asyncio.run(scenario())
+    assert [r["stdout"] for r in results] == ["hi\n", "hi\n"]
+    assert elapsed >= 0.6
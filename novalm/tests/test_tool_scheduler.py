@@ -0,0 +1,51 @@
+import asyncio
+
+from novalm.core.tools.base import Tool
+from novalm.core.tools.scheduler import ToolScheduler, PRIORITY_INTERACTIVE, PRIORITY_AGENT
+
+
+class SlowTool(Tool):
+    def __init__(self, name, max_concurrency=None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.running = 0
+        self.peak = 0
+        self.order = []
+
+    async def run(self, input_data):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        self.order.append(input_data["tag"])
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return {"status": "success"}
+
+
+def test_scheduler_enforces_per_tool_and_global_limits():
+    async def scenario():
+        scheduler = ToolScheduler(global_limit=3, per_tool_limits={})
+        limited = SlowTool("limited", max_concurrency=1)
+        free = SlowTool("free")
+        await asyncio.gather(
+            *[scheduler.run(limited, {"tag": i}) for i in range(4)],
+            *[scheduler.run(free, {"tag": i}) for i in range(6)]
+        )
+        return limited.peak, free.peak
+
+    limited_peak, free_peak = asyncio.run(scenario())
+    assert limited_peak == 1
+    assert free_peak <= 2
+
+def test_scheduler_prefers_interactive_calls():
+    async def scenario():
+        scheduler = ToolScheduler(global_limit=1, per_tool_limits={})
+        tool = SlowTool("t")
+        first = asyncio.create_task(scheduler.run(tool, {"tag": "first"}))
+        await asyncio.sleep(0)
+        agents = [asyncio.create_task(scheduler.run(tool, {"tag": "agent"}, "s1", PRIORITY_AGENT)) for _ in range(2)]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(scheduler.run(tool, {"tag": "interactive"}, "s2", PRIORITY_INTERACTIVE))
+        await asyncio.gather(first, interactive, *agents)
+        return tool.order
+
+    assert asyncio.run(scenario()) == ["first", "interactive", "agent", "agent"]
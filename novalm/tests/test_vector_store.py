@@ -0,0 +1,82 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from novalm.core import vector_store
+from novalm.core.vector_store import NumpyVectorClient
+
+
+def _collection(path, **kwargs):
+    return NumpyVectorClient(str(path), **kwargs).get_or_create_collection(
+        "test", metadata={"hnsw:space": "cosine"}
+    )
+
+def test_query_returns_nearest_and_filters(tmp_path):
+    col = _collection(tmp_path)
+    vectors = np.eye(4, dtype=np.float32)
+    col.add(
+        ids=["a", "b", "c", "d"],
+        documents=["A", "B", "C", "D"],
+        metadatas=[{"k": 1}, {"k": 2}, {"k": 1}, {"k": 2}],
+        embeddings=vectors
+    )
+
+    res = col.query(query_embeddings=[vectors[2]], n_results=2)
+    assert res["ids"][0][0] == "c"
+    assert res["distances"][0][0] == pytest.approx(0.0, abs=1e-6)
+
+    res = col.query(query_embeddings=[vectors[2]], n_results=1, where={"k": 2})
+    assert res["ids"][0][0] in ("b", "d")
+
+def test_delete_and_reopen_read_only(tmp_path):
+    col = _collection(tmp_path)
+    vectors = np.eye(3, dtype=np.float32)
+    col.add(ids=["a", "b", "c"], documents=["A", "B", "C"], embeddings=vectors)
+    col.delete(ids=["a"])
+
+    snapshot = _collection(tmp_path, read_only=True)
+    assert snapshot.count() == 2
+    assert snapshot.query(query_embeddings=[vectors[2]], n_results=1)["ids"][0] == ["c"]
+    with pytest.raises(RuntimeError):
+        snapshot.add(ids=["d"], documents=["D"], embeddings=vectors[:1])
+
+def test_graph_index_recall(tmp_path, monkeypatch):
+    from novalm.config.settings import settings
+    monkeypatch.setattr(settings, "VECTOR_INDEX_GRAPH_THRESHOLD", 200)
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((500, 16)).astype(np.float32)
+    col = _collection(tmp_path)
+    col._maybe_build_graph = lambda: None  # Build synchronously below
+    col.add(ids=[str(i) for i in range(500)], documents=[""] * 500, embeddings=vectors)
+    col._graph_building = True
+    col._build_graph()
+    assert col._graph_ready
+
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    hits = 0
+    for _ in range(20):
+        q = rng.standard_normal(16).astype(np.float32)
+        exact = {str(i) for i in np.argsort(-(normed @ q))[:5]}
+        hits += len(exact & set(col.query(query_embeddings=[q], n_results=5)["ids"][0]))
+    assert hits / 100 > 0.8
+
+
+def test_record_log_is_compacted_and_replays_the_same_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "_LOG_COMPACT_MIN_ENTRIES", 4)
+    col = _collection(tmp_path)
+    vectors = np.eye(4, dtype=np.float32)
+    col.add(ids=["a", "b", "c", "d"], documents=["A", "B", "C", "D"], embeddings=vectors)
+    col.delete(ids=["a"])
+    # Memory compaction rewrites every kept record's metadata on each run
+    for run in range(5):
+        col.update(ids=["b", "c", "d"], metadatas=[{"run": run}] * 3)
+
+    log = (tmp_path / "test" / "records.jsonl").read_text().splitlines()
+    assert len(log) <= 2 * col.count()
+
+    reopened = _collection(tmp_path, read_only=True)
+    assert reopened.ids == col.ids == ["d", "b", "c"]
+    assert reopened.get(include=["documents", "metadatas"]) == col.get(include=["documents", "metadatas"])
+    assert reopened.get(ids=["c"], include=["metadatas"])["metadatas"] == [{"run": 4}]
+    assert reopened.query(query_embeddings=[vectors[3]], n_results=1)["ids"] == [["d"]]
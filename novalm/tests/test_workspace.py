@@ -0,0 +1,124 @@
+import os
+import asyncio
+
+from novalm.core.tools.file_system import FileTool
+from novalm.config.settings import settings
+from novalm.core.sandbox import SandboxPool
+from novalm.core.tools import python_exec
+from novalm.core.tools.python_exec import PythonExecTool
+from novalm.core.tools.shell import ShellTool
+from novalm.core import workspace
+from novalm.core.workspace import WorkspaceManager, set_workspace, session_usage, resolve_in_workspace, check_quota
+
+
+def test_session_workspaces_are_isolated_from_base_and_each_other(tmp_path):
+    base = tmp_path / "base"
+    (base / "src").mkdir(parents=True)
+    (base / "src" / "main.py").write_text("print('base')\n")
+    manager = WorkspaceManager(base_dir=str(base), sessions_dir=str(tmp_path / "sessions"))
+    tool = FileTool()
+
+    async def session(name, content):
+        path = await manager.create(name)
+        set_workspace(path)
+        await tool.run({"operation": "write", "filename": "src/main.py", "content": content})
+        read = await tool.run({"operation": "read", "filename": "src/main.py"})
+        return path, read["content"]
+
+    async def scenario():
+        return await asyncio.gather(session("a", "print('a')\n"), session("b", "print('b')\n"))
+
+    (path_a, content_a), (path_b, content_b) = asyncio.run(scenario())
+    assert content_a == "print('a')\n" and content_b == "print('b')\n"
+    assert (base / "src" / "main.py").read_text() == "print('base')\n"
+    # The rewrite shrank the file; the session holds nothing beyond its clone
+    assert session_usage(path_a) == 0
+
+    asyncio.run(manager.teardown("a"))
+    assert not os.path.exists(path_a)
+
+
+def test_in_place_writes_by_code_and_commands_never_reach_the_base(tmp_path, monkeypatch):
+    base = tmp_path / "base"
+    base.mkdir()
+    (base / "f.txt").write_text("base\n")
+    base_mode = os.stat(base / "f.txt").st_mode
+    manager = WorkspaceManager(base_dir=str(base), sessions_dir=str(tmp_path / "sessions"))
+    pool = SandboxPool(size=1, max_runs=10, timeout=10)
+    monkeypatch.setattr(python_exec, "get_sandbox_pool", lambda: pool)
+    monkeypatch.setattr(settings, "WORKSPACE_QUOTA_BYTES", 64)
+
+    async def scenario():
+        path = await manager.create("s")
+        set_workspace(path)
+        ran = await PythonExecTool().run({"code": "open('f.txt', 'a').write('from code\\n')"})
+        shelled = await ShellTool().run({"command": "echo from shell >> f.txt"})
+        usage = session_usage(path)
+        # Past the quota, neither tool starts
+        (tmp_path / "sessions" / "s" / "big.bin").write_bytes(b"x" * 100)
+        refused = await ShellTool().run({"command": "echo more >> f.txt"})
+        return path, ran, shelled, usage, refused
+
+    try:
+        path, ran, shelled, usage, refused = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+    assert ran["status"] == "success" and shelled["status"] == "success"
+    assert open(os.path.join(path, "f.txt")).read() == "base\nfrom code\nfrom shell\n"
+    assert (base / "f.txt").read_text() == "base\n"
+    assert os.stat(base / "f.txt").st_mode == base_mode
+    assert usage == len("from code\nfrom shell\n")
+    assert refused["status"] == "error" and "quota" in refused["output"]
+
+
+def test_symlinks_never_lead_out_of_the_session(tmp_path):
+    base = tmp_path / "base"
+    (base / "docs").mkdir(parents=True)
+    (base / "docs" / "a.txt").write_text("a\n")
+    os.symlink("docs/a.txt", base / "inside.txt")
+    os.symlink("docs", base / "docs_link")
+    # Copied verbatim, this would resolve to sessions/secret from inside a session
+    os.symlink("../secret", base / "sibling")
+    os.symlink(str(tmp_path), base / "outside")
+    manager = WorkspaceManager(base_dir=str(base), sessions_dir=str(tmp_path / "sessions"))
+
+    path = asyncio.run(manager.create("s"))
+    assert open(os.path.join(path, "inside.txt")).read() == "a\n"
+    assert os.path.realpath(os.path.join(path, "docs_link")) == os.path.realpath(os.path.join(path, "docs"))
+    assert not os.path.lexists(os.path.join(path, "sibling"))
+    assert not os.path.lexists(os.path.join(path, "outside"))
+
+    set_workspace(path)
+    os.symlink(str(tmp_path), os.path.join(path, "escape"))
+    assert resolve_in_workspace("escape/base/docs/a.txt") is None
+    assert resolve_in_workspace("docs_link/a.txt") == os.path.realpath(os.path.join(path, "docs", "a.txt"))
+
+
+def test_quota_checks_after_file_writes_do_not_walk_the_tree(tmp_path, monkeypatch):
+    base = tmp_path / "base"
+    base.mkdir()
+    (base / "f.txt").write_text("base\n")
+    manager = WorkspaceManager(base_dir=str(base), sessions_dir=str(tmp_path / "sessions"))
+    monkeypatch.setattr(settings, "WORKSPACE_QUOTA_BYTES", 64)
+    walks = []
+    real_usage = workspace.workspace_usage
+    monkeypatch.setattr(workspace, "workspace_usage", lambda root: walks.append(root) or real_usage(root))
+
+    async def scenario():
+        path = await manager.create("s")
+        set_workspace(path)
+        tool = FileTool()
+        first = await tool.run({"operation": "write", "filename": "g.txt", "content": "x" * 40})
+        second = await tool.run({"operation": "write", "filename": "h.txt", "content": "x" * 40})
+        shrunk = await tool.run({"operation": "write", "filename": "g.txt", "content": "x"})
+        third = await tool.run({"operation": "write", "filename": "h.txt", "content": "x" * 60})
+        return path, first, second, shrunk, third
+
+    path, first, second, shrunk, third = asyncio.run(scenario())
+    assert first["status"] == "success" and shrunk["status"] == "success"
+    assert second["status"] == "error" and "quota" in second["output"]
+    assert third["status"] == "success"
+    assert walks == []
+    set_workspace(path)
+    assert check_quota() is None
+    assert session_usage(path) == 61
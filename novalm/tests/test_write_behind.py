@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+from novalm.core.write_behind import MemoryWriteQueue
+
+
+class RecordingMemory:
+    def __init__(self):
+        self.calls = []
+
+    def add_episodic(self, task, solution, outcome, feedback=""):
+        self.calls.append(("episodic", task))
+
+    def add_semantic_batch(self, contents, metadatas=None, source="ingest", upsert=False):
+        self.calls.append(("semantic_batch", source, list(contents), upsert))
+        return len(contents)
+
+    def add_procedural(self, trigger, routine):
+        self.calls.append(("procedural", trigger))
+
+
+def test_writes_are_deferred_and_batched_until_flush():
+    async def scenario():
+        memory = RecordingMemory()
+        queue = MemoryWriteQueue(memory, flush_interval=60, batch_size=100)
+
+        queue.add_semantic("fact one", source="research_agent")
+        queue.add_semantic("fact two", source="research_agent")
+        queue.add_episodic(task="t", solution="s", outcome="SUCCESS")
+        assert memory.calls == []
+        assert len(queue) == 3
+
+        await queue.close()
+        return memory.calls, len(queue)
+
+    calls, pending = asyncio.run(scenario())
+    assert pending == 0
+    # Upserts, like a direct add_semantic(): re-adding a fact refreshes its timestamp
+    assert ("semantic_batch", "research_agent", ["fact one", "fact two"], True) in calls
+    assert ("episodic", "t") in calls
+
+def test_background_flush_runs_on_interval():
+    async def scenario():
+        memory = RecordingMemory()
+        queue = MemoryWriteQueue(memory, flush_interval=0.01)
+        queue.add_procedural(trigger="x", routine="y")
+        await asyncio.sleep(0.2)
+        calls = list(memory.calls)
+        await queue.close()
+        return calls
+
+    assert asyncio.run(scenario()) == [("procedural", "x")]
+
+def test_close_waits_for_the_batch_in_flight_and_late_writes_leave_the_loop():
+    import threading
+
+    class SlowMemory(RecordingMemory):
+        def add_procedural(self, trigger, routine):
+            time.sleep(0.2)
+            self.calls.append(("procedural", trigger, threading.current_thread() is threading.main_thread()))
+
+    async def scenario():
+        memory = SlowMemory()
+        queue = MemoryWriteQueue(memory, flush_interval=0.01)
+        queue.add_procedural(trigger="x", routine="y")
+        await asyncio.sleep(0.05)  # The flusher is now inside the worker thread
+        await queue.close()
+        closed_with = list(memory.calls)
+        queue.add_procedural(trigger="late", routine="y")
+        await asyncio.gather(*queue._late)
+        return closed_with, memory.calls
+
+    closed_with, calls = asyncio.run(scenario())
+    assert closed_with == [("procedural", "x", False)]
+    assert calls[1] == ("procedural", "late", False)